@@ -0,0 +1,59 @@
+"""
+Bytes per AST node of a large generated program, parsed with and without --compact-ast
+Tokens are dropped after parsing so only what the tree holds on to is counted
+Usage: python benchmarks/astMemory.py [megabytes]
+"""
+import sys
+import gc
+import tracemalloc
+from pathlib import Path
+
+root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(root))
+
+from parser.scanner import RegexScanner
+# The grammar module is imported by its bare name
+sys.path.append(str(root / "parser"))
+from parser.parser import Parser
+
+def buildSource(megabytes: float) -> str:
+    sample = "\n".join(path.read_text() for path in sorted(Path(__file__).parent.glob("*.il")))
+    copies = max(1, int(megabytes * 1024 * 1024 / len(sample)))
+    return "\n".join([sample] * copies)
+
+def countNodes(statements) -> int:
+    count = 0
+    pending = list(statements)
+    while pending:
+        node = pending.pop()
+        count += 1
+        pending.extend(child for child in node.children() if not child is None)
+    return count
+
+def measure(source: str, compact: bool):
+    tracemalloc.start()
+    tokens = RegexScanner(source).scanTokens()
+    parser = Parser(tokens, compact)
+    statements = parser.parse()
+    del parser, tokens
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return statements, size
+
+def main():
+    megabytes = float(sys.argv[1]) if len(sys.argv) > 1 else 1
+    source = buildSource(megabytes)
+    print(f"source: {len(source) / 1024 / 1024:.1f} MB")
+
+    for compact in (False, True):
+        statements, size = measure(source, compact)
+        nodes = countNodes(statements)
+        label = "compact" if compact else "default"
+        print(f"{label}: {nodes} nodes, {size / 1024 / 1024:.1f} MB, {size / nodes:.0f} bytes/node")
+        del statements
+        gc.collect()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
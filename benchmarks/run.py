@@ -0,0 +1,158 @@
+"""
+Times the scan, parse and execute phases of every benchmark program and reports medians
+large_source is the other programs repeated to about a megabyte, only scanned and parsed
+Programs that take too long for every run, like those in benchmarks/long, are named by path
+Results are written as JSON, and compared against an earlier file with --compare
+Usage: python benchmarks/run.py [name ...] [--engine tree vm ...] [-O N] [--repeat N]
+                                [--output PATH] [--compare BASELINE] [--threshold PERCENT]
+"""
+import io
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+from pathlib import Path
+
+root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(root))
+
+from parser.scanner import RegexScanner
+# The grammar module is imported by its bare name
+sys.path.append(str(root / "parser"))
+from parser.parser import Parser
+from interpreter.optimizer import Optimizer
+from interpreter.memoizer import Memoizer
+from main import engines
+
+LARGE_SOURCE = "large_source"
+# Printed lines per second of execute, kept next to the phase times but not added to the total
+WRITES = "writes/s"
+
+def loadCases(names: list[str]) -> dict[str, str | None]:
+    # Maps a case name to its source, None marks large_source which is built from the others
+    cases = {path.stem: path.read_text() for path in sorted(Path(__file__).parent.glob("*.il"))}
+    cases[LARGE_SOURCE] = None
+    if names:
+        for name in names:
+            if name.endswith(".il") and Path(name).is_file():
+                cases[name] = Path(name).read_text()
+        unknown = [name for name in names if not name in cases]
+        if unknown:
+            sys.exit(f"Unknown benchmarks: {', '.join(unknown)}, have {', '.join(cases)}")
+        cases = {name: cases[name] for name in names}
+    return cases
+
+def largeSource(megabytes: float = 1) -> str:
+    sample = "\n".join(path.read_text() for path in sorted(Path(__file__).parent.glob("*.il")))
+    copies = max(1, int(megabytes * 1024 * 1024 / len(sample)))
+    return "\n".join([sample] * copies)
+
+def runOnce(name: str, source: str, engine: str, optimizeLevel: int, execute: bool) -> dict[str, float]:
+    times = {}
+    start = time.perf_counter()
+    tokens = RegexScanner(source).scanTokens()
+    times["scan"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    statements = Parser(tokens).parse()
+    times["parse"] = time.perf_counter() - start
+
+    if optimizeLevel > 0:
+        start = time.perf_counter()
+        statements = Optimizer(optimizeLevel).optimize(statements)
+        times["optimize"] = time.perf_counter() - start
+
+    if execute:
+        start = time.perf_counter()
+        if engine == "python":
+            interpreter = engines[engine](statements, None, f"{name}.il")
+        else:
+            interpreter = engines[engine](statements)
+        interpreter.memoizer = Memoizer()
+        # An in-memory sink, so the terminal's speed is not part of the timing
+        interpreter.output.sink = io.StringIO()
+        interpreter.run()
+        times["execute"] = time.perf_counter() - start
+
+    times["total"] = sum(times.values())
+    if execute and interpreter.output.lines:
+        times[WRITES] = interpreter.output.lines / times["execute"]
+    return times
+
+def runCase(name: str, source: str | None, engine: str, optimizeLevel: int, repeat: int) -> dict[str, float]:
+    execute = not source is None
+    if source is None:
+        source = largeSource()
+    runs = [runOnce(name, source, engine, optimizeLevel, execute) for _ in range(repeat)]
+    return {phase: statistics.median(run[phase] for run in runs) for phase in runs[0]}
+
+def formatRow(key: str, times: dict[str, float]) -> str:
+    phases = "  ".join(f"{phase} {seconds * 1000:9.1f}ms" for phase, seconds in times.items() if not phase == WRITES)
+    if WRITES in times:
+        phases += f"  {times[WRITES]:12,.0f} writes/s"
+    return f"{key:28} {phases}"
+
+def compare(results: dict, baseline: dict, threshold: float) -> int:
+    # Prints how each total moved, returns how many got slower than the threshold allows
+    regressions = 0
+    for key, times in results.items():
+        before = baseline.get(key)
+        if before is None:
+            print(f"{key:28} new")
+            continue
+        change = 100 * (times["total"] - before["total"]) / before["total"]
+        if change > threshold:
+            verdict = "SLOWER"
+            regressions += 1
+        elif change < -threshold:
+            verdict = "faster"
+        else:
+            verdict = "same"
+        print(f"{key:28} {before['total'] * 1000:9.1f}ms -> {times['total'] * 1000:9.1f}ms  {change:+6.1f}%  {verdict}")
+    return regressions
+
+def main() -> int:
+    argParser = argparse.ArgumentParser(description="Time the benchmark programs")
+    argParser.add_argument("names", nargs="*", help="benchmarks to run, all of them by default")
+    argParser.add_argument("--engine", nargs="+", choices=engines.keys(), default=["tree"], help="engines to run each benchmark on (default: tree)")
+    argParser.add_argument("-O", dest="optimize", type=int, choices=[0, 1, 2], default=0, help="optimization level")
+    argParser.add_argument("--repeat", type=int, default=5, metavar="N", help="runs per benchmark, the median is reported (default: 5)")
+    argParser.add_argument("--output", metavar="PATH", help="write the results as JSON to PATH")
+    argParser.add_argument("--compare", metavar="BASELINE", help="compare against results written earlier with --output")
+    argParser.add_argument("--threshold", type=float, default=5, metavar="PERCENT", help="change in total time that counts as slower or faster (default: 5)")
+    args = argParser.parse_args()
+
+    results = {}
+    for name, source in loadCases(args.names).items():
+        for engine in args.engine:
+            key = f"{name}/{engine}"
+            try:
+                results[key] = runCase(name, source, engine, args.optimize, args.repeat)
+            except (Exception, SystemExit) as error:
+                # An engine that cannot run a program skips it instead of ending the run
+                print(f"{key:28} failed: {type(error).__name__} {error}", flush=True)
+                continue
+            print(formatRow(key, results[key]), flush=True)
+
+    if args.output:
+        report = {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "optimize": args.optimize,
+            "repeat": args.repeat,
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "results": results,
+        }
+        Path(args.output).write_text(json.dumps(report, indent=2) + "\n")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        print()
+        if compare(results, baseline["results"], args.threshold):
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
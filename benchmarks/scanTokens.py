@@ -0,0 +1,43 @@
+"""
+Tokens per second of Scanner and RegexScanner on a large generated source
+Usage: python benchmarks/scanTokens.py [megabytes]
+"""
+import sys
+import time
+from pathlib import Path
+
+root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(root))
+
+from parser.scanner import Scanner, RegexScanner
+
+def buildSource(megabytes: float) -> str:
+    sample = "\n".join(path.read_text() for path in sorted(Path(__file__).parent.glob("*.il")))
+    copies = max(1, int(megabytes * 1024 * 1024 / len(sample)))
+    return "\n".join([sample] * copies)
+
+def timeScanner(scannerClass, source: str):
+    start = time.perf_counter()
+    tokens = scannerClass(source).scanTokens()
+    return tokens, time.perf_counter() - start
+
+def main():
+    megabytes = float(sys.argv[1]) if len(sys.argv) > 1 else 2
+    source = buildSource(megabytes)
+    print(f"source: {len(source) / 1024 / 1024:.1f} MB")
+
+    results = {}
+    for scannerClass in (Scanner, RegexScanner):
+        tokens, seconds = timeScanner(scannerClass, source)
+        results[scannerClass.__name__] = tokens
+        print(f"{scannerClass.__name__}: {len(tokens)} tokens in {seconds:.2f}s, {len(tokens) / seconds:,.0f} tokens/s")
+
+    old, new = results["Scanner"], results["RegexScanner"]
+    same = len(old) == len(new) and all(
+        (a.type, a.lexeme, a.literal, a.line) == (b.type, b.lexeme, b.literal, b.line) for a, b in zip(old, new)
+    )
+    print("token streams identical" if same else "TOKEN STREAMS DIFFER")
+    return 0 if same else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""
+Thin client for main.py --serve, a drop-in for main.py that runs the script in the warm server
+Output is streamed back as the script prints it and the exit code is passed on
+Only the standard library is imported, so starting it costs little more than Python itself
+Usage: python client.py [--socket PATH] [--timing] script.il [main.py options]
+A script of - is read from stdin and sent as source, with no server running main.py is run instead
+"""
+import os
+import sys
+import json
+import time
+import socket
+import struct
+
+# Frames are a channel byte, a payload length and the payload
+REQUEST = b"r"
+OUT = b"o"
+ERR = b"e"
+EXIT = b"x"
+HEADER = struct.Struct("!cI")
+
+def defaultSocket() -> str:
+    return os.path.join(os.environ.get("TMPDIR", "/tmp"), f"il-{os.getuid()}.sock")
+
+def sendFrame(conn: socket.socket, channel: bytes, payload: bytes):
+    conn.sendall(HEADER.pack(channel, len(payload)) + payload)
+
+def readExactly(conn: socket.socket, size: int) -> bytes | None:
+    data = b""
+    while len(data) < size:
+        chunk = conn.recv(size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+def readFrame(conn: socket.socket) -> tuple[bytes, bytes] | None:
+    header = readExactly(conn, HEADER.size)
+    if header is None:
+        return None
+    channel, size = HEADER.unpack(header)
+    payload = readExactly(conn, size)
+    if payload is None:
+        return None
+    return channel, payload
+
+def splitArguments(argv: list[str]) -> tuple[str, bool, list[str]]:
+    # Takes out the client's own options, the rest goes to main.py as is
+    socketPath, timing, rest = defaultSocket(), False, []
+    arguments = iter(argv)
+    for argument in arguments:
+        if argument == "--socket":
+            socketPath = next(arguments, socketPath)
+        elif argument.startswith("--socket="):
+            socketPath = argument.split("=", 1)[1]
+        elif argument == "--timing":
+            timing = True
+        else:
+            rest.append(argument)
+    return socketPath, timing, rest
+
+def runLocally(argv: list[str]):
+    main = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+    os.execv(sys.executable, [sys.executable, main, *argv])
+
+def main() -> int:
+    start = time.perf_counter()
+    socketPath, timing, argv = splitArguments(sys.argv[1:])
+
+    request = {"argv": argv, "cwd": os.getcwd(), "tty": sys.stdout.isatty()}
+    if "-" in argv:
+        request["source"] = sys.stdin.read()
+        request["argv"] = ["<stdin>" if argument == "-" else argument for argument in argv]
+
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.connect(socketPath)
+    except OSError:
+        if "source" in request:
+            print(f"No server on {socketPath}, start one with main.py --serve", file=sys.stderr)
+            return 1
+        runLocally(argv)
+
+    sendFrame(conn, REQUEST, json.dumps(request).encode())
+    while True:
+        frame = readFrame(conn)
+        if frame is None:
+            print("The server closed the connection before the script finished", file=sys.stderr)
+            return 1
+        channel, payload = frame
+        if channel == OUT:
+            sys.stdout.buffer.write(payload)
+            sys.stdout.flush()
+        elif channel == ERR:
+            sys.stderr.buffer.write(payload)
+            sys.stderr.flush()
+        elif channel == EXIT:
+            result = json.loads(payload)
+            break
+
+    if timing:
+        times = ", ".join(f"{name} {seconds * 1000:.1f}ms" for name, seconds in result["timing"].items())
+        print(f"{times}, round trip {(time.perf_counter() - start) * 1000:.1f}ms", file=sys.stderr)
+    return result["code"]
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,51 @@
+import logging
+logger = logging.getLogger(__name__)
+
+try:
+    import numpy
+    from numpy import ndarray
+except ImportError:
+    # Without numpy no value is ever an array, the std array functions say so when called
+    numpy = None
+    class ndarray:
+        pass
+
+def requireNumpy(name: str):
+    if numpy is None:
+        logger.error(f"{name} needs numpy, install it with pip install numpy.")
+        exit()
+
+def position(array: ndarray, index) -> int:
+    # Numbers are floats, an index has to be a whole one inside the array, negative ones count from the end
+    if not index.__class__ is float or not index.is_integer():
+        logger.error(f"Array index {index} is not a whole number.")
+        exit()
+    if not -len(array) <= index < len(array):
+        logger.error(f"Array index {index} out of range for length {len(array)}.")
+        exit()
+    return int(index)
+
+# Python's not, and, or ask an array for one truth value, these apply elementwise instead
+
+def logicalNot(value):
+    if value.__class__ is ndarray:
+        return numpy.logical_not(value)
+    return not value
+
+def logicalAnd(left, right):
+    if left.__class__ is ndarray or right.__class__ is ndarray:
+        return numpy.logical_and(left, right)
+    return left and right
+
+def logicalOr(left, right):
+    if left.__class__ is ndarray or right.__class__ is ndarray:
+        return numpy.logical_or(left, right)
+    return left or right
+
+def negate(value):
+    if value.__class__ is ndarray:
+        return -value
+    try:
+        return -float(value) # type: ignore
+    except ValueError:
+        return None
@@ -0,0 +1,432 @@
+import logging
+logger = logging.getLogger(__name__)
+
+from langGrammar import *
+from interpreter.interpreter import Interpreter
+from interpreter.environment import Environment, UNDEFINED
+from interpreter.envData import MemoCache, Rope, MISSING, remember
+from interpreter.arrays import logicalNot, logicalAnd, logicalOr, negate
+from interpreter.containers import getIndex, setIndex, checkKey, iterate
+
+class CompiledFunction:
+    def __init__(self, name: str, params: list[Token], scope: dict, body, parentEnv: Environment, memo: MemoCache | None = None) -> None:
+        self.name: str = name
+        self.arity: int = len(params)
+        self.params: list[Token] = params
+        self.scope: dict = scope
+        self.body = body
+        self.parentEnv: Environment = parentEnv
+        # Parameters then take slots 0..arity-1 and can be copied in one go
+        self.distinctParams: bool = len(set(param.lexeme for param in params)) == len(params)
+        self.memo: MemoCache | None = memo
+
+    def call(self, arguments: list):
+        func = self
+        pending = []
+        while True:
+            memo = func.memo
+            if not memo is None:
+                key = memo.key(arguments)
+                if not key is None:
+                    value = memo.get(key)
+                    if not value is MISSING:
+                        if pending:
+                            remember(pending, value)
+                        return value
+                    pending.append((memo, key))
+
+            funcEnv = Environment(func.parentEnv, func.scope)
+            if func.distinctParams:
+                funcEnv.values[:func.arity] = arguments
+            else:
+                for index, param in enumerate(func.params):
+                    funcEnv.defineAt(func.scope[param.lexeme], arguments[index])
+            completion = func.body(funcEnv)
+            if completion is None:
+                value = None
+            elif len(completion) == 1:
+                value = completion[0]
+            else:
+                # A (function, arguments) pair is a tail call, run it here instead of recursing
+                func, arguments = completion
+                if func.__class__ is CompiledFunction:
+                    continue
+                value = func.call(arguments)
+
+            if pending:
+                remember(pending, value)
+            return value
+
+    def __repr__(self):
+        return f"<func {self.name}>"
+
+class ClosureCompiler:
+    """
+    Turns each AST node into a Python closure taking the current Environment
+    Operators, slots and branches are decided once here instead of on every eval
+    Statement closures return None, or a 1-tuple holding the value of a return
+    A tail call returns a (function, arguments) pair for CompiledFunction.call to run
+    Every closure keeps a reference to its node for debugging
+    """
+    def compile(self, statements: list[Stmt]):
+        return self.compileStatements(statements)
+
+    def compileStatements(self, statements: list[Stmt]):
+        compiled = tuple(self.compileNode(statement) for statement in statements)
+
+        def statementList(env):
+            for statement in compiled:
+                completion = statement(env)
+                if not completion is None:
+                    return completion
+        return statementList
+
+    def compileNode(self, node: Grammar | None):
+        compiled = self.compileNodeType(node)
+        if not hasattr(compiled, "node"):
+            compiled.node = node
+        return compiled
+
+    def compileNodeType(self, node: Grammar | None):
+        match node:
+            case Block(): return self.compileBlock(node)
+            case Expression(): return self.compileExpression(node)
+            case Print(): return self.compilePrint(node)
+            case Return(): return self.compileReturn(node)
+            case Var(): return self.compileVar(node)
+            case Function(): return self.compileFunction(node)
+            case IfStmt(): return self.compileIf(node)
+            case WhileStmt(): return self.compileWhile(node)
+            case ForIn(): return self.compileForIn(node)
+
+            case ConcatAssign(): return self.compileConcatAssign(node)
+            case Assign(): return self.compileAssign(node)
+            case RopeVariable() | GlobalRopeVariable(): return self.compileRopeVariable(node)
+            case Variable(): return self.compileVariable(node)
+            case Literal(): return self.compileLiteral(node.value)
+            case Grouping(): return self.compileNode(node.expression)
+            case Binary(): return self.compileBinary(node)
+            case Unary(): return self.compileUnary(node)
+            case Call(): return self.compileCall(node)
+            case MapLiteral(): return self.compileMap(node)
+            case Index(): return self.compileIndex(node)
+            case SetIndex(): return self.compileSetIndex(node)
+            case _: return self.compileLiteral(None)
+
+    def compileBlock(self, node: Block):
+        scope = node.scope
+        statements = tuple(self.compileNode(statement) for statement in node.statements)
+
+        if scope is None:
+            # The resolver gave it no frame
+            def scopeless(env):
+                for statement in statements:
+                    completion = statement(env)
+                    if not completion is None:
+                        return completion
+            return scopeless
+
+        def block(env):
+            subEnv = Environment(env, scope)
+            for statement in statements:
+                completion = statement(subEnv)
+                if not completion is None:
+                    return completion
+        return block
+
+    def compileExpression(self, node: Expression):
+        expression = self.compileNode(node.expression)
+
+        def expressionStmt(env):
+            expression(env)
+        return expressionStmt
+
+    def compilePrint(self, node: Print):
+        expression = self.compileNode(node.expression)
+        write = node.output.write
+
+        def printStmt(env):
+            write(expression(env))
+        return printStmt
+
+    def compileReturn(self, node: Return):
+        if node.tailCall:
+            return self.compileCallee(node.value) # type: ignore
+        if node.value is None:
+            return lambda env: (None,)
+        value = self.compileNode(node.value)
+        return lambda env: (value(env),)
+
+    def compileVar(self, node: Var):
+        slot = node.slot
+        if node.initializer is None:
+            return lambda env: env.defineAt(slot, None)
+        initializer = self.compileNode(node.initializer)
+        return lambda env: env.defineAt(slot, initializer(env))
+
+    def compileFunction(self, node: Function):
+        name, params, scope, slot, memo = node.name.lexeme, node.params, node.scope, node.slot, node.memo
+        body = self.compileNode(node.body)
+
+        def function(env):
+            env.defineAt(slot, CompiledFunction(name, params, scope, body, env, memo))
+        return function
+
+    def compileIf(self, node: IfStmt):
+        condition = self.compileNode(node.condition)
+        thenBranch = self.compileNode(node.thenBranch)
+        if node.elseBranch is None:
+            def ifStmt(env):
+                if condition(env) == True:
+                    return thenBranch(env)
+            return ifStmt
+
+        elseBranch = self.compileNode(node.elseBranch)
+        def ifElseStmt(env):
+            if condition(env) == True:
+                return thenBranch(env)
+            return elseBranch(env)
+        return ifElseStmt
+
+    def compileWhile(self, node: WhileStmt):
+        condition = self.compileNode(node.expression)
+        body = self.compileNode(node.statement)
+
+        def whileStmt(env):
+            while condition(env):
+                completion = body(env)
+                if not completion is None:
+                    return completion
+        return whileStmt
+
+    def compileForIn(self, node: ForIn):
+        depth, slot, name = node.depth, node.slot, node.name.lexeme
+        iterable = self.compileNode(node.iterable)
+        body = self.compileNode(node.statement)
+
+        def forIn(env):
+            for value in iterate(iterable(env)):
+                env.setAt(depth, slot, name, value)
+                completion = body(env)
+                if not completion is None:
+                    return completion
+        return forIn
+
+    def compileAssign(self, node: Assign):
+        depth, slot, name = node.depth, node.slot, node.name.lexeme
+        value = self.compileNode(node.value)
+
+        def assign(env):
+            result = value(env)
+            frame = env
+            for _ in range(depth):
+                frame = frame.parentEnv
+            if frame.values[slot] is UNDEFINED:
+                env.setValue(name, result)
+            else:
+                frame.values[slot] = result
+        return assign
+
+    def compileConcatAssign(self, node: ConcatAssign):
+        depth, slot, name = node.depth, node.slot, node.name.lexeme
+        right = self.compileNode(node.value.right)
+
+        def concatAssign(env):
+            r = right(env)
+            frame = env
+            for _ in range(depth):
+                frame = frame.parentEnv
+            current = frame.values[slot]
+            if current.__class__ is Rope and r.__class__ is str:
+                current.append(r)
+                return
+            if current is UNDEFINED:
+                l = env.get(name)
+            else:
+                l = current.build() if current.__class__ is Rope else current
+            result = None if l is None or r is None else l + r
+            if current is UNDEFINED:
+                env.setValue(name, result)
+            else:
+                frame.values[slot] = Rope([result]) if result.__class__ is str else result
+        return concatAssign
+
+    def compileRopeVariable(self, node: Variable):
+        depth, slot, name = node.depth, node.slot, node.name.lexeme
+
+        def ropeVariable(env):
+            frame = env
+            for _ in range(depth):
+                frame = frame.parentEnv
+            value = frame.values[slot]
+            if value is UNDEFINED:
+                return env.get(name)
+            if value.__class__ is Rope:
+                return value.build()
+            return value
+        return ropeVariable
+
+    def compileVariable(self, node: Variable):
+        depth, slot, name = node.depth, node.slot, node.name.lexeme
+        match depth:
+            case 0:
+                def variable(env):
+                    value = env.values[slot]
+                    if value is UNDEFINED:
+                        return env.get(name)
+                    return value
+            case 1:
+                def variable(env):
+                    value = env.parentEnv.values[slot]
+                    if value is UNDEFINED:
+                        return env.get(name)
+                    return value
+            case 2:
+                def variable(env):
+                    value = env.parentEnv.parentEnv.values[slot]
+                    if value is UNDEFINED:
+                        return env.get(name)
+                    return value
+            case _:
+                def variable(env):
+                    frame = env
+                    for _ in range(depth):
+                        frame = frame.parentEnv
+                    value = frame.values[slot]
+                    if value is UNDEFINED:
+                        return env.get(name)
+                    return value
+        return variable
+
+    def compileLiteral(self, value):
+        return lambda env: value
+
+    def compileBinary(self, node: Binary):
+        left = self.compileNode(node.left)
+        right = self.compileNode(node.right)
+        match node.operator.type:
+            case TokenType.EQUAL_EQUAL:
+                def binary(env):
+                    l = left(env); r = right(env)
+                    return None if l is None or r is None else l == r
+            case TokenType.BANG_EQUAL:
+                def binary(env):
+                    l = left(env); r = right(env)
+                    return None if l is None or r is None else l != r
+            case TokenType.GREATER:
+                def binary(env):
+                    l = left(env); r = right(env)
+                    return None if l is None or r is None else l > r
+            case TokenType.GREATER_EQUAL:
+                def binary(env):
+                    l = left(env); r = right(env)
+                    return None if l is None or r is None else l >= r
+            case TokenType.LESS:
+                def binary(env):
+                    l = left(env); r = right(env)
+                    return None if l is None or r is None else l < r
+            case TokenType.LESS_EQUAL:
+                def binary(env):
+                    l = left(env); r = right(env)
+                    return None if l is None or r is None else l <= r
+            case TokenType.PLUS:
+                def binary(env):
+                    l = left(env); r = right(env)
+                    return None if l is None or r is None else l + r
+            case TokenType.MINUS:
+                def binary(env):
+                    l = left(env); r = right(env)
+                    return None if l is None or r is None else l - r
+            case TokenType.STAR:
+                def binary(env):
+                    l = left(env); r = right(env)
+                    return None if l is None or r is None else l * r
+            case TokenType.SLASH:
+                def binary(env):
+                    l = left(env); r = right(env)
+                    return None if l is None or r is None else l / r
+            case TokenType.AND:
+                def binary(env):
+                    l = left(env); r = right(env)
+                    return None if l is None or r is None else logicalAnd(l, r)
+            case TokenType.OR:
+                def binary(env):
+                    l = left(env); r = right(env)
+                    return None if l is None or r is None else logicalOr(l, r)
+            case _:
+                def binary(env):
+                    left(env); right(env)
+                    return None
+        return binary
+
+    def compileUnary(self, node: Unary):
+        right = self.compileNode(node.right)
+        match node.operator.type:
+            case TokenType.BANG:
+                return lambda env: logicalNot(right(env))
+            case TokenType.MINUS:
+                return lambda env: negate(right(env))
+            case _:
+                def unary(env):
+                    right(env)
+                    return None
+                return unary
+
+    def compileMap(self, node: MapLiteral):
+        entries = tuple((self.compileNode(key), self.compileNode(value)) for key, value in node.entries)
+
+        def mapLiteral(env):
+            mapping = {}
+            for key, value in entries:
+                mapping[checkKey(key(env))] = value(env)
+            return mapping
+        return mapLiteral
+
+    def compileIndex(self, node: Index):
+        array = self.compileNode(node.object)
+        index = self.compileNode(node.index)
+        return lambda env: getIndex(array(env), index(env))
+
+    def compileSetIndex(self, node: SetIndex):
+        array = self.compileNode(node.object)
+        index = self.compileNode(node.index)
+        value = self.compileNode(node.value)
+
+        def setElement(env):
+            setIndex(array(env), index(env), value(env))
+        return setElement
+
+    def compileCallee(self, node: Call):
+        # Evaluates the arguments then the callee and checks it can take them
+        callee = self.compileNode(node.callee)
+        arguments = tuple(self.compileNode(argument) for argument in node.arguments)
+        argCount = len(arguments)
+        calleeText = node.callee.getPrint()
+
+        def prepare(env):
+            values = [argument(env) for argument in arguments]
+            func = callee(env)
+            if not isinstance(func, (CompiledFunction, Callable)):
+                logger.error(f"Function expression '{calleeText}' is not callable.")
+                exit()
+            if not argCount == func.arity:
+                logger.error(f"Function expression '{calleeText}' expected {func.arity} arguments but got {argCount}.")
+                exit()
+            return func, values
+        return prepare
+
+    def compileCall(self, node: Call):
+        prepare = self.compileCallee(node)
+
+        def call(env):
+            func, values = prepare(env)
+            return func.call(values)
+        return call
+
+class ClosureInterpreter(Interpreter):
+    """
+    Compiles the statement tree into closures once, then runs them
+    """
+    def runStatements(self, statements: list[Stmt]) -> bool:
+        self.program = ClosureCompiler().compile(statements)
+        return not self.program(self.environment) is None
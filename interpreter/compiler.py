@@ -0,0 +1,315 @@
+from enum import IntEnum, auto
+
+from langGrammar import *
+
+class OpCode(IntEnum):
+    CONST = auto()
+    LOAD = auto()
+    LOAD_LOCAL = auto()
+    LOAD_ROPE = auto()
+    STORE = auto()
+    CONCAT = auto()
+    DEFINE = auto()
+    POP = auto()
+
+    EQUAL = auto()
+    NOT_EQUAL = auto()
+    GREATER = auto()
+    GREATER_EQUAL = auto()
+    LESS = auto()
+    LESS_EQUAL = auto()
+    ADD = auto()
+    SUBTRACT = auto()
+    MULTIPLY = auto()
+    DIVIDE = auto()
+    AND = auto()
+    OR = auto()
+    NOT = auto()
+    NEGATE = auto()
+    INDEX = auto()
+    SET_INDEX = auto()
+    MAKE_MAP = auto()
+    ITERATE = auto()
+    FOR_ITER = auto()
+
+    JUMP = auto()
+    JUMP_IF_NOT_TRUE = auto()
+    JUMP_IF_FALSY = auto()
+
+    ENTER_BLOCK = auto()
+    EXIT_BLOCK = auto()
+    MAKE_FUNCTION = auto()
+    CALL = auto()
+    TAIL_CALL = auto()
+    RETURN = auto()
+    PRINT = auto()
+
+# Number of operands that follow each opcode in the code array
+operandCount = {
+    OpCode.CONST: 1,
+    OpCode.LOAD: 3,
+    OpCode.LOAD_LOCAL: 2,
+    OpCode.LOAD_ROPE: 3,
+    OpCode.STORE: 3,
+    OpCode.CONCAT: 3,
+    OpCode.DEFINE: 1,
+    OpCode.JUMP: 1,
+    OpCode.JUMP_IF_NOT_TRUE: 1,
+    OpCode.JUMP_IF_FALSY: 1,
+    OpCode.ENTER_BLOCK: 1,
+    OpCode.MAKE_FUNCTION: 1,
+    OpCode.CALL: 2,
+    OpCode.TAIL_CALL: 2,
+    OpCode.MAKE_MAP: 1,
+    OpCode.ITERATE: 1,
+    OpCode.FOR_ITER: 2,
+}
+
+binaryOpCodes = {
+    TokenType.EQUAL_EQUAL: OpCode.EQUAL,
+    TokenType.BANG_EQUAL: OpCode.NOT_EQUAL,
+    TokenType.GREATER: OpCode.GREATER,
+    TokenType.GREATER_EQUAL: OpCode.GREATER_EQUAL,
+    TokenType.LESS: OpCode.LESS,
+    TokenType.LESS_EQUAL: OpCode.LESS_EQUAL,
+    TokenType.PLUS: OpCode.ADD,
+    TokenType.MINUS: OpCode.SUBTRACT,
+    TokenType.STAR: OpCode.MULTIPLY,
+    TokenType.SLASH: OpCode.DIVIDE,
+    TokenType.AND: OpCode.AND,
+    TokenType.OR: OpCode.OR,
+}
+
+class EndOfScript:
+    def __repr__(self):
+        return "end of script"
+
+# Returned by a script that ran to its end, a top-level return gives its own value
+END_OF_SCRIPT = EndOfScript()
+
+class FunctionProto:
+    """
+    Compiled body of a function, or of the whole script
+    code is a flat list of opcodes each followed by its operands
+    """
+    def __init__(self, name: str, params: list[Token], scope: dict) -> None:
+        self.name: str = name
+        self.arity: int = len(params)
+        self.params: list[Token] = params
+        self.scope: dict = scope
+        # Parameters then take slots 0..arity-1 and can be copied in one go
+        self.distinctParams: bool = len(set(param.lexeme for param in params)) == len(params)
+        self.code: list[int] = []
+        self.constants: list = []
+        self.memo = None
+
+    def __repr__(self):
+        return f"<func {self.name}>"
+
+class Compiler:
+    """
+    Lowers a resolved statement tree into FunctionProto objects for the VM
+    Frames keep the resolver's slot layout so both engines share Environment
+    """
+    def __init__(self) -> None:
+        self.proto: FunctionProto = FunctionProto("<script>", [], {})
+        self.constantIndex: dict = {}
+
+    def compile(self, statements: list[Stmt]) -> FunctionProto:
+        for statement in statements:
+            self.compileNode(statement)
+        self.emit(OpCode.CONST, self.constant(END_OF_SCRIPT))
+        self.emit(OpCode.RETURN)
+        return self.proto
+
+    def emit(self, opCode: OpCode, *operands: int) -> int:
+        self.proto.code.append(int(opCode))
+        self.proto.code.extend(operands)
+        return len(self.proto.code) - 1
+
+    def emitJump(self, opCode: OpCode, *operands: int) -> int:
+        # The target is the last operand, returns its index to patch once the target is known
+        return self.emit(opCode, *operands, -1)
+
+    def patchJump(self, operand: int):
+        self.proto.code[operand] = len(self.proto.code)
+
+    def constant(self, value) -> int:
+        # Floats and strings are deduplicated, everything else gets its own entry
+        constants = self.proto.constants
+        if type(value) in (float, str):
+            key = (type(value), value)
+            if not key in self.constantIndex:
+                self.constantIndex[key] = len(constants)
+                constants.append(value)
+            return self.constantIndex[key]
+        constants.append(value)
+        return len(constants) - 1
+
+    def compileFunction(self, node: Function) -> FunctionProto:
+        enclosing = (self.proto, self.constantIndex)
+        self.proto = FunctionProto(node.name.lexeme, node.params, node.scope)
+        self.proto.memo = node.memo
+        self.constantIndex = {}
+        self.compileNode(node.body)
+        self.emit(OpCode.CONST, self.constant(None))
+        self.emit(OpCode.RETURN)
+        proto = self.proto
+        self.proto, self.constantIndex = enclosing
+        return proto
+
+    def compileNode(self, node: Grammar | None):
+        match node:
+            case Block():
+                if node.scope is None:
+                    # The resolver gave it no frame
+                    for statement in node.statements:
+                        self.compileNode(statement)
+                    return
+                self.emit(OpCode.ENTER_BLOCK, self.constant(node.scope))
+                for statement in node.statements:
+                    self.compileNode(statement)
+                self.emit(OpCode.EXIT_BLOCK)
+            case Expression():
+                if isinstance(node.expression, Assign):
+                    # The value of an assignment is never used here, so skip pushing it
+                    self.compileAssign(node.expression)
+                else:
+                    self.compileNode(node.expression)
+                    self.emit(OpCode.POP)
+            case Print():
+                self.compileNode(node.expression)
+                self.emit(OpCode.PRINT)
+            case Return():
+                if node.tailCall:
+                    self.compileCall(node.value, OpCode.TAIL_CALL) # type: ignore
+                    return
+                if node.value is None:
+                    self.emit(OpCode.CONST, self.constant(None))
+                else:
+                    self.compileNode(node.value)
+                self.emit(OpCode.RETURN)
+            case Var():
+                if node.initializer is None:
+                    self.emit(OpCode.CONST, self.constant(None))
+                else:
+                    self.compileNode(node.initializer)
+                self.emit(OpCode.DEFINE, node.slot)
+            case Function():
+                self.emit(OpCode.MAKE_FUNCTION, self.constant(self.compileFunction(node)))
+                self.emit(OpCode.DEFINE, node.slot)
+            case IfStmt():
+                self.compileNode(node.condition)
+                elseJump = self.emitJump(OpCode.JUMP_IF_NOT_TRUE)
+                self.compileNode(node.thenBranch)
+                if node.elseBranch is None:
+                    self.patchJump(elseJump)
+                else:
+                    endJump = self.emitJump(OpCode.JUMP)
+                    self.patchJump(elseJump)
+                    self.compileNode(node.elseBranch)
+                    self.patchJump(endJump)
+            case WhileStmt():
+                loopStart = len(self.proto.code)
+                self.compileNode(node.expression)
+                exitJump = self.emitJump(OpCode.JUMP_IF_FALSY)
+                self.compileNode(node.statement)
+                self.emit(OpCode.JUMP, loopStart)
+                self.patchJump(exitJump)
+            case ForIn():
+                # The iterator is kept in a frame slot, a return inside the loop leaves nothing on the stack
+                self.compileNode(node.iterable)
+                self.emit(OpCode.ITERATE, node.iteratorSlot)
+                loopStart = len(self.proto.code)
+                exitJump = self.emitJump(OpCode.FOR_ITER, node.iteratorSlot)
+                self.emit(OpCode.STORE, node.depth, node.slot, self.constant(node.name.lexeme))
+                self.compileNode(node.statement)
+                self.emit(OpCode.JUMP, loopStart)
+                self.patchJump(exitJump)
+
+            case Assign():
+                self.compileAssign(node)
+                self.emit(OpCode.CONST, self.constant(None))
+            case RopeVariable() | GlobalRopeVariable():
+                self.emit(OpCode.LOAD_ROPE, node.depth, node.slot, self.constant(node.name.lexeme))
+            case Variable():
+                name = self.constant(node.name.lexeme)
+                if node.depth == 0:
+                    self.emit(OpCode.LOAD_LOCAL, node.slot, name)
+                else:
+                    self.emit(OpCode.LOAD, node.depth, node.slot, name)
+            case Literal():
+                self.emit(OpCode.CONST, self.constant(node.value))
+            case Grouping():
+                self.compileNode(node.expression)
+            case Binary():
+                self.compileNode(node.left)
+                self.compileNode(node.right)
+                opCode = binaryOpCodes.get(node.operator.type)
+                if opCode is None:
+                    self.emit(OpCode.POP)
+                    self.emit(OpCode.POP)
+                    self.emit(OpCode.CONST, self.constant(None))
+                else:
+                    self.emit(opCode)
+            case Unary():
+                self.compileNode(node.right)
+                match node.operator.type:
+                    case TokenType.BANG: self.emit(OpCode.NOT)
+                    case TokenType.MINUS: self.emit(OpCode.NEGATE)
+                    case _:
+                        self.emit(OpCode.POP)
+                        self.emit(OpCode.CONST, self.constant(None))
+            case Call():
+                self.compileCall(node, OpCode.CALL)
+            case MapLiteral():
+                for child in node.children():
+                    self.compileNode(child)
+                self.emit(OpCode.MAKE_MAP, len(node.entries))
+            case Index():
+                self.compileNode(node.object)
+                self.compileNode(node.index)
+                self.emit(OpCode.INDEX)
+            case SetIndex():
+                self.compileNode(node.object)
+                self.compileNode(node.index)
+                self.compileNode(node.value)
+                self.emit(OpCode.SET_INDEX)
+            case _:
+                self.emit(OpCode.CONST, self.constant(None))
+
+    def compileCall(self, node: Call, opCode: OpCode):
+        # Arguments are evaluated before the callee, as in Call.eval
+        for argument in node.arguments:
+            self.compileNode(argument)
+        self.compileNode(node.callee)
+        self.emit(opCode, len(node.arguments), self.constant(node.callee.getPrint()))
+
+    def compileAssign(self, node: Assign):
+        if node.__class__ is ConcatAssign:
+            # The variable is not loaded, CONCAT appends to the Rope in its slot
+            self.compileNode(node.value.right)
+            self.emit(OpCode.CONCAT, node.depth, node.slot, self.constant(node.name.lexeme))
+            return
+        self.compileNode(node.value)
+        self.emit(OpCode.STORE, node.depth, node.slot, self.constant(node.name.lexeme))
+
+def disassemble(proto: FunctionProto) -> str:
+    lines = [f"== {proto.name} =="]
+    nested = []
+    index = 0
+    while index < len(proto.code):
+        opCode = OpCode(proto.code[index])
+        count = operandCount.get(opCode, 0)
+        operands = proto.code[index + 1:index + 1 + count]
+        text = f"{index:04} {opCode.name:<16} {' '.join(str(operand) for operand in operands)}"
+        if opCode in (OpCode.CONST, OpCode.MAKE_FUNCTION):
+            value = proto.constants[operands[0]]
+            text += f" ({value!r})"
+            if isinstance(value, FunctionProto):
+                nested.append(value)
+        lines.append(text)
+        index += 1 + count
+    for function in nested:
+        lines.append(disassemble(function))
+    return "\n".join(lines)
@@ -0,0 +1,70 @@
+import logging
+logger = logging.getLogger(__name__)
+
+from interpreter.arrays import ndarray, position
+
+# Indexing and looping over the values that hold others
+# Maps are Python dicts, so a key is found by hashing its content
+
+# Stored values may be null, so a missing key needs a marker of its own
+MISSING_KEY = object()
+# What keys(map) returns, a live view of the map's keys
+KeysView = type({}.keys())
+
+def checkKey(key):
+    # true would find the entry of 1, only numbers and strings are keys
+    if not key.__class__ in (float, str):
+        logger.error(f"Map keys are numbers or strings, not {key}.")
+        exit()
+    return key
+
+def getIndex(value, index):
+    if value.__class__ is dict:
+        entry = value.get(checkKey(index), MISSING_KEY)
+        if entry is MISSING_KEY:
+            logger.error(f"Map has no key {index}.")
+            exit()
+        return entry
+    if value.__class__ is ndarray:
+        # item() hands back a Python float or bool, like every other number in the language
+        return value.item(position(value, index))
+    logger.error(f"Only arrays and maps can be indexed, not {value}.")
+    exit()
+
+def setIndex(value, index, element):
+    if value.__class__ is dict:
+        value[checkKey(index)] = element
+        return
+    if not value.__class__ is ndarray:
+        logger.error(f"Only arrays and maps can be indexed, not {value}.")
+        exit()
+    if not element.__class__ in (float, bool):
+        logger.error(f"Array elements are numbers, not {element}.")
+        exit()
+    value[position(value, index)] = element
+
+def iterate(value):
+    """
+    What for (var x in value) loops over, the keys of a map, the elements of an array
+    or the characters of a string, none of them copied first
+    """
+    if value.__class__ is dict or value.__class__ is KeysView:
+        return mapKeys(value)
+    if value.__class__ is ndarray:
+        return (value.item(index) for index in range(len(value)))
+    if value.__class__ is str:
+        return iter(value)
+    logger.error(f"Can only loop over maps, arrays and strings, not {value}.")
+    exit()
+
+def mapKeys(mapping: dict | KeysView):
+    keys = iter(mapping)
+    while True:
+        try:
+            key = next(keys)
+        except StopIteration:
+            return
+        except RuntimeError:
+            logger.error("Map changed size while looping over it.")
+            exit()
+        yield key
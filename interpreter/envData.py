@@ -1,23 +1,152 @@
 from typing import Any
+from collections import OrderedDict
 
 
 class Callable:
-    def __init__(self, arity, environment, params=None, body=None) -> None:
+    def __init__(self, arity, environment, params=None, body=None, memo=None) -> None:
         self.arity = arity
         self.environment = environment
         self.params = params
         self.body = body
+        self.memo = memo
     
     def call(self, arguments) -> Any:
-        assert not (self.params is None or self.body is None)
-        for index, param in enumerate(self.params):
-            self.environment.define(param.lexeme, arguments[index])
-        
-        try:
-            self.body.eval(self.environment)
-        except ReturnValue as value:
-            return value.value
+        callable = self
+        pending = []
+        while True:
+            assert not (callable.params is None or callable.body is None)
+            memo = callable.memo
+            if not memo is None:
+                key = memo.key(arguments)
+                if not key is None:
+                    value = memo.get(key)
+                    if not value is MISSING:
+                        if pending:
+                            remember(pending, value)
+                        return value
+                    pending.append((memo, key))
+
+            for index, param in enumerate(callable.params):
+                callable.environment.defineAt(callable.environment.names[param.lexeme], arguments[index])
+            
+            completion = callable.body.eval(callable.environment)
+            if completion is None:
+                value = None
+            elif not completion.__class__ is TailCall:
+                value = completion.value
+            elif isinstance(completion.func, Callable):
+                value = completion.func.call(completion.arguments)
+            else:
+                # Run the tail call in this loop instead of growing the Python stack
+                arguments = completion.arguments
+                callable = completion.func.constructCallable()
+                continue
+
+            if pending:
+                remember(pending, value)
+            return value
     
-class ReturnValue(Exception):
+class ReturnValue:
+    """
+    Completion handed back up through Block, IfStmt and WhileStmt when a return runs
+    Statements that finish normally give back None
+    """
     def __init__(self, value):
-        self.value = value
\ No newline at end of file
+        self.value = value
+
+class TailCall(ReturnValue):
+    """
+    Completion for `return f(...)` inside a function
+    The caller's Callable.call makes the call once the current body has unwound
+    """
+    def __init__(self, func, arguments):
+        self.value = None
+        self.func = func
+        self.arguments = arguments
+
+class StringBuilder:
+    """
+    A string built from parts, appending keeps the parts and build() joins them once
+    """
+    __slots__ = ("parts",)
+
+    def __init__(self, parts: list[str] | None = None) -> None:
+        self.parts: list[str] = [] if parts is None else parts
+
+    def append(self, text: str):
+        self.parts.append(text)
+
+    def build(self) -> str:
+        parts = self.parts
+        if not len(parts) == 1:
+            # Kept joined, so reading again before the next append costs nothing
+            parts[:] = ["".join(parts)]
+        return parts[0]
+
+    def __repr__(self):
+        return "<builder>"
+
+class Rope(StringBuilder):
+    """
+    What a variable grown by s = s + x holds in its slot, see ConcatAssign
+    Every read of the variable builds it, so a Rope is never seen by the program
+    """
+    __slots__ = ()
+
+# Returned by MemoCache.get when the arguments have not been seen
+MISSING = object()
+
+class MemoCache:
+    """
+    Results of one pure function keyed by its arguments, evicting the least recently used
+    A size of 0 never evicts
+    """
+    def __init__(self, name: str, size: int) -> None:
+        self.name: str = name
+        self.size: int = size
+        self.entries: OrderedDict = OrderedDict()
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self.enabled: bool = True
+
+    def invalidate(self):
+        # The function stopped being pure, so nothing is cached from now on
+        self.enabled = False
+        self.entries.clear()
+
+    def key(self, arguments) -> tuple | None:
+        if not self.enabled:
+            return None
+        # Types are part of the key so 1 and true do not share an entry
+        key = (tuple(arguments), tuple(map(type, arguments)))
+        try:
+            hash(key)
+        except TypeError:
+            # Arrays cannot be keys, and comparing one to 0 below would not give one truth value
+            return None
+        if 0 in key[0]:
+            # 0 and -0 are equal but print differently
+            key += (tuple(map(str, arguments)),)
+        return key
+
+    def get(self, key: tuple):
+        value = self.entries.get(key, MISSING)
+        if value is MISSING:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return value
+
+    def put(self, key: tuple, value):
+        self.entries[key] = value
+        if self.size > 0 and len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+def remember(pending: list, value):
+    # Stores value under every (cache, key) waiting on it, a tail call chain shares one result
+    for memo, key in pending:
+        memo.put(key, value)
+    return value
@@ -3,79 +3,149 @@ logger = logging.getLogger(__name__)
 
 from interpreter.envData import *
 
+class Undefined:
+    def __repr__(self):
+        return "undefined"
+
+    def __reduce__(self):
+        # Unpickled as the one UNDEFINED, so slots sent to a parallelMap worker still compare with is
+        return "UNDEFINED"
+
+# Marks a slot whose declaration has not run yet
+UNDEFINED = Undefined()
+
 class CallableFactory:
-    def __init__(self, parentEnv, params, body) -> None:
+    def __init__(self, parentEnv, params, body, scope=None, memo=None) -> None:
         self.arity = len(params)
         self.params = params
         self.body = body
         self.parentEnv = parentEnv
-    
+        self.scope: dict = scope if scope is not None else {param.lexeme: index for index, param in enumerate(params)}
+        self.memo = memo
+
     def constructCallable(self) -> Callable:
-        funcEnv = Environment(self.parentEnv)
-        return Callable(self.arity, funcEnv, self.params, self.body)
+        funcEnv = Environment(self.parentEnv, self.scope)
+        return Callable(self.arity, funcEnv, self.params, self.body, self.memo)
 
 class Environment:
-    def __init__(self, parentEnv = None) -> None:
+    """
+    A frame of slots laid out by the resolver
+    names maps a variable name to its slot and is shared by every frame of the same scope
+    """
+    def __init__(self, parentEnv = None, names: dict | None = None) -> None:
         self.parentEnv: Environment | None = None
         if not parentEnv is None:
             self.parentEnv = parentEnv
-        self.values: dict = {}
-        
+        self.names: dict = {} if names is None else names
+        self.values: list = [UNDEFINED] * len(self.names)
+
+    def grow(self):
+        # Global scopes gain names each time the resolver runs
+        missing = len(self.names) - len(self.values)
+        if missing > 0:
+            self.values.extend([UNDEFINED] * missing)
+
+    def ancestor(self, depth: int) -> "Environment":
+        env = self
+        for _ in range(depth):
+            env = env.parentEnv # type: ignore
+        return env
+
     def checkParentNamespace(self, name) -> list:
-        if name in self.values:
-            return [self, self.values[name]]
-        
+        slot = self.names.get(name)
+        if not slot is None and slot < len(self.values) and not self.values[slot] is UNDEFINED:
+            return [self, slot]
+
         if not self.parentEnv is None:
             value = self.parentEnv.checkParentNamespace(name)
         else:
             value = [None, None]
         return value
 
+    def slotName(self, slot: int) -> str:
+        for name, index in self.names.items():
+            if index == slot:
+                return name
+        return f"<slot {slot}>"
+
     def define(self, name, value):
-        if name not in self.values:
-            self.values[name] = value
+        slot = self.names.get(name)
+        if slot is None:
+            slot = len(self.names)
+            self.names[name] = slot
+        self.grow()
+        self.defineAt(slot, value)
+
+    def defineAt(self, slot: int, value):
+        if self.values[slot] is UNDEFINED:
+            self.values[slot] = value
         else:
-            logger.error(f"Variable {name} already instantiated")
-        
+            logger.error(f"Variable {self.slotName(slot)} already instantiated")
+
     def get(self, name):
-        value = self.checkParentNamespace(name)[1]
-        if name in self.values:
-            return self.values[name]
-        elif not value is None:
+        env, slot = self.checkParentNamespace(name)
+        if not env is None:
+            value = env.values[slot]
+            if value.__class__ is Rope:
+                return value.build()
             return value
         else:
             logger.error(f"Undefined variable {name}.")
             exit()
 
+    def getAt(self, depth: int, slot: int, name: str):
+        env = self
+        for _ in range(depth):
+            env = env.parentEnv # type: ignore
+        value = env.values[slot]
+        if value is UNDEFINED:
+            # Declared later in this scope, so fall back to the enclosing scopes by name
+            return self.get(name)
+        return value
+
     def setValue(self, name, value):
-        globalValue = self.checkParentNamespace(name)
-        
-        if name in self.values:
-            self.values[name] = value
-        elif not globalValue == [None, None]:
-            globalValue[0].values[name] = value
+        env, slot = self.checkParentNamespace(name)
+
+        if not env is None:
+            env.values[slot] = value
         else:
             logger.error(f"Undefined variable {name}.")
             exit()
 
-    def callFunc(self, expr, parameters):
-        func = expr.eval(self)
+    def setAt(self, depth: int, slot: int, name: str, value):
+        env = self
+        for _ in range(depth):
+            env = env.parentEnv # type: ignore
+        if env.values[slot] is UNDEFINED:
+            self.setValue(name, value)
+        else:
+            env.values[slot] = value
+
+    def checkCallable(self, expr, parameters):
+        return self.checkFunc(expr, expr.eval(self), parameters)
+
+    def checkFunc(self, expr, func, parameters):
         if not isinstance(func, CallableFactory):
             if not isinstance(func, Callable):
                 logger.error(f"Function expression '{expr.getPrint()}' is not callable.")
                 exit()
-            
+
             if not len(parameters) == func.arity:
                 logger.error(f"Function expression '{expr.getPrint()}' expected {func.arity} arguments but got {len(parameters)}.")
                 exit()
 
-            return func.call(parameters)
-        
+            return func
+
         if not len(parameters) == func.arity:
             logger.error(f"Function expression '{expr.getPrint()}' expected {func.arity} arguments but got {len(parameters)}.")
             exit()
-        
-        callableFunc = func.constructCallable()
 
-        return callableFunc.call(parameters)
+        return func
+
+class RedefinableEnvironment(Environment):
+    """
+    Global frame of the prompt, where declaring a name again replaces its value
+    """
+    def defineAt(self, slot: int, value):
+        self.values[slot] = value
 
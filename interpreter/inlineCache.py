@@ -0,0 +1,66 @@
+import weakref
+from collections import Counter
+
+# Never the value of a callee, so the first call at a site always misses
+EMPTY = object()
+
+def noTarget():
+    return EMPTY
+
+class CallCache:
+    """
+    The function a Call site last called, and whether it is a .il function or a builtin
+    A call whose callee evaluates to the same object again skips the type and arity checks
+    target is a weak reference, a site does not keep a function or the frames it closes over alive
+    """
+    __slots__ = ("name", "target", "factory", "hits", "misses", "__weakref__")
+
+    def __init__(self, name: str) -> None:
+        self.name: str = name
+        self.target = noTarget
+        self.factory: bool = False
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def remember(self, func):
+        # Once func is gone the site misses again, even for a callee that evaluates to null
+        self.target = weakref.ref(func, self.forget)
+
+    def forget(self, reference: weakref.ref):
+        if self.target is reference:
+            self.target = noTarget
+
+    def __reduce__(self):
+        # Sent to a parallelMap worker without the weak reference, the worker starts cold
+        return (CallCache, (self.name,))
+
+class GlobalCache:
+    """
+    Where a Variable site that reads a global finds its value
+    frame is the values of the global frame, outer the frame and slot of a standard
+    function found behind it while the global slot is still undefined
+    """
+    __slots__ = ("name", "frame", "outer", "hits", "misses")
+
+    def __init__(self, name: str) -> None:
+        self.name: str = name
+        self.frame: list | None = None
+        self.outer: tuple[list, int] | None = None
+        self.hits: int = 0
+        self.misses: int = 0
+
+def report(caches: list, top: int = 10) -> str:
+    lines = []
+    for kind, cacheClass in (("call sites", CallCache), ("global reads", GlobalCache)):
+        sites = [cache for cache in caches if cache.__class__ is cacheClass]
+        hits = sum(cache.hits for cache in sites)
+        misses = sum(cache.misses for cache in sites)
+        rate = 100 * hits / (hits + misses) if hits + misses else 0
+        lines.append(f"{kind}: {len(sites)} sites, {hits} hits, {misses} misses ({rate:.1f}% hit rate)")
+
+    # A site that keeps missing sees a different function or frame each time, the first miss is its cold start
+    missed = sorted((cache for cache in caches if cache.misses > 1), key=lambda cache: cache.misses, reverse=True)
+    for cache in missed[:top]:
+        kind = "call" if cache.__class__ is CallCache else "read"
+        lines.append(f"  {kind} {cache.name}: {cache.hits} hits, {cache.misses} misses")
+    return "\n".join(lines)
@@ -1,26 +1,64 @@
 
+from typing import Iterable
+
 from langGrammar import *
-from interpreter.environment import Environment
+from interpreter.environment import Environment, RedefinableEnvironment
+from interpreter.resolver import Resolver
+from interpreter.memoizer import Memoizer
+from interpreter.output import Output
 
 from standardLib.std import *
 
 class Interpreter:
-    def __init__(self, AST: list[Grammar]) -> None:
+    def __init__(self, AST: list[Grammar], redefinable: bool = False) -> None:
         assert AST is not None
         self.AST: list[Grammar] = AST
         
+        # Print statements write here, main points it at a file or changes its buffer size
+        self.output = Output()
+        self.resolver = Resolver(self.output)
+        self.memoizer = Memoizer()
+
         self.globalEnv = Environment()
         
-        self.environment = Environment(self.globalEnv)
+        # At the prompt a top-level var or func can be declared again
+        globalClass = RedefinableEnvironment if redefinable else Environment
+        self.environment = globalClass(self.globalEnv, self.resolver.globalScope)
 
         self.bindSTD()
 
     def bindSTD(self):
-        for key, value in standardFunctions.items():
+        self.builtins: dict[str, Callable] = {key: function() for key, function in standardFunctions.items()}
+        for key, value in self.builtins.items():
             value.environment = self.environment
             self.globalEnv.define(key, value)
+        self.builtins["flush"].output = self.output
+        self.builtins["parallelMap"].output = self.output
+
+    def resolve(self, statements: list[Stmt]):
+        self.resolver.resolve(statements)
+        self.memoizer.analyze(statements, self.resolver.globalScope)
+        self.environment.grow()
 
     def run(self):
-        for statement in self.AST:
-            statement.eval(self.environment)
+        self.resolve(self.AST)
+        with self.output.flushing():
+            self.runStatements(self.AST)
+
+    def runStream(self, statements: Iterable[Stmt]):
+        # Resolves and runs each top-level statement as soon as the parser hands it over
+        with self.output.flushing():
+            for statement in statements:
+                self.resolve([statement])
+                if self.runStatements([statement]):
+                    return
 
+    def runStatements(self, statements: list[Stmt]) -> bool:
+        """
+        Runs resolved top-level statements
+        Returns True when a return outside of any function ended the script
+        """
+        for statement in statements:
+            if not statement.eval(self.environment) is None:
+                return True
+        return False
@@ -0,0 +1,231 @@
+import logging
+logger = logging.getLogger(__name__)
+
+from collections import Counter
+
+from langGrammar import *
+from interpreter.envData import MemoCache, MISSING
+from standardLib.std import standardFunctions
+
+def memoized(memo: MemoCache):
+    # Decorator used by the python engine
+    def decorate(func):
+        def call(*arguments):
+            key = memo.key(arguments)
+            if key is None:
+                return func(*arguments)
+            value = memo.get(key)
+            if value is MISSING:
+                value = func(*arguments)
+                memo.put(key, value)
+            return value
+        return call
+    return decorate
+
+class FunctionFacts:
+    """
+    What a function body does, gathered in one walk
+    base is the index of the function's own scope in the scope stack
+    callees holds (scope, slot, name) for every outer function it calls
+    """
+    def __init__(self, node: Function, base: int) -> None:
+        self.node: Function = node
+        self.base: int = base
+        self.declared: Counter = Counter(param.lexeme for param in node.params)
+        self.locals: set[str] = set()
+        self.callees: list[tuple] = []
+        self.impure: str | None = None
+
+    def markImpure(self, reason: str):
+        if self.impure is None:
+            self.impure = reason
+
+    def dependencies(self) -> set[str]:
+        # Parameters are always set, so declaring them elsewhere cannot change anything
+        params = {param.lexeme for param in self.node.params}
+        return (self.locals - params) | {name for _, _, name in self.callees}
+
+class Memoizer:
+    """
+    Finds pure functions after the resolver has run and gives them a MemoCache
+    A function is pure if it only reads its own parameters and locals, never prints,
+    assigns outer variables or declares functions, and only calls pure functions
+    mode is "off", "marked" for functions declared with memo, or "pure" for every pure function
+    Statements can be analyzed a few at a time, a later one that declares or assigns a name
+    an earlier pure function depends on makes it impure and invalidates its cache
+    """
+    def __init__(self, mode: str = "marked", size: int = 1024) -> None:
+        self.mode: str = mode
+        self.size: int = size
+        self.caches: list[MemoCache] = []
+        # Kept across analyze calls
+        self.functionDecls: dict[str, tuple] = {}
+        self.declaredNames: Counter = Counter()
+        self.assignedNames: set[str] = set()
+        self.pure: dict[int, FunctionFacts] = {}
+        self.callers: dict[str, list[FunctionFacts]] = {}
+        # Pure functions by the names they depend on, so new input only rechecks those it touches
+        self.dependents: dict[str, list[FunctionFacts]] = {}
+
+    def analyze(self, statements: list[Stmt], globalScope: dict):
+        if self.mode == "off":
+            return
+
+        self.functions: list[FunctionFacts] = []
+        self.touched: set[str] = set()
+        for statement in statements:
+            self.walk(statement, [globalScope], None)
+
+        # Every new function starts out pure, so recursion does not rule itself out
+        worklist = [facts for facts in self.functions if facts.impure is None]
+        for facts in worklist:
+            self.pure[id(facts.node)] = facts
+            for _, _, name in facts.callees:
+                self.callers.setdefault(name, []).append(facts)
+            for name in facts.dependencies():
+                self.dependents.setdefault(name, []).append(facts)
+        for name in self.touched:
+            worklist += self.dependents.get(name, [])
+
+        while worklist:
+            facts = worklist.pop()
+            if not id(facts.node) in self.pure:
+                continue
+            self.checkLocals(facts)
+            if facts.impure is None:
+                self.checkCalls(facts)
+            if not facts.impure is None:
+                del self.pure[id(facts.node)]
+                if not facts.node.memo is None:
+                    facts.node.memo.invalidate()
+                worklist.extend(self.callers.get(facts.node.name.lexeme, []))
+
+        for facts in self.functions:
+            node = facts.node
+            if not (node.memoized or self.mode == "pure"):
+                continue
+            if id(node) in self.pure:
+                node.memo = MemoCache(node.name.lexeme, self.size)
+                self.caches.append(node.memo)
+            elif node.memoized:
+                logger.warning(f"Function {node.name.lexeme} is not pure ({facts.impure}), ignoring memo.")
+
+    def declare(self, name: str):
+        self.declaredNames[name] += 1
+        self.touched.add(name)
+
+    def isLocal(self, facts: FunctionFacts, scopes: list[dict], depth: int) -> bool:
+        return len(scopes) - 1 - depth >= facts.base
+
+    def walk(self, node: Grammar | None, scopes: list[dict], facts: FunctionFacts | None):
+        match node:
+            case None:
+                return
+            case Block():
+                inner = scopes if node.scope is None else scopes + [node.scope]
+                for statement in node.statements:
+                    self.walk(statement, inner, facts)
+            case Function():
+                self.declare(node.name.lexeme)
+                self.functionDecls[node.name.lexeme] = (scopes[-1], node.slot, node)
+                if not facts is None:
+                    facts.declared[node.name.lexeme] += 1
+                    facts.markImpure(f"declares {node.name.lexeme}")
+                inner = FunctionFacts(node, len(scopes))
+                for param in node.params:
+                    self.declare(param.lexeme)
+                self.walk(node.body, scopes + [node.scope], inner)
+                self.functions.append(inner)
+            case Var():
+                self.declare(node.name.lexeme)
+                if not facts is None:
+                    facts.declared[node.name.lexeme] += 1
+                self.walk(node.initializer, scopes, facts)
+            case Print():
+                if not facts is None:
+                    facts.markImpure("prints")
+                self.walk(node.expression, scopes, facts)
+            case Assign() | ForIn():
+                self.assignedNames.add(node.name.lexeme)
+                self.touched.add(node.name.lexeme)
+                if not facts is None:
+                    if self.isLocal(facts, scopes, node.depth):
+                        facts.locals.add(node.name.lexeme)
+                    else:
+                        facts.markImpure(f"assigns {node.name.lexeme}")
+                for child in node.children():
+                    self.walk(child, scopes, facts)
+            case MapLiteral():
+                # Every call has to hand back a map of its own
+                if not facts is None:
+                    facts.markImpure("makes a map")
+                for child in node.children():
+                    self.walk(child, scopes, facts)
+            case SetIndex():
+                # The array or map may be reachable from outside the function
+                if not facts is None:
+                    facts.markImpure("assigns an element")
+                for child in node.children():
+                    self.walk(child, scopes, facts)
+            case Variable():
+                if not facts is None:
+                    if self.isLocal(facts, scopes, node.depth):
+                        facts.locals.add(node.name.lexeme)
+                    else:
+                        facts.markImpure(f"reads {node.name.lexeme}")
+            case Call():
+                callee = node.callee
+                while isinstance(callee, Grouping):
+                    callee = callee.expression
+                if not facts is None and isinstance(callee, Variable) and not self.isLocal(facts, scopes, callee.depth):
+                    scope = scopes[len(scopes) - 1 - callee.depth]
+                    facts.callees.append((scope, callee.slot, callee.name.lexeme))
+                elif not facts is None and isinstance(callee, Variable):
+                    facts.markImpure(f"calls {callee.name.lexeme}")
+                else:
+                    # A function picked out by a call or an index could be any function
+                    if not facts is None:
+                        facts.markImpure("calls a function it does not name")
+                    self.walk(callee, scopes, facts)
+                for argument in node.arguments:
+                    self.walk(argument, scopes, facts)
+            case _:
+                for child in node.children():
+                    self.walk(child, scopes, facts)
+
+    def checkLocals(self, facts: FunctionFacts):
+        # A local read before its declaration has run falls back to an outer variable by name
+        # Parameters are always set, so the fallback stops at them
+        params = {param.lexeme for param in facts.node.params}
+        for name in facts.locals - params:
+            if self.declaredNames[name] > facts.declared[name] or name in standardFunctions:
+                facts.markImpure(f"may read an outer {name}")
+
+    def checkCalls(self, facts: FunctionFacts):
+        # A callee counts when its name is declared once, as a function, and never assigned
+        for scope, slot, name in facts.callees:
+            declaration = self.functionDecls.get(name)
+            stable = (
+                not declaration is None
+                and declaration[0] is scope and declaration[1] == slot
+                and self.declaredNames[name] == 1
+                and not name in self.assignedNames
+                and not name in standardFunctions
+            )
+            if not stable or not id(declaration[2]) in self.pure: # type: ignore
+                facts.markImpure(f"calls {name}")
+                return
+
+    def report(self) -> str:
+        lines = []
+        for memo in self.caches:
+            calls = memo.hits + memo.misses
+            rate = 100 * memo.hits / calls if calls else 0
+            invalidated = "" if memo.enabled else ", invalidated"
+            lines.append(
+                f"{memo.name}: {memo.hits} hits, {memo.misses} misses ({rate:.1f}% hit rate), "
+                f"{memo.evictions} evictions, {len(memo.entries)} cached{invalidated}"
+            )
+        if not lines:
+            lines.append("no memoized functions")
+        return "\n".join(lines)
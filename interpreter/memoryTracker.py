@@ -0,0 +1,181 @@
+import sys
+import weakref
+import resource
+from collections import Counter
+
+from langGrammar import *
+from interpreter.interpreter import Interpreter
+
+class LineProbe(Stmt):
+    """
+    Stands in for a statement and makes its line the one allocations are charged to
+    """
+    __slots__ = ("tracker", "statement")
+
+    def __init__(self, tracker: "MemoryTracker", statement: Stmt) -> None:
+        self.tracker: MemoryTracker = tracker
+        self.statement: Stmt = statement
+        self.line: int = statement.line
+
+    def children(self) -> list:
+        return [self.statement]
+
+    def getPrint(self) -> str:
+        return self.statement.getPrint()
+
+    def eval(self, environment: Environment):
+        tracker = self.tracker
+        line = tracker.line
+        tracker.line = self.line
+        completion = self.statement.eval(environment)
+        tracker.line = line
+        return completion
+
+class MemoryTracker:
+    """
+    Counts the frames, functions and callables a run allocates, and the lines that allocated them
+    While installed, the tracked classes count themselves in __init__ and __del__,
+    frames caught in reference cycles are only released when the garbage collector runs
+    Line 0 is the interpreter's own setup
+    """
+    # The classes counted, by the name the report gives them
+    tracked = {"Environment": Environment, "Function": CallableFactory, "Callable": Callable}
+
+    def __init__(self) -> None:
+        self.line: int = 0
+        self.live: Counter = Counter()
+        self.peak: Counter = Counter()
+        self.allocated: Counter = Counter()
+        # Allocations by (kind, line)
+        self.sites: Counter = Counter()
+        # Site of every live tracked object by its id
+        self.owners: dict[int, tuple[str, int]] = {}
+        self.environments: weakref.WeakSet = weakref.WeakSet()
+        self.program: list[Stmt] = []
+        self.installed: list[tuple] = []
+
+    def install(self):
+        for kind, cls in self.tracked.items():
+            self.installed.append((cls, cls.__init__))
+            cls.__init__ = self.counted(kind, cls.__init__)
+            cls.__del__ = self.released()
+
+    def uninstall(self):
+        for cls, init in self.installed:
+            cls.__init__ = init
+            del cls.__del__
+        self.installed = []
+
+    def counted(self, kind: str, init):
+        tracker = self
+        def __init__(obj, *arguments, **keywords):
+            init(obj, *arguments, **keywords)
+            # Subclasses call up through here too, count the outermost __init__ only
+            if id(obj) in tracker.owners:
+                return
+            tracker.owners[id(obj)] = (kind, tracker.line)
+            tracker.sites[(kind, tracker.line)] += 1
+            tracker.allocated[kind] += 1
+            tracker.live[kind] += 1
+            if tracker.live[kind] > tracker.peak[kind]:
+                tracker.peak[kind] = tracker.live[kind]
+            if kind == "Environment":
+                tracker.environments.add(obj)
+        return __init__
+
+    def released(self):
+        tracker = self
+        def __del__(obj):
+            site = tracker.owners.pop(id(obj), None)
+            if not site is None:
+                tracker.live[site[0]] -= 1
+        return __del__
+
+    def instrument(self, statements: list[Stmt]) -> list[Stmt]:
+        self.program.extend(statements)
+        return [self.probe(statement) for statement in statements]
+
+    def probe(self, node: Stmt) -> Stmt:
+        match node:
+            case Block():
+                node.statements = [self.probe(statement) for statement in node.statements]
+            case Function():
+                node.body = self.probe(node.body)
+            case IfStmt():
+                node.thenBranch = self.probe(node.thenBranch)
+                if not node.elseBranch is None:
+                    node.elseBranch = self.probe(node.elseBranch)
+            case WhileStmt() | ForIn():
+                node.statement = self.probe(node.statement)
+        return LineProbe(self, node)
+
+    def astNodes(self) -> tuple[Counter, Counter]:
+        # Node counts and bytes by type, the probes are not part of the program
+        counts = Counter()
+        sizes = Counter()
+        pending = list(self.program)
+        while pending:
+            node = pending.pop()
+            if not node.__class__ is LineProbe:
+                counts[type(node).__name__] += 1
+                sizes[type(node).__name__] += sys.getsizeof(node)
+            pending.extend(child for child in node.children() if not child is None)
+        return counts, sizes
+
+    def heldValues(self) -> tuple[Counter, Counter]:
+        # What the frames still alive hold on to, closures keep their whole chain of frames alive
+        counts = Counter()
+        sizes = Counter()
+        for environment in list(self.environments):
+            for value in environment.values:
+                counts[type(value).__name__] += 1
+                sizes[type(value).__name__] += sys.getsizeof(value)
+        return counts, sizes
+
+    def report(self, top: int = 10) -> str:
+        """
+        Stops counting and describes what was allocated
+        """
+        self.uninstall()
+        lines = [f"{'object':16} {'live':>9} {'peak':>9} {'allocated':>10}"]
+        for kind in self.tracked:
+            lines.append(f"{kind:16} {self.live[kind]:9} {self.peak[kind]:9} {self.allocated[kind]:10}")
+
+        retained = Counter(self.owners.values())
+        lines.append("")
+        lines.append(f"{'allocation site':24} {'allocated':>10} {'live':>9}")
+        for (kind, line), count in self.sites.most_common(top):
+            lines.append(f"{f'line {line} {kind}':24} {count:10} {retained[(kind, line)]:9}")
+
+        counts, sizes = self.heldValues()
+        lines.append("")
+        lines.append(f"{'value in live frames':24} {'count':>10} {'bytes':>9}")
+        for name, count in counts.most_common(top):
+            lines.append(f"{name:24} {count:10} {sizes[name]:9}")
+
+        counts, sizes = self.astNodes()
+        lines.append("")
+        lines.append(f"{'AST node':24} {'count':>10} {'bytes':>9}")
+        for name, count in counts.most_common(top):
+            lines.append(f"{name:24} {count:10} {sizes[name]:9}")
+        lines.append(f"{'total':24} {sum(counts.values()):10} {sum(sizes.values()):9}")
+
+        peakRSS = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == "darwin":
+            # Bytes there, kilobytes elsewhere
+            peakRSS //= 1024
+        lines.append("")
+        lines.append(f"peak RSS {peakRSS / 1024:.1f} MB")
+        return "\n".join(lines)
+
+class MemoryInterpreter(Interpreter):
+    """
+    Tree-walking interpreter that counts what each statement allocates
+    """
+    def __init__(self, AST: list[Grammar], redefinable: bool = False) -> None:
+        self.memoryTracker = MemoryTracker()
+        self.memoryTracker.install()
+        super().__init__(AST, redefinable)
+
+    def runStatements(self, statements: list[Stmt]) -> bool:
+        return super().runStatements(self.memoryTracker.instrument(statements))
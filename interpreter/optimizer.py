@@ -0,0 +1,230 @@
+from langGrammar import *
+
+def nodeCount(node: Grammar | None) -> int:
+    if node is None:
+        return 0
+    return 1 + sum(nodeCount(child) for child in node.children())
+
+def declaredNames(statements: list[Stmt]) -> set[str]:
+    return {statement.name.lexeme for statement in statements if isinstance(statement, (Var, Function))}
+
+def referencedNames(node: Grammar | None) -> set[str]:
+    if node is None:
+        return set()
+    names = set()
+    if isinstance(node, (Variable, Assign, ForIn)):
+        names.add(node.name.lexeme)
+    if isinstance(node, Function):
+        names.update(param.lexeme for param in node.params)
+    for child in node.children():
+        names.update(referencedNames(child))
+    return names
+
+def literalValue(node: Expr):
+    # Returns (True, value) for a literal, looking through groupings
+    while isinstance(node, Grouping):
+        node = node.expression
+    if isinstance(node, Literal):
+        return True, node.value
+    return False, None
+
+class Optimizer:
+    """
+    Rewrites the statement tree to a fixed point before it is resolved
+    Level 1 folds constants and drops dead branches and loops
+    Level 2 also removes Block scopes that declare nothing
+    removed counts the AST nodes each pass took out
+    """
+    def __init__(self, level: int = 1) -> None:
+        self.level: int = level
+        self.removed: dict[str, int] = {
+            "constant folding": 0,
+            "dead branches": 0,
+            "dead loops": 0,
+            "empty scopes": 0,
+        }
+        self.changed: bool = False
+
+    def optimize(self, statements: list[Stmt]) -> list[Stmt]:
+        if self.level <= 0:
+            return statements
+
+        self.changed = True
+        while self.changed:
+            self.changed = False
+            statements = self.statementList(statements)
+        return statements
+
+    def remove(self, optimization: str, count: int):
+        self.removed[optimization] += count
+        self.changed = True
+
+    def report(self) -> str:
+        lines = [f"{name}: {count} nodes removed" for name, count in self.removed.items()]
+        lines.append(f"total: {sum(self.removed.values())} nodes removed")
+        return "\n".join(lines)
+
+    # Statements
+
+    def statementList(self, statements: list[Stmt]) -> list[Stmt]:
+        output = []
+        for statement in statements:
+            optimized = self.statement(statement)
+            if optimized is None:
+                continue
+            if self.level >= 2 and isinstance(optimized, Block) and not declaredNames(optimized.statements):
+                # Nothing is declared, so the statements can run in the enclosing scope
+                self.remove("empty scopes", 1)
+                output.extend(optimized.statements)
+            else:
+                output.append(optimized)
+        return output
+
+    def single(self, statement: Stmt | None) -> Stmt | None:
+        # Optimizes a statement that is not part of a list, like a branch or loop body
+        if statement is None:
+            return None
+        optimized = self.statement(statement)
+        if optimized is None:
+            return Block([])
+        if self.level >= 2 and isinstance(optimized, Block):
+            optimized = self.mergeScopes(optimized)
+        return optimized
+
+    def mergeScopes(self, block: Block) -> Stmt:
+        if declaredNames(block.statements):
+            return block
+
+        if len(block.statements) == 1:
+            self.remove("empty scopes", 1)
+            return block.statements[0]
+
+        # A for loop body becomes Block([body, increment]), fold it into the body's own scope
+        inner = [statement for statement in block.statements if isinstance(statement, Block)]
+        if not len(inner) == 1:
+            return block
+        innerNames = declaredNames(inner[0].statements)
+        siblings = [statement for statement in block.statements if not statement is inner[0]]
+        for sibling in siblings:
+            if referencedNames(sibling) & innerNames:
+                return block
+
+        merged = []
+        for statement in block.statements:
+            if statement is inner[0]:
+                merged.extend(statement.statements)
+            else:
+                merged.append(statement)
+        self.remove("empty scopes", 1)
+        return Block(merged)
+
+    def statement(self, node: Stmt) -> Stmt | None:
+        match node:
+            case Block():
+                node.statements = self.statementList(node.statements)
+                return node
+            case Expression() | Print():
+                node.expression = self.expression(node.expression)
+                return node
+            case Return():
+                if not node.value is None:
+                    node.value = self.expression(node.value)
+                return node
+            case Var():
+                if not node.initializer is None:
+                    node.initializer = self.expression(node.initializer)
+                return node
+            case Function():
+                node.body = self.statement(node.body) # type: ignore
+                return node
+            case IfStmt():
+                return self.ifStatement(node)
+            case WhileStmt():
+                return self.whileStatement(node)
+            case ForIn():
+                node.iterable = self.expression(node.iterable)
+                node.statement = self.single(node.statement) # type: ignore
+                return node
+            case _:
+                return node
+
+    def ifStatement(self, node: IfStmt) -> Stmt | None:
+        node.condition = self.expression(node.condition)
+        isLiteral, value = literalValue(node.condition)
+        if isLiteral:
+            # IfStmt.eval only takes the branch when the condition == True
+            if value == True:
+                taken, dropped = node.thenBranch, node.elseBranch
+            else:
+                taken, dropped = node.elseBranch, node.thenBranch
+            self.remove("dead branches", 1 + nodeCount(node.condition) + nodeCount(dropped))
+            if taken is None:
+                return None
+            return self.statement(taken)
+
+        node.thenBranch = self.single(node.thenBranch) # type: ignore
+        node.elseBranch = self.single(node.elseBranch)
+        return node
+
+    def whileStatement(self, node: WhileStmt) -> Stmt | None:
+        node.expression = self.expression(node.expression)
+        isLiteral, value = literalValue(node.expression)
+        if isLiteral and not value:
+            self.remove("dead loops", nodeCount(node))
+            return None
+
+        node.statement = self.single(node.statement) # type: ignore
+        return node
+
+    # Expressions
+
+    def expression(self, node: Expr) -> Expr:
+        match node:
+            case Grouping():
+                node.expression = self.expression(node.expression)
+                if isinstance(node.expression, Literal):
+                    self.remove("constant folding", 1)
+                    return node.expression
+                return node
+            case Binary():
+                node.left = self.expression(node.left)
+                node.right = self.expression(node.right)
+                if isinstance(node.left, Literal) and isinstance(node.right, Literal):
+                    return self.fold(node)
+                return node
+            case Unary():
+                node.right = self.expression(node.right)
+                if isinstance(node.right, Literal):
+                    return self.fold(node)
+                return node
+            case Assign():
+                node.value = self.expression(node.value)
+                return node
+            case Index():
+                node.object = self.expression(node.object)
+                node.index = self.expression(node.index)
+                return node
+            case MapLiteral():
+                node.entries = [(self.expression(key), self.expression(value)) for key, value in node.entries]
+                return node
+            case SetIndex():
+                node.object = self.expression(node.object)
+                node.index = self.expression(node.index)
+                node.value = self.expression(node.value)
+                return node
+            case Call():
+                node.callee = self.expression(node.callee)
+                node.arguments = [self.expression(argument) for argument in node.arguments]
+                return node
+            case _:
+                return node
+
+    def fold(self, node: Expr) -> Expr:
+        # Operands are literals so eval never touches the environment
+        try:
+            value = node.eval(None) # type: ignore
+        except Exception:
+            # Leave errors like "a" - 1 to be reported when the program runs
+            return node
+        self.remove("constant folding", nodeCount(node) - 1)
+        return Literal(value)
@@ -0,0 +1,83 @@
+import sys
+import logging
+from contextlib import contextmanager
+
+from interpreter.containers import KeysView
+
+# Characters kept before the buffer is written out
+DEFAULT_BUFFER = 1 << 16
+
+class Output:
+    """
+    Where print statements write, owned by the Interpreter
+    Lines wait in a buffer and go to the sink in one write once bufferSize characters are waiting,
+    a bufferSize of 0 writes every line as it is printed
+    sink is any object with write and flush, like an open file or an io.StringIO,
+    None writes to whatever sys.stdout is when the buffer is flushed
+    """
+    def __init__(self, sink=None, bufferSize: int = DEFAULT_BUFFER) -> None:
+        self.sink = sink
+        self.bufferSize: int = bufferSize
+        self.pending: list[str] = []
+        self.size: int = 0
+        # Lines printed and writes made to the sink, for the benchmarks
+        self.lines: int = 0
+        self.flushes: int = 0
+
+    def write(self, value):
+        # print would format a float through str() and write the newline on its own
+        if value.__class__ is float:
+            text = float.__repr__(value)
+        elif value.__class__ is KeysView:
+            # keys(m) prints as the keys it views, not as the Python view
+            text = str(list(value))
+        else:
+            text = str(value)
+        self.pending.append(text)
+        self.lines += 1
+        self.size += len(text) + 1
+        if self.size > self.bufferSize:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        text = "\n".join(self.pending) + "\n"
+        self.pending.clear()
+        self.size = 0
+        self.flushes += 1
+        sink = sys.stdout if self.sink is None else self.sink
+        sink.write(text)
+        sink.flush()
+
+    def take(self) -> list[str]:
+        # The buffered lines, handed back instead of written, which a parallelMap worker does
+        lines = self.pending[:]
+        self.pending.clear()
+        self.size = 0
+        return lines
+
+    def __reduce__(self):
+        # A parallelMap worker gets an empty buffer of its own, the sink stays with the script's process
+        return (Output, (None, self.bufferSize))
+
+    def beforeLog(self, record: logging.LogRecord) -> bool:
+        # A handler filter, lines printed before an error reach the sink before its message
+        self.flush()
+        return True
+
+    @contextmanager
+    def flushing(self):
+        """
+        Flushes before every log record and once the block ends, an error or exit() included,
+        so printed lines keep their place among errors and the reports written after the run
+        """
+        handlers = list(logging.getLogger().handlers)
+        for handler in handlers:
+            handler.addFilter(self.beforeLog)
+        try:
+            yield
+        finally:
+            for handler in handlers:
+                handler.removeFilter(self.beforeLog)
+            self.flush()
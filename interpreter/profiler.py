@@ -0,0 +1,172 @@
+from time import perf_counter
+from collections import defaultdict
+
+from langGrammar import *
+from interpreter.interpreter import Interpreter
+
+class FunctionStats:
+    """
+    Calls and time of one function declaration
+    inclusive counts the outermost running call only, so recursion is not counted twice
+    """
+    def __init__(self, name: str, line: int) -> None:
+        self.name: str = name
+        self.line: int = line
+        self.label: str = f"{name}:{line}"
+        self.calls: int = 0
+        self.inclusive: float = 0
+        self.exclusive: float = 0
+        # Calls of this function currently on the stack
+        self.active: int = 0
+
+class Frame:
+    def __init__(self, parent: "Frame | None", path: str) -> None:
+        self.parent: Frame | None = parent
+        # Names of the frames down to this one, joined by ; as collapsed stacks expect
+        self.path: str = path
+        self.children: float = 0
+
+class StatementProbe(Stmt):
+    """
+    Stands in for a statement and counts how often it runs
+    """
+    __slots__ = ("statement", "hits")
+
+    def __init__(self, statement: Stmt) -> None:
+        self.statement: Stmt = statement
+        self.line: int = statement.line
+        self.hits: int = 0
+
+    def children(self) -> list:
+        return [self.statement]
+
+    def kind(self) -> str:
+        # The resolver swaps a block's class for the way it handles scope, which the report leaves out
+        return "block" if isinstance(self.statement, Block) else type(self.statement).__name__
+
+    def getPrint(self) -> str:
+        return self.statement.getPrint()
+
+    def eval(self, environment: Environment):
+        self.hits += 1
+        return self.statement.eval(environment)
+
+class FunctionProbe(Stmt):
+    """
+    Stands in for a function body and times each call of it
+    Callable.call evaluates the body once per call, tail calls included
+    """
+    __slots__ = ("profiler", "stats", "body")
+
+    def __init__(self, profiler: "Profiler", stats: FunctionStats, body: Stmt) -> None:
+        self.profiler: Profiler = profiler
+        self.stats: FunctionStats = stats
+        self.body: Stmt = body
+        self.line: int = body.line
+
+    def children(self) -> list:
+        return [self.body]
+
+    def getPrint(self) -> str:
+        return self.body.getPrint()
+
+    def eval(self, environment: Environment):
+        return self.profiler.call(self.stats, self.body, environment)
+
+class Profiler:
+    """
+    Per-function call counts and inclusive and exclusive time, and per-statement hit counts
+    instrument() swaps probes into a resolved statement tree, so a run without --profile
+    walks the tree exactly as before
+    Time spent outside any function is counted on a root frame named after the script
+    """
+    def __init__(self, name: str = "<script>") -> None:
+        self.root: Frame = Frame(None, name)
+        self.current: Frame = self.root
+        self.started: float = 0
+        self.functions: list[FunctionStats] = []
+        self.statements: list[StatementProbe] = []
+        # Exclusive seconds by collapsed stack
+        self.stacks: defaultdict[str, float] = defaultdict(float)
+
+    def instrument(self, statements: list[Stmt]) -> list[Stmt]:
+        return [self.probe(statement) for statement in statements]
+
+    def probe(self, node: Stmt) -> Stmt:
+        match node:
+            case Block():
+                node.statements = self.instrument(node.statements)
+            case Function():
+                stats = FunctionStats(node.name.lexeme, node.line)
+                self.functions.append(stats)
+                node.body = FunctionProbe(self, stats, self.probe(node.body))
+            case IfStmt():
+                node.thenBranch = self.probe(node.thenBranch)
+                if not node.elseBranch is None:
+                    node.elseBranch = self.probe(node.elseBranch)
+            case WhileStmt() | ForIn():
+                node.statement = self.probe(node.statement)
+        probe = StatementProbe(node)
+        self.statements.append(probe)
+        return probe
+
+    def start(self):
+        self.started = perf_counter()
+
+    def stop(self):
+        elapsed = perf_counter() - self.started
+        self.stacks[self.root.path] += elapsed - self.root.children
+        self.root.children = 0
+
+    def call(self, stats: FunctionStats, body: Stmt, environment: Environment):
+        parent = self.current
+        frame = Frame(parent, f"{parent.path};{stats.label}")
+        self.current = frame
+        stats.calls += 1
+        stats.active += 1
+        start = perf_counter()
+        try:
+            return body.eval(environment)
+        finally:
+            elapsed = perf_counter() - start
+            stats.active -= 1
+            if stats.active == 0:
+                stats.inclusive += elapsed
+            stats.exclusive += elapsed - frame.children
+            self.stacks[frame.path] += elapsed - frame.children
+            parent.children += elapsed
+            self.current = parent
+
+    def report(self, top: int = 20) -> str:
+        lines = [f"{'function':24} {'calls':>9} {'inclusive':>12} {'exclusive':>12}"]
+        functions = sorted(self.functions, key=lambda stats: stats.exclusive, reverse=True)
+        for stats in [stats for stats in functions if stats.calls][:top]:
+            lines.append(f"{stats.label:24} {stats.calls:9} {stats.inclusive * 1000:10.2f}ms {stats.exclusive * 1000:10.2f}ms")
+        if len(lines) == 1:
+            lines.append("no functions called")
+
+        lines.append("")
+        lines.append(f"{'statement':24} {'hits':>9}")
+        statements = sorted(self.statements, key=lambda probe: probe.hits, reverse=True)
+        for probe in [probe for probe in statements if probe.hits][:top]:
+            lines.append(f"{f'line {probe.line} {probe.kind()}':24} {probe.hits:9}")
+        return "\n".join(lines)
+
+    def collapsedStacks(self) -> str:
+        # One "frame;frame;frame microseconds" line per stack, the input flamegraph.pl and speedscope read
+        return "".join(f"{path} {round(seconds * 1e6)}\n" for path, seconds in self.stacks.items() if seconds > 0)
+
+class ProfilingInterpreter(Interpreter):
+    """
+    Tree-walking interpreter that profiles every statement it runs
+    """
+    def __init__(self, AST: list[Grammar], redefinable: bool = False) -> None:
+        super().__init__(AST, redefinable)
+        self.profiler = Profiler()
+
+    def runStatements(self, statements: list[Stmt]) -> bool:
+        self.profiler.start()
+        try:
+            return super().runStatements(self.profiler.instrument(statements))
+        finally:
+            self.profiler.stop()
@@ -0,0 +1,101 @@
+import io
+import sys
+import logging
+logger = logging.getLogger(__name__)
+
+from parser.scanner import RegexScanner
+from parser.parser import Parser
+from langGrammar import *
+from interpreter.interpreter import Interpreter
+from interpreter.optimizer import Optimizer
+
+OPENERS = {
+    TokenType.LEFT_BRACE: 1, TokenType.LEFT_PAREN: 1, TokenType.LEFT_BRACKET: 1,
+    TokenType.RIGHT_BRACE: -1, TokenType.RIGHT_PAREN: -1, TokenType.RIGHT_BRACKET: -1,
+}
+
+class Repl:
+    """
+    Runs entries typed at the prompt against one interpreter that lives for the whole session
+    An entry is read until its braces and parentheses close, then scanned, parsed,
+    resolved and run on its own, the earlier entries are never looked at again
+    Declaring a var or func again replaces only that global binding
+    """
+    def __init__(self, interpreter: Interpreter, optimizer: Optimizer | None = None, compact: bool = False) -> None:
+        self.interpreter: Interpreter = interpreter
+        self.optimizer: Optimizer | None = optimizer
+        self.compact: bool = compact
+        # Line of the next entry, so messages point into the session
+        self.line: int = 1
+
+    def isComplete(self, source: str) -> bool:
+        scanner = RegexScanner(source)
+        depth = 0
+        tokens = scanner.scan(source, len(source), False)
+        try:
+            while True:
+                token = next(tokens)
+                depth += OPENERS.get(token.type, 0)
+        except StopIteration as stop:
+            # The scan stops early on a string that is still open
+            return depth <= 0 and stop.value == len(source)
+
+    def execute(self, source: str) -> bool:
+        """
+        Runs one complete entry
+        Returns True when it ended with a return outside of any function
+        """
+        scanner = RegexScanner(source)
+        scanner.line = self.line
+        tokens = scanner.scanTokens()
+        self.line = scanner.line + 1
+
+        parser = Parser(tokens, self.compact)
+        statements = parser.parse()
+        if parser.hadError:
+            return False
+        if not self.optimizer is None:
+            statements = self.optimizer.optimize(statements)
+
+        self.interpreter.resolve(statements)
+        # Each entry's output is written before the next prompt
+        with self.interpreter.output.flushing():
+            return self.interpreter.runStatements(statements)
+
+    def run(self):
+        lines = []
+        while True:
+            try:
+                line = input("... " if lines else ">>> ")
+            except EOFError:
+                print()
+                return
+            except KeyboardInterrupt:
+                # Drops the entry being typed
+                print()
+                lines = []
+                continue
+
+            if not lines and line.strip() == "exit":
+                return
+            lines.append(line)
+            source = "\n".join(lines)
+            if not self.isComplete(source):
+                continue
+            lines = []
+
+            # exit() closes sys.stdin before raising, so the prompt's own input is kept out of its reach
+            stdin, sys.stdin = sys.stdin, io.StringIO()
+            try:
+                self.execute(source)
+            except SystemExit:
+                # Errors are logged where they happen, the session goes on
+                pass
+            except KeyboardInterrupt:
+                print()
+                logger.error("Interrupted.")
+            except Exception as error:
+                # Like a str operand of -, which Python raises while the entry runs
+                logger.error(f"{type(error).__name__}: {error}")
+            finally:
+                sys.stdin = stdin
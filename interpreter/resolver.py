@@ -0,0 +1,233 @@
+from langGrammar import *
+from interpreter.inlineCache import CallCache, GlobalCache
+from interpreter.output import Output
+
+ropeReads = {Variable: RopeVariable, GlobalVariable: GlobalRopeVariable}
+
+def isConcat(node: Assign) -> bool:
+    # s = s + x, where evaluating x cannot assign s or read it through a call
+    value = node.value
+    if not node.__class__ is Assign or not value.__class__ is Binary or not value.operator.type == TokenType.PLUS:
+        return False
+    if not isinstance(value.left, Variable) or not value.left.name.lexeme == node.name.lexeme:
+        return False
+    if isinstance(value.right, Literal) and not value.right.value.__class__ is str:
+        # i = i + 1 never makes a string
+        return False
+    pending = [value.right]
+    while pending:
+        child = pending.pop()
+        if isinstance(child, (Call, Assign, SetIndex)):
+            return False
+        pending.extend(grandchild for grandchild in child.children() if not grandchild is None)
+    return True
+
+def concatTargets(statements: list[Stmt]) -> set[str]:
+    # Names some s = s + x among statements assigns, only their reads can turn into Rope reads
+    names = set()
+    pending: list = list(statements)
+    while pending:
+        node = pending.pop()
+        if isinstance(node, Assign) and isConcat(node):
+            names.add(node.name.lexeme)
+        pending.extend(child for child in node.children() if not child is None)
+    return names
+
+class Resolver:
+    """
+    Static pass run between Parser.parse() and Interpreter.run()
+    Lays out every scope as a list of slots and gives each Variable and Assign
+    the number of frames to hop (depth) and the slot to index in that frame
+    """
+    def __init__(self, output: Output | None = None) -> None:
+        # Handed to every print statement
+        self.output: Output = Output() if output is None else output
+        # Kept across calls so incremental input keeps the same global layout
+        self.globalScope: dict = {}
+        self.scopes: list[dict] = [self.globalScope]
+        self.functionDepth: int = 0
+        # Functions declared so far, to tell whether a block declares any
+        self.functionCount: int = 0
+        # Every inline cache handed out, kept only for --ic-stats, which sets it to a list
+        self.caches: list | None = None
+        # Names a ConcatAssign in the statements being resolved may grow
+        self.candidates: set[str] = set()
+        # Reads of those names by scope id then slot, the scope is kept so its id stays unique
+        # A scope's entry goes once it is resolved, the whole dict once the statements are
+        self.reads: dict[int, tuple[dict, dict[int, list]]] = {}
+        # Reads of globals inside functions by slot, a function declared now can run after a later s = s + x
+        self.globalReads: dict[int, list] = {}
+        # Globals read inside functions resolved by an earlier call, the vm and closure engines
+        # have compiled those reads already, so the globals stay plain strings
+        self.settled: set[int] = set()
+        # Slots that a ConcatAssign grows by scope id, every read of them has to build the Rope
+        self.ropes: dict[int, set[int]] = {}
+
+    def declare(self, name: str) -> int:
+        scope = self.scopes[-1]
+        if not name in scope:
+            scope[name] = len(scope)
+        return scope[name]
+
+    def hoist(self, statements: list[Stmt]):
+        # Reserve slots up front so closures can see names declared later in the same block
+        for statement in statements:
+            if isinstance(statement, (Var, Function)):
+                self.declare(statement.name.lexeme)
+
+    def lookup(self, name: str) -> tuple[int, int]:
+        for depth, scope in enumerate(reversed(self.scopes)):
+            if name in scope:
+                return depth, scope[name]
+
+        # Not declared anywhere yet, so it is a global defined later or a std function
+        if not name in self.globalScope:
+            self.globalScope[name] = len(self.globalScope)
+        return len(self.scopes) - 1, self.globalScope[name]
+
+    def addRead(self, node: Variable):
+        scope = self.scopes[-1 - node.depth]
+        if node.slot in self.ropes.get(id(scope), ()):
+            node.__class__ = ropeReads[node.__class__]
+            return
+        if scope is self.globalScope and self.functionDepth > 0:
+            self.globalReads.setdefault(node.slot, []).append(node)
+        elif node.name.lexeme in self.candidates:
+            self.reads.setdefault(id(scope), (scope, {}))[1].setdefault(node.slot, []).append(node)
+
+    def addRope(self, node: Assign):
+        scope = self.scopes[-1 - node.depth]
+        slots = self.ropes.setdefault(id(scope), set())
+        if not node.slot in slots and scope is self.globalScope and node.slot in self.settled:
+            return
+        node.__class__ = ConcatAssign
+        if node.slot in slots:
+            return
+        slots.add(node.slot)
+        # Reads resolved before this assignment, like one in a function declared earlier
+        reads = self.reads.get(id(scope), (None, {}))[1].pop(node.slot, [])
+        if scope is self.globalScope:
+            reads += self.globalReads.pop(node.slot, [])
+        for read in reads:
+            read.__class__ = ropeReads[read.__class__]
+
+    def closeScope(self):
+        # Nothing resolved later reads this scope's slots, so its reads and ropes can go
+        scope = self.scopes.pop()
+        self.reads.pop(id(scope), None)
+        self.ropes.pop(id(scope), None)
+
+    def resolve(self, statements: list[Stmt]):
+        """
+        Resolves top-level statements, the whole program or one statement at a time
+        Each of them runs once, so past the statements only reads inside functions could still meet a later Rope,
+        their globals are settled instead
+        """
+        self.candidates = concatTargets(statements)
+        self.resolveStatements(statements)
+        self.candidates = set()
+        self.reads = {}
+        self.settled.update(self.globalReads)
+        self.globalReads = {}
+
+    def resolveStatements(self, statements: list[Stmt]):
+        self.hoist(statements)
+        for statement in statements:
+            self.resolveNode(statement)
+
+    def resolveBlock(self, block: Block):
+        if not any(isinstance(statement, (Var, Function)) for statement in block.statements):
+            # Declares nothing, so it needs no frame and its names resolve to the enclosing scopes
+            block.scope = None
+            block.__class__ = ScopelessBlock
+            self.resolveStatements(block.statements)
+            return
+
+        functions = self.functionCount
+        self.scopes.append(block.scope)
+        self.resolveStatements(block.statements)
+        self.closeScope()
+        if self.functionCount == functions:
+            block.__class__ = ReusedFrameBlock
+
+    def resolveNode(self, node: Grammar | None):
+        match node:
+            case None:
+                return
+
+            case Block():
+                self.resolveBlock(node)
+            case Print():
+                node.output = self.output
+                self.resolveNode(node.expression)
+            case Expression():
+                self.resolveNode(node.expression)
+            case Return():
+                self.resolveNode(node.value)
+                node.tailCall = self.functionDepth > 0 and isinstance(node.value, Call)
+            case Var():
+                self.resolveNode(node.initializer)
+                node.slot = self.declare(node.name.lexeme)
+            case Function():
+                self.functionCount += 1
+                node.slot = self.declare(node.name.lexeme)
+                self.scopes.append(node.scope)
+                for param in node.params:
+                    self.declare(param.lexeme)
+                self.functionDepth += 1
+                self.resolveNode(node.body)
+                self.functionDepth -= 1
+                self.closeScope()
+            case IfStmt():
+                self.resolveNode(node.condition)
+                self.resolveNode(node.thenBranch)
+                self.resolveNode(node.elseBranch)
+            case WhileStmt():
+                self.resolveNode(node.expression)
+                self.resolveNode(node.statement)
+            case ForIn():
+                self.resolveNode(node.iterable)
+                node.depth, node.slot = self.lookup(node.name.lexeme)
+                # No name can hold a space, so this never meets a variable
+                node.iteratorSlot = self.declare(" iterator")
+                self.resolveNode(node.statement)
+
+            case Assign():
+                self.resolveNode(node.value)
+                node.depth, node.slot = self.lookup(node.name.lexeme)
+                if isConcat(node):
+                    self.addRope(node)
+            case Variable():
+                node.depth, node.slot = self.lookup(node.name.lexeme)
+                if node.depth == len(self.scopes) - 1:
+                    node.__class__ = GlobalVariable
+                    node.cache = GlobalCache(node.name.lexeme)
+                    if not self.caches is None:
+                        self.caches.append(node.cache)
+                self.addRead(node)
+            case Binary():
+                self.resolveNode(node.left)
+                self.resolveNode(node.right)
+            case Grouping():
+                self.resolveNode(node.expression)
+            case Unary():
+                self.resolveNode(node.right)
+            case Index():
+                self.resolveNode(node.object)
+                self.resolveNode(node.index)
+            case MapLiteral():
+                for child in node.children():
+                    self.resolveNode(child)
+            case SetIndex():
+                self.resolveNode(node.object)
+                self.resolveNode(node.index)
+                self.resolveNode(node.value)
+            case Call():
+                node.cache = CallCache(node.callee.name.lexeme if isinstance(node.callee, Variable) else node.callee.getPrint())
+                if not self.caches is None:
+                    self.caches.append(node.cache)
+                self.resolveNode(node.callee)
+                for argument in node.arguments:
+                    self.resolveNode(argument)
+            case _:
+                return
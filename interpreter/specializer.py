@@ -0,0 +1,293 @@
+from collections import Counter
+
+from langGrammar import *
+from interpreter.interpreter import Interpreter
+
+class Site:
+    """
+    What one Binary or Unary node has seen while it runs adaptively
+    types holds the operand classes, a (left, right) pair for Binary
+    """
+    __slots__ = ("specializer", "countdown", "types", "deopts")
+
+    def __init__(self, specializer: "Specializer") -> None:
+        self.specializer: Specializer = specializer
+        self.countdown: int = specializer.warmup
+        self.types: set = set()
+        self.deopts: int = 0
+
+class AdaptiveBinary(Binary):
+    """
+    Runs the generic operation and records operand types until the site is warm
+    """
+    __slots__ = ()
+
+    def eval(self, environment: Environment):
+        left = self.left.eval(environment)
+        right = self.right.eval(environment)
+        site = self.site
+        site.types.add((left.__class__, right.__class__))
+        site.countdown -= 1
+        if site.countdown == 0:
+            site.specializer.specialize(self, binaryVariants, site.types)
+        return self.operate(left, right)
+
+class AdaptiveUnary(Unary):
+    __slots__ = ()
+
+    def eval(self, environment: Environment):
+        value = self.right.eval(environment)
+        site = self.site
+        site.types.add(value.__class__)
+        site.countdown -= 1
+        if site.countdown == 0:
+            site.specializer.specialize(self, unaryVariants, site.types)
+        return self.operate(value)
+
+def deoptimizeBinary(node: Binary, left, right):
+    return node.site.specializer.deoptimize(node, AdaptiveBinary).operate(left, right)
+
+def deoptimizeUnary(node: Unary, value):
+    return node.site.specializer.deoptimize(node, AdaptiveUnary).operate(value)
+
+# Each variant is written out so CPython keeps separate inline caches for it
+# Binary.operate gives the same result for these operand types
+
+class FloatAdd(Binary):
+    __slots__ = ()
+
+    def eval(self, environment: Environment):
+        left = self.left.eval(environment)
+        right = self.right.eval(environment)
+        if left.__class__ is float and right.__class__ is float:
+            return left + right
+        return deoptimizeBinary(self, left, right)
+
+class FloatSubtract(Binary):
+    __slots__ = ()
+
+    def eval(self, environment: Environment):
+        left = self.left.eval(environment)
+        right = self.right.eval(environment)
+        if left.__class__ is float and right.__class__ is float:
+            return left - right
+        return deoptimizeBinary(self, left, right)
+
+class FloatMultiply(Binary):
+    __slots__ = ()
+
+    def eval(self, environment: Environment):
+        left = self.left.eval(environment)
+        right = self.right.eval(environment)
+        if left.__class__ is float and right.__class__ is float:
+            return left * right
+        return deoptimizeBinary(self, left, right)
+
+class FloatDivide(Binary):
+    __slots__ = ()
+
+    def eval(self, environment: Environment):
+        left = self.left.eval(environment)
+        right = self.right.eval(environment)
+        if left.__class__ is float and right.__class__ is float:
+            return left / right
+        return deoptimizeBinary(self, left, right)
+
+class FloatLess(Binary):
+    __slots__ = ()
+
+    def eval(self, environment: Environment):
+        left = self.left.eval(environment)
+        right = self.right.eval(environment)
+        if left.__class__ is float and right.__class__ is float:
+            return left < right
+        return deoptimizeBinary(self, left, right)
+
+class FloatLessEqual(Binary):
+    __slots__ = ()
+
+    def eval(self, environment: Environment):
+        left = self.left.eval(environment)
+        right = self.right.eval(environment)
+        if left.__class__ is float and right.__class__ is float:
+            return left <= right
+        return deoptimizeBinary(self, left, right)
+
+class FloatGreater(Binary):
+    __slots__ = ()
+
+    def eval(self, environment: Environment):
+        left = self.left.eval(environment)
+        right = self.right.eval(environment)
+        if left.__class__ is float and right.__class__ is float:
+            return left > right
+        return deoptimizeBinary(self, left, right)
+
+class FloatGreaterEqual(Binary):
+    __slots__ = ()
+
+    def eval(self, environment: Environment):
+        left = self.left.eval(environment)
+        right = self.right.eval(environment)
+        if left.__class__ is float and right.__class__ is float:
+            return left >= right
+        return deoptimizeBinary(self, left, right)
+
+class FloatEqual(Binary):
+    __slots__ = ()
+
+    def eval(self, environment: Environment):
+        left = self.left.eval(environment)
+        right = self.right.eval(environment)
+        if left.__class__ is float and right.__class__ is float:
+            return left == right
+        return deoptimizeBinary(self, left, right)
+
+class FloatNotEqual(Binary):
+    __slots__ = ()
+
+    def eval(self, environment: Environment):
+        left = self.left.eval(environment)
+        right = self.right.eval(environment)
+        if left.__class__ is float and right.__class__ is float:
+            return left != right
+        return deoptimizeBinary(self, left, right)
+
+class StringAdd(Binary):
+    __slots__ = ()
+
+    def eval(self, environment: Environment):
+        left = self.left.eval(environment)
+        right = self.right.eval(environment)
+        if left.__class__ is str and right.__class__ is str:
+            return left + right
+        return deoptimizeBinary(self, left, right)
+
+class StringEqual(Binary):
+    __slots__ = ()
+
+    def eval(self, environment: Environment):
+        left = self.left.eval(environment)
+        right = self.right.eval(environment)
+        if left.__class__ is str and right.__class__ is str:
+            return left == right
+        return deoptimizeBinary(self, left, right)
+
+class StringNotEqual(Binary):
+    __slots__ = ()
+
+    def eval(self, environment: Environment):
+        left = self.left.eval(environment)
+        right = self.right.eval(environment)
+        if left.__class__ is str and right.__class__ is str:
+            return left != right
+        return deoptimizeBinary(self, left, right)
+
+class FloatNegate(Unary):
+    """
+    Unary.operate gives -float(value), which for a float is just -value
+    """
+    __slots__ = ()
+
+    def eval(self, environment: Environment):
+        value = self.right.eval(environment)
+        if value.__class__ is float:
+            return -value
+        return deoptimizeUnary(self, value)
+
+# Variant classes by (operator, operand types)
+binaryVariants = {
+    (TokenType.PLUS, (float, float)): FloatAdd,
+    (TokenType.MINUS, (float, float)): FloatSubtract,
+    (TokenType.STAR, (float, float)): FloatMultiply,
+    (TokenType.SLASH, (float, float)): FloatDivide,
+    (TokenType.LESS, (float, float)): FloatLess,
+    (TokenType.LESS_EQUAL, (float, float)): FloatLessEqual,
+    (TokenType.GREATER, (float, float)): FloatGreater,
+    (TokenType.GREATER_EQUAL, (float, float)): FloatGreaterEqual,
+    (TokenType.EQUAL_EQUAL, (float, float)): FloatEqual,
+    (TokenType.BANG_EQUAL, (float, float)): FloatNotEqual,
+    (TokenType.PLUS, (str, str)): StringAdd,
+    (TokenType.EQUAL_EQUAL, (str, str)): StringEqual,
+    (TokenType.BANG_EQUAL, (str, str)): StringNotEqual,
+}
+unaryVariants = {
+    (TokenType.MINUS, float): FloatNegate,
+}
+
+class Specializer:
+    """
+    Quickening for Binary and Unary nodes
+    instrument() makes every such node adaptive, after warmup runs a node that only saw one
+    operand type rewrites its class to a variant for that type and operator
+    A variant whose type guard fails goes back to adaptive with a longer warmup,
+    after maxDeopts failures, or when a site sees mixed types, it keeps the generic form
+    """
+    def __init__(self, warmup: int = 8, maxDeopts: int = 4) -> None:
+        self.warmup: int = warmup
+        self.maxDeopts: int = maxDeopts
+        self.sites: int = 0
+        self.specialized: Counter = Counter()
+        self.deoptimized: Counter = Counter()
+        self.generic: int = 0
+
+    def instrument(self, statements: list[Stmt]):
+        pending: list = list(statements)
+        while pending:
+            node = pending.pop()
+            if node.__class__ is Binary:
+                node.site = Site(self)
+                node.__class__ = AdaptiveBinary
+                self.sites += 1
+            elif node.__class__ is Unary:
+                node.site = Site(self)
+                node.__class__ = AdaptiveUnary
+                self.sites += 1
+            pending.extend(child for child in node.children() if not child is None)
+
+    def specialize(self, node: Binary | Unary, variants: dict, types: set):
+        variant = None
+        if len(types) == 1:
+            variant = variants.get((node.operator.type, next(iter(types))))
+        if variant is None:
+            node.__class__ = Binary if isinstance(node, Binary) else Unary
+            self.generic += 1
+            return
+        node.__class__ = variant
+        self.specialized[variant.__name__] += 1
+
+    def deoptimize(self, node: Binary | Unary, adaptive: type) -> Binary | Unary:
+        site = node.site
+        self.deoptimized[node.__class__.__name__] += 1
+        site.deopts += 1
+        site.types.clear()
+        if site.deopts > self.maxDeopts:
+            node.__class__ = adaptive.__base__
+            self.generic += 1
+        else:
+            # Back off so a site that flips between types does not keep respecializing
+            site.countdown = self.warmup << site.deopts
+            node.__class__ = adaptive
+        return node
+
+    def report(self) -> str:
+        lines = [
+            f"{self.sites} sites, {sum(self.specialized.values())} specializations, "
+            f"{sum(self.deoptimized.values())} deoptimizations, {self.generic} left generic"
+        ]
+        for name, count in sorted(self.specialized.items()):
+            deopts = self.deoptimized[name]
+            lines.append(f"  {name}: {count} specialized" + (f", {deopts} deoptimized" if deopts else ""))
+        return "\n".join(lines)
+
+class SpecializingInterpreter(Interpreter):
+    """
+    Tree-walking interpreter whose Binary and Unary nodes specialize themselves
+    """
+    def __init__(self, AST: list[Grammar], redefinable: bool = False) -> None:
+        super().__init__(AST, redefinable)
+        self.specializer = Specializer()
+
+    def runStatements(self, statements: list[Stmt]) -> bool:
+        self.specializer.instrument(statements)
+        return super().runStatements(statements)
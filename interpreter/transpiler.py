@@ -0,0 +1,605 @@
+import logging
+logger = logging.getLogger(__name__)
+
+from langGrammar import *
+from interpreter.interpreter import Interpreter
+from interpreter.memoizer import memoized
+from interpreter.arrays import logicalNot, logicalAnd, logicalOr, negate
+from interpreter.containers import getIndex, setIndex, checkKey, iterate
+from standardLib.std import standardFunctions
+
+class Unset:
+    def __repr__(self):
+        return "undefined"
+
+# Value of a generated local whose .il declaration has not run yet
+UNSET = Unset()
+# Returned by a block compiled to its own def when it finishes without a return
+NORMAL = object()
+
+# Runtime errors are reported under the same logger as the other engines
+runtimeLogger = logging.getLogger("interpreter.environment")
+
+def undefined(name: str):
+    runtimeLogger.error(f"Undefined variable {name}.")
+    exit()
+
+def redefined(name: str):
+    runtimeLogger.error(f"Variable {name} already instantiated")
+
+def native(func: Callable):
+    def call(*arguments):
+        if not len(arguments) == func.arity:
+            logger.error(f"Function '{func}' expected {func.arity} arguments but got {len(arguments)}.")
+            exit()
+        return func.call(list(arguments))
+    # So builtins like parallelMap can tell a std function from a generated def
+    call.builtin = func
+    return call
+
+binaryOperators = {
+    TokenType.EQUAL_EQUAL: "{0} == {1}",
+    TokenType.BANG_EQUAL: "{0} != {1}",
+    TokenType.GREATER: "{0} > {1}",
+    TokenType.GREATER_EQUAL: "{0} >= {1}",
+    TokenType.LESS: "{0} < {1}",
+    TokenType.LESS_EQUAL: "{0} <= {1}",
+    TokenType.PLUS: "{0} + {1}",
+    TokenType.MINUS: "{0} - {1}",
+    TokenType.STAR: "{0} * {1}",
+    TokenType.SLASH: "{0} / {1}",
+    TokenType.AND: "_and({0}, {1})",
+    TokenType.OR: "_or({0}, {1})",
+}
+
+comparisonOperators = [
+    TokenType.EQUAL_EQUAL, TokenType.BANG_EQUAL,
+    TokenType.GREATER, TokenType.GREATER_EQUAL,
+    TokenType.LESS, TokenType.LESS_EQUAL,
+]
+
+class PyFunction:
+    """
+    A def in the generated module: .il functions, blocks that need fresh
+    closure cells on every run, and _main for the top level
+    """
+    def __init__(self, name: str) -> None:
+        self.name: str = name
+        self.nonlocals: set[str] = set()
+        self.globals: set[str] = set()
+        self.unset: list[str] = []
+        self.temps: int = 0
+
+class ScopeInfo:
+    """
+    Mirrors one of the resolver's scopes while generating code
+    firstDecl maps a declared name to the index of the statement declaring it
+    """
+    def __init__(self, names: dict, func: PyFunction, suffix: str, isFunction=False) -> None:
+        self.names: dict = names
+        self.func: PyFunction = func
+        self.suffix: str = suffix
+        self.isFunction: bool = isFunction
+        self.firstDecl: dict = {}
+        self.declKind: dict = {}
+        self.index: int = -1
+
+    def declareStatements(self, statements: list[Stmt]):
+        for index, statement in enumerate(statements):
+            if isinstance(statement, (Var, Function)) and not statement.name.lexeme in self.firstDecl:
+                self.firstDecl[statement.name.lexeme] = index
+                self.declKind[statement.name.lexeme] = type(statement)
+
+    def pyName(self, name: str) -> str:
+        return f"v_{name}{self.suffix}"
+
+class Transpiler:
+    """
+    Generates a Python module equivalent to a resolved statement tree
+    .il scopes become Python locals and closure cells, so CPython runs the program directly
+    A name that might be read before its declaration has run is guarded with UNSET
+    and falls back to the enclosing scope, as Environment.getAt does
+    """
+    def __init__(self, sourceName: str = "<il>") -> None:
+        self.sourceName: str = sourceName
+        self.lines: list[str] = []
+        self.indent: int = 0
+        self.scopes: list[ScopeInfo] = []
+        self.func: PyFunction = PyFunction("_main")
+        self.scopeCount: int = 0
+        # Caches of memoized functions, passed to the module as _memos
+        self.memos: list = []
+
+    def transpile(self, statements: list[Stmt], globalScope: dict) -> str:
+        header = [
+            f"# Generated from {self.sourceName}",
+            "",
+        ]
+        for name in standardFunctions:
+            header.append(f"s_{name} = _native(_std[{name!r}])")
+        header.append("")
+
+        scope = ScopeInfo(globalScope, self.func, "")
+        scope.declareStatements(statements)
+        self.scopes.append(scope)
+        body = self.functionBody(self.func, lambda: self.statementList(scope, statements))
+        self.scopes.pop()
+
+        return "\n".join(header + ["def _main():"] + body + ["", "_main()", ""])
+
+    # Output helpers
+
+    def emit(self, line: str):
+        self.lines.append("    " * self.indent + line)
+
+    def temp(self) -> str:
+        self.func.temps += 1
+        return f"_t{self.func.temps}"
+
+    def functionBody(self, func: PyFunction, generate) -> list[str]:
+        enclosing = (self.lines, self.indent, self.func)
+        self.lines, self.indent, self.func = [], enclosing[1] + 1, func
+        generate()
+        body = self.lines
+        prologue = []
+        indent = "    " * self.indent
+        if func.globals:
+            prologue.append(f"{indent}global {', '.join(sorted(func.globals))}")
+        if func.nonlocals:
+            prologue.append(f"{indent}nonlocal {', '.join(sorted(func.nonlocals))}")
+        for name in func.unset:
+            prologue.append(f"{indent}{name} = _UNSET")
+        self.lines, self.indent, self.func = enclosing
+        if not body and not prologue:
+            body = ["    " * (self.indent + 1) + "pass"]
+        return prologue + body
+
+    # Name resolution
+
+    def nameChain(self, name: str, depth: int) -> list[tuple[str, bool, ScopeInfo | None]]:
+        """
+        Python names that may hold the variable, innermost first, with the scope owning each
+        The bool says whether the name must be checked against UNSET
+        The chain ends with an unguarded entry, a std function or undefined()
+        """
+        chain = []
+        level = len(self.scopes) - 1 - depth
+        while level >= 0:
+            scope = self.scopes[level]
+            if name in scope.firstDecl or (scope.isFunction and name in scope.names):
+                crossesFunction = any(inner.isFunction for inner in self.scopes[level + 1:])
+                pyName = scope.pyName(name)
+                declIndex = scope.firstDecl.get(name, -1)
+                if scope.isFunction or scope.index > declIndex or (
+                    scope.index == declIndex and crossesFunction and scope.declKind[name] is Function
+                ):
+                    chain.append((pyName, False, scope))
+                    return chain
+                if crossesFunction:
+                    if not pyName in scope.func.unset:
+                        scope.func.unset.append(pyName)
+                    chain.append((pyName, True, scope))
+            level -= 1
+
+        if name in standardFunctions:
+            chain.append((f"s_{name}", False, None))
+        else:
+            chain.append((f"_undefined({name!r})", False, None))
+        return chain
+
+    def readName(self, name: str, depth: int) -> str:
+        chain = self.nameChain(name, depth)
+        expr = chain[-1][0]
+        for pyName, guarded, scope in reversed(chain[:-1]):
+            expr = f"({pyName} if {pyName} is not _UNSET else {expr})"
+        return expr
+
+    def assignTargets(self, name: str, depth: int) -> list[str]:
+        chain = self.nameChain(name, depth)
+        for pyName, guarded, scope in chain:
+            if scope is None:
+                if pyName.startswith("s_"):
+                    # Assigning a std name replaces it, as Environment.setValue does
+                    self.func.globals.add(pyName)
+            elif not scope.func is self.func:
+                self.func.nonlocals.add(pyName)
+        return [pyName for pyName, guarded, scope in chain]
+
+    # Statements
+
+    def statementList(self, scope: ScopeInfo, statements: list[Stmt]):
+        for index, statement in enumerate(statements):
+            scope.index = index
+            self.statement(statement)
+
+    def statement(self, node: Stmt):
+        match node:
+            case Block(): self.block(node)
+            case Expression():
+                if isinstance(node.expression, Assign):
+                    self.assignStatement(node.expression)
+                else:
+                    self.emit(self.expression(node.expression))
+            case Print():
+                self.emit(f"_print({self.expression(node.expression)})")
+            case Return():
+                if node.value is None:
+                    self.emit("return None")
+                else:
+                    self.emit(f"return {self.expression(node.value)}")
+            case Var(): self.var(node)
+            case Function(): self.function(node)
+            case IfStmt():
+                self.emit(f"if {self.condition(node.condition)}:")
+                self.nested(node.thenBranch)
+                if not node.elseBranch is None:
+                    self.emit("else:")
+                    self.nested(node.elseBranch)
+            case WhileStmt():
+                self.emit(f"while {self.expression(node.expression)}:")
+                self.nested(node.statement)
+            case ForIn(): self.forIn(node)
+            case _:
+                self.emit("pass")
+
+    def forIn(self, node: ForIn):
+        value = self.temp()
+        self.emit(f"for {value} in _iterate({self.expression(node.iterable)}):")
+        self.indent += 1
+        targets = self.assignTargets(node.name.lexeme, node.depth)
+        if len(targets) == 1 and not targets[0].startswith("_"):
+            self.emit(f"{targets[0]} = {value}")
+        else:
+            self.emit(self.assignExpression(targets, value))
+        self.indent -= 1
+        self.nested(node.statement)
+
+    def nested(self, node: Stmt):
+        self.indent += 1
+        start = len(self.lines)
+        self.statement(node)
+        if len(self.lines) == start:
+            self.emit("pass")
+        self.indent -= 1
+
+    def declarationTarget(self, name: str) -> str | None:
+        # None when this is a repeat declaration, which only logs an error
+        scope = self.scopes[-1]
+        if not scope.firstDecl.get(name) == scope.index:
+            return None
+        return scope.pyName(name)
+
+    def var(self, node: Var):
+        name = node.name.lexeme
+        value = "None" if node.initializer is None else self.expression(node.initializer)
+        target = self.declarationTarget(name)
+        if target is None:
+            self.emit(value)
+            self.emit(f"_redefined({name!r})")
+        else:
+            self.emit(f"{target} = {value}")
+
+    def function(self, node: Function):
+        name = node.name.lexeme
+        target = self.declarationTarget(name)
+        defName = target if not target is None else f"_f{self.temp()}"
+
+        self.scopeCount += 1
+        paramScope = ScopeInfo(node.scope, PyFunction(defName), f"_s{self.scopeCount}", isFunction=True)
+        params = []
+        duplicates = []
+        for param in node.params:
+            pyName = paramScope.pyName(param.lexeme)
+            if pyName in params:
+                duplicates.append(param.lexeme)
+                pyName = f"_p{len(params)}"
+            params.append(pyName)
+
+        def generate():
+            for duplicate in duplicates:
+                self.emit(f"_redefined({duplicate!r})")
+            self.functionContents(node.body)
+
+        self.scopes.append(paramScope)
+        body = self.functionBody(paramScope.func, generate)
+        self.scopes.pop()
+
+        if not node.memo is None:
+            self.emit(f"@_memoized(_memos[{len(self.memos)}])")
+            self.memos.append(node.memo)
+        self.emit(f"def {defName}({', '.join(params)}):")
+        self.lines.extend(body)
+        if target is None:
+            self.emit(f"_redefined({name!r})")
+
+    def functionContents(self, body: Stmt):
+        # The body block shares the def with the parameters
+        if isinstance(body, Block) and not body.scope is None:
+            self.scopeCount += 1
+            scope = ScopeInfo(body.scope, self.func, f"_s{self.scopeCount}")
+            scope.declareStatements(body.statements)
+            self.scopes.append(scope)
+            self.statementList(scope, body.statements)
+            self.scopes.pop()
+        else:
+            self.statement(body)
+
+    def block(self, node: Block):
+        if node.scope is None:
+            # The resolver gave it no scope, so its statements belong to the enclosing one
+            start = len(self.lines)
+            for statement in node.statements:
+                self.statement(statement)
+            if len(self.lines) == start:
+                self.emit("pass")
+            return
+
+        self.scopeCount += 1
+        suffix = f"_s{self.scopeCount}"
+        if not capturedNames(node):
+            scope = ScopeInfo(node.scope, self.func, suffix)
+            scope.declareStatements(node.statements)
+            self.scopes.append(scope)
+            start = len(self.lines)
+            self.statementList(scope, node.statements)
+            if len(self.lines) == start:
+                self.emit("pass")
+            self.scopes.pop()
+            return
+
+        # Closures capture this block's variables, so every run needs fresh cells
+        blockName = f"_block{suffix}"
+        scope = ScopeInfo(node.scope, PyFunction(blockName), suffix)
+        scope.declareStatements(node.statements)
+
+        def generate():
+            self.statementList(scope, node.statements)
+            self.emit("return _NORMAL")
+
+        self.scopes.append(scope)
+        body = self.functionBody(scope.func, generate)
+        self.scopes.pop()
+
+        result = self.temp()
+        self.emit(f"def {blockName}():")
+        self.lines.extend(body)
+        self.emit(f"{result} = {blockName}()")
+        self.emit(f"if {result} is not _NORMAL:")
+        self.emit(f"    return {result}")
+
+    def assignStatement(self, node: Assign):
+        targets = self.assignTargets(node.name.lexeme, node.depth)
+        value = self.expression(node.value)
+        if len(targets) == 1:
+            target = targets[0]
+            if not target.startswith("_"):
+                self.emit(f"{target} = {value}")
+            else:
+                self.emit(value)
+                self.emit(target)
+            return
+        self.emit(self.assignExpression(targets, value))
+
+    # Expressions
+
+    def assignExpression(self, targets: list[str], value: str) -> str:
+        result = self.temp()
+        chain = targets[-1]
+        if not chain.startswith("_"):
+            chain = f"({chain} := {result})"
+        for pyName in reversed(targets[:-1]):
+            chain = f"(({pyName} := {result}) if {pyName} is not _UNSET else {chain})"
+        return f"(({result} := {value}), {chain}, None)[2]"
+
+    def condition(self, node: Expr) -> str:
+        # Comparisons only give bools or null, where truthiness matches == True
+        code = self.expression(node)
+        while isinstance(node, Grouping):
+            node = node.expression
+        if isinstance(node, Binary) and node.operator.type in comparisonOperators:
+            return code
+        if isinstance(node, Unary) and node.operator.type == TokenType.BANG:
+            return code
+        if isinstance(node, Literal) and isinstance(node.value, bool):
+            return code
+        return f"({code}) == True"
+
+    def expression(self, node: Expr) -> str:
+        match node:
+            case Assign():
+                targets = self.assignTargets(node.name.lexeme, node.depth)
+                return self.assignExpression(targets, self.expression(node.value))
+            case Variable():
+                return self.readName(node.name.lexeme, node.depth)
+            case Literal():
+                return repr(node.value)
+            case Grouping():
+                return self.expression(node.expression)
+            case Binary():
+                return self.binary(node)
+            case Unary():
+                match node.operator.type:
+                    case TokenType.BANG:
+                        return f"_not({self.expression(node.right)})"
+                    case TokenType.MINUS:
+                        if isinstance(node.right, Literal) and type(node.right.value) is float:
+                            return repr(-node.right.value)
+                        return f"_negate({self.expression(node.right)})"
+                    case _:
+                        return f"({self.expression(node.right)}, None)[1]"
+            case Call():
+                callee = self.expression(node.callee)
+                arguments = [self.expression(argument) for argument in node.arguments]
+                if all(isPure(argument) for argument in node.arguments):
+                    return f"{callee}({', '.join(arguments)})"
+                # Arguments are evaluated before the callee, as in Call.eval
+                temps = [self.temp() for _ in arguments]
+                stored = ", ".join(f"({temp} := {argument})" for temp, argument in zip(temps, arguments))
+                return f"({stored}, {callee}({', '.join(temps)}))[-1]"
+            case MapLiteral():
+                entries = [f"_key({self.expression(key)}): {self.expression(value)}" for key, value in node.entries]
+                return f"{{{', '.join(entries)}}}"
+            case Index():
+                return f"_index({self.expression(node.object)}, {self.expression(node.index)})"
+            case SetIndex():
+                parts = [self.expression(child) for child in node.children()]
+                return f"_setIndex({', '.join(parts)})"
+            case _:
+                return "None"
+
+    def binary(self, node: Binary) -> str:
+        left = self.expression(node.left)
+        right = self.expression(node.right)
+        template = binaryOperators.get(node.operator.type)
+        if template is None:
+            return f"({left}, {right}, None)[2]"
+
+        leftChecked = not isNonNull(node.left)
+        rightChecked = not isNonNull(node.right)
+        if not isSimple(node.left) and (leftChecked or not isSimple(node.right)):
+            temp = self.temp()
+            leftTest, left = f"({temp} := {left})", temp
+        else:
+            leftTest = left
+        if not isSimple(node.right) and rightChecked:
+            temp = self.temp()
+            rightTest, right = f"({temp} := {right})", temp
+        else:
+            rightTest = right
+
+        result = template.format(left, right)
+        checks = []
+        if leftChecked:
+            checks.append(f"({leftTest} is None)")
+        elif not leftTest == left:
+            checks.append(f"({leftTest}, False)[1]")
+        if rightChecked:
+            checks.append(f"({rightTest} is None)")
+        if not checks:
+            return f"({result})"
+        # | rather than or, so the right operand still runs when the left is null
+        joiner = " | " if not isSimple(node.right) else " or "
+        return f"(None if {joiner.join(checks)} else {result})"
+
+def isSimple(node: Expr) -> bool:
+    # Safe to evaluate more than once or not at all
+    match node:
+        case Literal() | Variable(): return True
+        case Grouping(): return isSimple(node.expression)
+        case _: return False
+
+def isNonNull(node: Expr) -> bool:
+    match node:
+        case Literal(): return not node.value is None
+        case Grouping(): return isNonNull(node.expression)
+        case Unary(): return node.operator.type == TokenType.BANG
+        case _: return False
+
+def isPure(node: Expr) -> bool:
+    # No calls or assignments, so evaluation order cannot be observed
+    match node:
+        case Literal() | Variable(): return True
+        case Grouping(): return isPure(node.expression)
+        case Unary(): return isPure(node.right)
+        case Binary(): return isPure(node.left) and isPure(node.right)
+        case _: return False
+
+def capturedNames(block: Block) -> set[str]:
+    """
+    Names declared by the block that a function nested inside it reads or assigns
+    """
+    captured = set()
+
+    def walk(node, depth: int, inFunction: bool):
+        match node:
+            case Block():
+                inner = depth if node.scope is None else depth + 1
+                for statement in node.statements:
+                    walk(statement, inner, inFunction)
+            case Function():
+                # Parameter scope, then the body block
+                walk(node.body, depth + 1, True)
+            case Variable():
+                if inFunction and node.depth == depth:
+                    captured.add(node.name.lexeme)
+            case Assign():
+                if inFunction and node.depth == depth:
+                    captured.add(node.name.lexeme)
+                walk(node.value, depth, inFunction)
+            case Expression() | Print() | Grouping():
+                walk(node.expression, depth, inFunction)
+            case Return():
+                walk(node.value, depth, inFunction)
+            case Var():
+                walk(node.initializer, depth, inFunction)
+            case IfStmt():
+                walk(node.condition, depth, inFunction)
+                walk(node.thenBranch, depth, inFunction)
+                walk(node.elseBranch, depth, inFunction)
+            case WhileStmt():
+                walk(node.expression, depth, inFunction)
+                walk(node.statement, depth, inFunction)
+            case Binary():
+                walk(node.left, depth, inFunction)
+                walk(node.right, depth, inFunction)
+            case Unary():
+                walk(node.right, depth, inFunction)
+            case ForIn():
+                if inFunction and node.depth == depth:
+                    captured.add(node.name.lexeme)
+                walk(node.iterable, depth, inFunction)
+                walk(node.statement, depth, inFunction)
+            case Call() | Index() | SetIndex() | MapLiteral():
+                for child in node.children():
+                    walk(child, depth, inFunction)
+
+    for statement in block.statements:
+        walk(statement, 0, False)
+    return captured & set(block.scope)
+
+class PythonInterpreter(Interpreter):
+    """
+    Transpiles the statement tree to Python source and runs it with compile() and exec
+    """
+    def __init__(self, AST: list[Grammar], dumpPath=None, sourceName: str = "<il>") -> None:
+        super().__init__(AST)
+        self.dumpPath = dumpPath
+        self.sourceName: str = sourceName
+
+    def runStream(self, statements):
+        # The generated module needs the whole program, so the statements are collected first
+        self.AST = list(statements)
+        self.run()
+
+    def run(self):
+        self.resolve(self.AST)
+
+        transpiler = Transpiler(self.sourceName)
+        self.source: str = transpiler.transpile(self.AST, self.resolver.globalScope)
+        fileName = "<il-python>"
+        if not self.dumpPath is None:
+            with open(self.dumpPath, "w") as file:
+                file.write(self.source)
+            fileName = str(self.dumpPath)
+
+        namespace = {
+            "_std": self.builtins,
+            "_native": native,
+            "_UNSET": UNSET,
+            "_NORMAL": NORMAL,
+            "_undefined": undefined,
+            "_redefined": redefined,
+            "_negate": negate,
+            "_not": logicalNot,
+            "_and": logicalAnd,
+            "_or": logicalOr,
+            "_index": getIndex,
+            "_setIndex": setIndex,
+            "_key": checkKey,
+            "_iterate": iterate,
+            "_print": self.output.write,
+            "_memoized": memoized,
+            "_memos": transpiler.memos,
+        }
+        with self.output.flushing():
+            exec(compile(self.source, fileName, "exec"), namespace)
@@ -0,0 +1,367 @@
+import logging
+logger = logging.getLogger(__name__)
+
+from langGrammar import Stmt
+from interpreter.interpreter import Interpreter
+from interpreter.environment import Environment, UNDEFINED
+from interpreter.envData import Callable, Rope, MISSING, remember
+from interpreter.arrays import logicalNot, logicalAnd, logicalOr, negate
+from interpreter.containers import getIndex, setIndex, checkKey, iterate
+from interpreter.compiler import Compiler, FunctionProto, OpCode, END_OF_SCRIPT
+
+CONST = int(OpCode.CONST)
+LOAD = int(OpCode.LOAD)
+LOAD_LOCAL = int(OpCode.LOAD_LOCAL)
+LOAD_ROPE = int(OpCode.LOAD_ROPE)
+STORE = int(OpCode.STORE)
+CONCAT = int(OpCode.CONCAT)
+DEFINE = int(OpCode.DEFINE)
+POP = int(OpCode.POP)
+EQUAL = int(OpCode.EQUAL)
+NOT_EQUAL = int(OpCode.NOT_EQUAL)
+GREATER = int(OpCode.GREATER)
+GREATER_EQUAL = int(OpCode.GREATER_EQUAL)
+LESS = int(OpCode.LESS)
+LESS_EQUAL = int(OpCode.LESS_EQUAL)
+ADD = int(OpCode.ADD)
+SUBTRACT = int(OpCode.SUBTRACT)
+MULTIPLY = int(OpCode.MULTIPLY)
+DIVIDE = int(OpCode.DIVIDE)
+AND = int(OpCode.AND)
+OR = int(OpCode.OR)
+NOT = int(OpCode.NOT)
+NEGATE = int(OpCode.NEGATE)
+INDEX = int(OpCode.INDEX)
+SET_INDEX = int(OpCode.SET_INDEX)
+MAKE_MAP = int(OpCode.MAKE_MAP)
+ITERATE = int(OpCode.ITERATE)
+FOR_ITER = int(OpCode.FOR_ITER)
+
+# Handed back by next() once a for-in loop has run out
+EXHAUSTED = object()
+JUMP = int(OpCode.JUMP)
+JUMP_IF_NOT_TRUE = int(OpCode.JUMP_IF_NOT_TRUE)
+JUMP_IF_FALSY = int(OpCode.JUMP_IF_FALSY)
+ENTER_BLOCK = int(OpCode.ENTER_BLOCK)
+EXIT_BLOCK = int(OpCode.EXIT_BLOCK)
+MAKE_FUNCTION = int(OpCode.MAKE_FUNCTION)
+CALL = int(OpCode.CALL)
+TAIL_CALL = int(OpCode.TAIL_CALL)
+RETURN = int(OpCode.RETURN)
+PRINT = int(OpCode.PRINT)
+
+class Closure:
+    def __init__(self, proto: FunctionProto, parentEnv: Environment, vm: "VM") -> None:
+        self.proto: FunctionProto = proto
+        self.arity: int = proto.arity
+        self.parentEnv: Environment = parentEnv
+        self.vm: VM = vm
+
+    def call(self, arguments: list):
+        # Builtins like map call a function from Python, so it runs on an execute of its own
+        funcEnv = Environment(self.parentEnv, self.proto.scope)
+        for index, param in enumerate(self.proto.params):
+            funcEnv.defineAt(funcEnv.names[param.lexeme], arguments[index])
+        return self.vm.execute(self.proto, funcEnv)
+
+    def __repr__(self):
+        return f"<func {self.proto.name}>"
+
+class VM(Interpreter):
+    """
+    Runs the statement tree as bytecode instead of walking it
+    Calls to .il functions push a frame instead of recursing on the Python stack
+    """
+    def runStatements(self, statements: list[Stmt]) -> bool:
+        self.script: FunctionProto = Compiler().compile(statements)
+        return not self.execute(self.script, self.environment) is END_OF_SCRIPT
+
+    def execute(self, proto: FunctionProto, environment: Environment):
+        code = proto.code
+        constants = proto.constants
+        env = environment
+        pc = 0
+        # (cache, key) pairs waiting on the current frame's result
+        pending = None
+
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        frames = []
+        write = self.output.write
+
+        while True:
+            op = code[pc]
+
+            if op == LOAD_LOCAL:
+                value = env.values[code[pc + 1]]
+                if value is UNDEFINED:
+                    value = env.get(constants[code[pc + 2]])
+                push(value)
+                pc += 3
+            elif op == CONST:
+                push(constants[code[pc + 1]])
+                pc += 2
+            elif op == LOAD:
+                depth = code[pc + 1]
+                frame = env
+                while depth:
+                    frame = frame.parentEnv
+                    depth -= 1
+                value = frame.values[code[pc + 2]]
+                if value is UNDEFINED:
+                    value = env.get(constants[code[pc + 3]])
+                push(value)
+                pc += 4
+
+            elif op == ADD:
+                right = pop()
+                left = stack[-1]
+                stack[-1] = None if left is None or right is None else left + right
+                pc += 1
+            elif op == SUBTRACT:
+                right = pop()
+                left = stack[-1]
+                stack[-1] = None if left is None or right is None else left - right
+                pc += 1
+            elif op == LESS_EQUAL:
+                right = pop()
+                left = stack[-1]
+                stack[-1] = None if left is None or right is None else left <= right
+                pc += 1
+            elif op == LESS:
+                right = pop()
+                left = stack[-1]
+                stack[-1] = None if left is None or right is None else left < right
+                pc += 1
+
+            elif op == JUMP_IF_NOT_TRUE:
+                if pop() == True:
+                    pc += 2
+                else:
+                    pc = code[pc + 1]
+            elif op == JUMP_IF_FALSY:
+                if pop():
+                    pc += 2
+                else:
+                    pc = code[pc + 1]
+            elif op == JUMP:
+                pc = code[pc + 1]
+
+            elif op == CALL or op == TAIL_CALL:
+                argCount = code[pc + 1]
+                func = pop()
+                if func.__class__ is Closure:
+                    if not argCount == func.arity:
+                        self.arityError(constants[code[pc + 2]], func.arity, argCount)
+                    memo = func.proto.memo
+                    if not memo is None:
+                        key = memo.key(stack[len(stack) - argCount:])
+                        value = MISSING if key is None else memo.get(key)
+                        if not value is MISSING:
+                            del stack[len(stack) - argCount:]
+                            push(value)
+                            pc += 3
+                            if op == TAIL_CALL:
+                                if pending:
+                                    remember(pending, value)
+                                if not frames:
+                                    return pop()
+                                code, constants, pc, env, pending = frames.pop()
+                            continue
+                    funcEnv = Environment(func.parentEnv, func.proto.scope)
+                    if argCount:
+                        arguments = stack[-argCount:]
+                        del stack[-argCount:]
+                        if func.proto.distinctParams:
+                            funcEnv.values[:argCount] = arguments
+                        else:
+                            for index, param in enumerate(func.proto.params):
+                                funcEnv.defineAt(funcEnv.names[param.lexeme], arguments[index])
+                    if op == CALL:
+                        frames.append((code, constants, pc + 3, env, pending))
+                        pending = None
+                    if not memo is None and not key is None:
+                        # A tail call's result is also the current frame's, so it joins the same list
+                        if pending is None:
+                            pending = []
+                        pending.append((memo, key))
+                    # A tail call replaces the current frame instead of stacking a new one
+                    code = func.proto.code
+                    constants = func.proto.constants
+                    env = funcEnv
+                    pc = 0
+                else:
+                    if not isinstance(func, Callable):
+                        logger.error(f"Function expression '{constants[code[pc + 2]]}' is not callable.")
+                        exit()
+                    if not argCount == func.arity:
+                        self.arityError(constants[code[pc + 2]], func.arity, argCount)
+                    arguments = stack[len(stack) - argCount:]
+                    del stack[len(stack) - argCount:]
+                    push(func.call(arguments))
+                    pc += 3
+                    if op == TAIL_CALL:
+                        # Return the result straight away, as RETURN would
+                        if pending:
+                            remember(pending, stack[-1])
+                        if not frames:
+                            return pop()
+                        code, constants, pc, env, pending = frames.pop()
+            elif op == RETURN:
+                if pending:
+                    remember(pending, stack[-1])
+                if not frames:
+                    return pop()
+                code, constants, pc, env, pending = frames.pop()
+
+            elif op == STORE:
+                depth = code[pc + 1]
+                frame = env
+                while depth:
+                    frame = frame.parentEnv
+                    depth -= 1
+                slot = code[pc + 2]
+                if frame.values[slot] is UNDEFINED:
+                    env.setValue(constants[code[pc + 3]], pop())
+                else:
+                    frame.values[slot] = pop()
+                pc += 4
+            elif op == LOAD_ROPE:
+                depth = code[pc + 1]
+                frame = env
+                while depth:
+                    frame = frame.parentEnv
+                    depth -= 1
+                value = frame.values[code[pc + 2]]
+                if value is UNDEFINED:
+                    value = env.get(constants[code[pc + 3]])
+                elif value.__class__ is Rope:
+                    value = value.build()
+                push(value)
+                pc += 4
+            elif op == CONCAT:
+                depth = code[pc + 1]
+                frame = env
+                while depth:
+                    frame = frame.parentEnv
+                    depth -= 1
+                slot = code[pc + 2]
+                right = pop()
+                current = frame.values[slot]
+                if current.__class__ is Rope and right.__class__ is str:
+                    current.append(right)
+                else:
+                    if current is UNDEFINED:
+                        left = env.get(constants[code[pc + 3]])
+                    else:
+                        left = current.build() if current.__class__ is Rope else current
+                    value = None if left is None or right is None else left + right
+                    if current is UNDEFINED:
+                        env.setValue(constants[code[pc + 3]], value)
+                    else:
+                        frame.values[slot] = Rope([value]) if value.__class__ is str else value
+                pc += 4
+            elif op == ENTER_BLOCK:
+                env = Environment(env, constants[code[pc + 1]])
+                pc += 2
+            elif op == EXIT_BLOCK:
+                env = env.parentEnv
+                pc += 1
+            elif op == DEFINE:
+                env.defineAt(code[pc + 1], pop())
+                pc += 2
+            elif op == POP:
+                pop()
+                pc += 1
+            elif op == PRINT:
+                write(pop())
+                pc += 1
+
+            elif op == EQUAL:
+                right = pop()
+                left = stack[-1]
+                stack[-1] = None if left is None or right is None else left == right
+                pc += 1
+            elif op == NOT_EQUAL:
+                right = pop()
+                left = stack[-1]
+                stack[-1] = None if left is None or right is None else left != right
+                pc += 1
+            elif op == GREATER:
+                right = pop()
+                left = stack[-1]
+                stack[-1] = None if left is None or right is None else left > right
+                pc += 1
+            elif op == GREATER_EQUAL:
+                right = pop()
+                left = stack[-1]
+                stack[-1] = None if left is None or right is None else left >= right
+                pc += 1
+            elif op == MULTIPLY:
+                right = pop()
+                left = stack[-1]
+                stack[-1] = None if left is None or right is None else left * right
+                pc += 1
+            elif op == DIVIDE:
+                right = pop()
+                left = stack[-1]
+                stack[-1] = None if left is None or right is None else left / right
+                pc += 1
+            elif op == AND:
+                right = pop()
+                left = stack[-1]
+                stack[-1] = None if left is None or right is None else logicalAnd(left, right)
+                pc += 1
+            elif op == OR:
+                right = pop()
+                left = stack[-1]
+                stack[-1] = None if left is None or right is None else logicalOr(left, right)
+                pc += 1
+            elif op == NOT:
+                stack[-1] = logicalNot(stack[-1])
+                pc += 1
+            elif op == NEGATE:
+                stack[-1] = negate(stack[-1])
+                pc += 1
+            elif op == MAKE_FUNCTION:
+                push(Closure(constants[code[pc + 1]], env, self))
+                pc += 2
+            elif op == INDEX:
+                index = pop()
+                stack[-1] = getIndex(stack[-1], index)
+                pc += 1
+            elif op == SET_INDEX:
+                value = pop()
+                index = pop()
+                setIndex(pop(), index, value)
+                # An assignment's value is null, as Assign pushes
+                push(None)
+                pc += 1
+            elif op == MAKE_MAP:
+                count = code[pc + 1]
+                entries = stack[len(stack) - 2 * count:]
+                del stack[len(stack) - 2 * count:]
+                mapping = {}
+                for index in range(0, len(entries), 2):
+                    mapping[checkKey(entries[index])] = entries[index + 1]
+                push(mapping)
+                pc += 2
+            elif op == ITERATE:
+                env.values[code[pc + 1]] = iterate(pop())
+                pc += 2
+            elif op == FOR_ITER:
+                value = next(env.values[code[pc + 1]], EXHAUSTED)
+                if value is EXHAUSTED:
+                    pc = code[pc + 2]
+                else:
+                    push(value)
+                    pc += 3
+
+            else:
+                logger.error(f"Unknown opcode {op} at {pc}.")
+                exit()
+
+    def arityError(self, callee: str, arity: int, argCount: int):
+        logger.error(f"Function expression '{callee}' expected {arity} arguments but got {argCount}.")
+        exit()
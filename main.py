@@ -1,54 +1,191 @@
+import io
+import os
 import sys
+import time
+import argparse
+import contextlib
 from pathlib import Path as Path
 import logging
 
-from parser.scanner import Scanner
+from parser.scanner import RegexScanner
 from parser.parser import Parser
+from parser.programCache import ProgramCache
 from interpreter.interpreter import Interpreter
+from interpreter.vm import VM
+from interpreter.closureCompiler import ClosureInterpreter
+from interpreter.transpiler import PythonInterpreter
+from interpreter.optimizer import Optimizer
+from interpreter.memoizer import Memoizer
+from interpreter.profiler import ProfilingInterpreter
+from interpreter.specializer import SpecializingInterpreter
+from interpreter.memoryTracker import MemoryInterpreter
+from interpreter import inlineCache
+from interpreter.output import DEFAULT_BUFFER
+from interpreter.repl import Repl
+from server import Server
+from client import defaultSocket
 from langGrammar import printAST
 
 logger = logging.getLogger(__name__)
 
+engines = {
+    "tree": Interpreter,
+    "adaptive": SpecializingInterpreter,
+    "vm": VM,
+    "closure": ClosureInterpreter,
+    "python": PythonInterpreter,
+}
 
-def parse_file(filePath):
+
+def parse_file(filePath, engine="tree", dumpPython=None, optimizeLevel=0, optimizeStats=False, memoMode="marked", memoSize=1024, memoStats=False, stream=False, compact=False, cache=None, source=None, timings=None, profile=False, profileTop=20, profileStacks=None, memReport=False, icStats=False, specializeStats=False, outputFile=None, outputBuffer=DEFAULT_BUFFER, parallelWorkers=None):
     loggingLevel = logging.WARNING
     logging.basicConfig(level=loggingLevel)
     logger.info('Started')
     
     filePath = Path(filePath)
-    with open(filePath, "r") as file:
-        fileData = ""
-        for line in file:
-            fileData += line
-    #print(fileData)
-    
-    scanner = Scanner(fileData)
-    tokens = scanner.scanTokens()
-    
-    parser = Parser(tokens)
-    statementTree = parser.parse()
+    optimizer = Optimizer(optimizeLevel)
+    start = time.perf_counter()
+    # source is given when the script was sent to the server instead of named
+    with open(filePath, "r") if source is None else io.StringIO(source) as file, \
+            contextlib.nullcontext() if outputFile is None else open(outputFile, "w") as sink:
+        if stream:
+            # Tokens are scanned as the file is read and each top-level statement runs once parsed
+            parser = Parser(RegexScanner("").tokenStream(file), compact)
+            statementTree = []
+        else:
+            source = file.read()
+            variant = f"O{optimizeLevel}{'c' if compact else ''}"
+            # A cached tree has no optimizer counts to report
+            statementTree = None if cache is None or optimizeStats else cache.load(filePath, variant, source.encode())
+            if statementTree is None:
+                scanner = RegexScanner(source)
+                parser = Parser(scanner.scanTokens(), compact)
+                statementTree = optimizer.optimize(parser.parse())
+                # A tree with parse errors is not cached, so every run reports them
+                if not cache is None and not parser.hadError:
+                    cache.store(filePath, variant, source.encode(), statementTree)
     
-    for statement in statementTree:
-        logger.debug(statement.getPrint())
+            for statement in statementTree:
+                logger.debug(statement.getPrint())
+            if not timings is None:
+                timings["parse"] = time.perf_counter() - start
     
-    interpreter = Interpreter(statementTree)
-    interpreter.run()
+        if profile:
+            interpreter = ProfilingInterpreter(statementTree)
+            interpreter.profiler.root.path = filePath.name
+        elif memReport:
+            interpreter = MemoryInterpreter(statementTree)
+        elif engine == "python":
+            interpreter = PythonInterpreter(statementTree, dumpPython, filePath.name)
+        else:
+            interpreter = engines[engine](statementTree)
+        interpreter.memoizer = Memoizer(memoMode, memoSize)
+        if icStats:
+            interpreter.resolver.caches = []
+        interpreter.output.sink = sink
+        interpreter.output.bufferSize = outputBuffer
+        if not parallelWorkers is None:
+            interpreter.builtins["parallelMap"].workers = parallelWorkers
+
+        if stream:
+            interpreter.runStream(
+                optimized for statement in parser.statements() for optimized in optimizer.optimize([statement])
+            )
+        else:
+            interpreter.run()
+    if not timings is None:
+        timings["run"] = time.perf_counter() - start - timings.get("parse", 0)
+
+    if optimizeStats and optimizeLevel > 0:
+        print(optimizer.report(), file=sys.stderr)
+    if memoStats:
+        print(interpreter.memoizer.report(), file=sys.stderr)
+    if profile:
+        print(interpreter.profiler.report(profileTop), file=sys.stderr)
+        if not profileStacks is None:
+            Path(profileStacks).write_text(interpreter.profiler.collapsedStacks())
+    if memReport:
+        print(interpreter.memoryTracker.report(profileTop), file=sys.stderr)
+    if icStats:
+        print(inlineCache.report(interpreter.resolver.caches), file=sys.stderr)
+    if specializeStats and engine == "adaptive":
+        print(interpreter.specializer.report(), file=sys.stderr)
         
     logger.info('Finished')
 
-def main():
-    running = True
-    while running:
-        if len(sys.argv[1:]) > 0:
-            parse_file(sys.argv[1])
-            running = False
-        else:
-            user_input = input(">>> ")
+def prompt(engine="tree", optimizeLevel=0, memoMode="marked", memoSize=1024, compact=False):
+    logging.basicConfig(level=logging.WARNING)
+    if engine == "python":
+        # The generated module is built from the whole program at once
+        logger.error("The prompt needs the tree, vm or closure engine.")
+        exit()
+
+    interpreter = engines[engine]([], redefinable=True)
+    interpreter.memoizer = Memoizer(memoMode, memoSize)
+    Repl(interpreter, Optimizer(optimizeLevel) if optimizeLevel > 0 else None, compact).run()
+
+def buildArgParser() -> argparse.ArgumentParser:
+    argParser = argparse.ArgumentParser(description="Run an .il script")
+    argParser.add_argument("file", nargs="?", help="script to run, omit for the prompt")
+    argParser.add_argument("--engine", choices=engines.keys(), default="tree", help="execution engine (default: tree)")
+    argParser.add_argument("--dump-python", metavar="PATH", help="with --engine=python, also write the generated module to PATH")
+    argParser.add_argument("-O", dest="optimize", type=int, choices=[0, 1, 2], default=0, help="optimization level: 1 folds constants and drops dead code, 2 also removes empty scopes")
+    argParser.add_argument("--opt-stats", action="store_true", help="print how many nodes each optimization removed")
+    argParser.add_argument("--memo", choices=["off", "marked", "pure"], default="marked", help="cache results of pure functions: only those declared with memo (default), every pure function, or none")
+    argParser.add_argument("--memo-size", type=int, default=1024, metavar="N", help="entries kept per memoized function before the least recently used is evicted, 0 for no limit")
+    argParser.add_argument("--memo-stats", action="store_true", help="print cache hits and misses of each memoized function")
+    argParser.add_argument("--profile", action="store_true", help="time every function and count every statement, printing the busiest (tree engine only)")
+    argParser.add_argument("--profile-top", type=int, default=20, metavar="N", help="rows in each --profile and --mem-report table (default: 20)")
+    argParser.add_argument("--profile-stacks", metavar="PATH", help="with --profile, write collapsed stacks for flamegraph tools to PATH")
+    argParser.add_argument("--mem-report", action="store_true", help="count frames, functions and AST nodes and the lines that allocated them (tree engine only)")
+    argParser.add_argument("--ic-stats", action="store_true", help="print hit rates of the inline caches at call sites and global reads (tree engine)")
+    argParser.add_argument("--specialize-stats", action="store_true", help="with --engine=adaptive, print how many operators were specialized and deoptimized")
+    argParser.add_argument("--output-file", metavar="PATH", help="write what the script prints to PATH instead of stdout")
+    argParser.add_argument("--output-buffer", type=int, default=DEFAULT_BUFFER, metavar="N", help=f"characters of printed output kept before they are written, 0 writes every line (default: {DEFAULT_BUFFER})")
+    argParser.add_argument("--parallel-workers", type=int, metavar="N", help="worker processes parallelMap runs its calls on, 1 runs them in this process (default: number of CPUs)")
+    argParser.add_argument("--stream", action="store_true", help="run each top-level statement as soon as it is parsed instead of reading the whole file first")
+    argParser.add_argument("--compact-ast", action="store_true", help="share one token per operator, keyword and name across the AST to save memory")
+    argParser.add_argument("--cache-dir", metavar="DIR", help="where parsed programs are cached (default: __ilcache__ next to the script)")
+    argParser.add_argument("--no-cache", action="store_true", help="always parse the script, without reading or writing the cache")
+    argParser.add_argument("--clear-cache", action="store_true", help="delete the cached programs of the script before running it")
+    argParser.add_argument("--serve", action="store_true", help="keep a warm process running scripts sent by client.py")
+    argParser.add_argument("--socket", metavar="PATH", default=defaultSocket(), help=f"Unix socket of the server (default: {defaultSocket()})")
+    argParser.add_argument("--workers", type=int, default=os.cpu_count(), metavar="N", help="scripts the server runs at once, later requests wait (default: number of CPUs)")
+    return argParser
+
+def runArgs(args, source=None, timings=None):
+    cache = None if args.no_cache or not source is None else ProgramCache(args.cache_dir)
+    if args.clear_cache and not args.file is None:
+        ProgramCache(args.cache_dir).clear(Path(args.file))
 
-            if user_input == "exit":
-                running = False
-            else:
-                print(user_input)
+    if (args.profile or args.mem_report) and not args.engine == "tree":
+        # The probes are statement tree nodes, which only the tree engine walks
+        logger.error("--profile and --mem-report need the tree engine.")
+        exit()
+    if args.profile and args.mem_report:
+        logger.error("--profile and --mem-report cannot be combined.")
+        exit()
+
+    if not args.file is None:
+        parse_file(args.file, args.engine, args.dump_python, args.optimize, args.opt_stats, args.memo, args.memo_size, args.memo_stats, args.stream, args.compact_ast, cache, source, timings, args.profile, args.profile_top, args.profile_stacks, args.mem_report, args.ic_stats, args.specialize_stats, args.output_file, args.output_buffer, args.parallel_workers)
+    else:
+        prompt(args.engine, args.optimize, args.memo, args.memo_size, args.compact_ast)
+
+def runRequest(argv: list[str], source=None, timings=None):
+    # Runs one script sent to the server, in the process forked for it
+    args = buildArgParser().parse_args(argv)
+    if args.file is None:
+        logger.error("The server runs scripts, start main.py without one for the prompt.")
+        exit()
+    runArgs(args, source, timings)
+
+def main():
+    args = buildArgParser().parse_args()
+    if args.serve:
+        logging.basicConfig(level=logging.INFO)
+        Server(args.socket, args.workers, runRequest).serve()
+    else:
+        runArgs(args)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,9 +1,16 @@
 from parser.scanner import Token, TokenType
-from interpreter.environment import Environment, CallableFactory
+from interpreter.environment import Environment, CallableFactory, UNDEFINED
 
 from interpreter.envData import *
+from interpreter.arrays import logicalNot, logicalAnd, logicalOr, negate
+from interpreter.containers import getIndex, setIndex, checkKey, iterate
 
 class Grammar:
+    __slots__ = ()
+
+    def children(self) -> list:
+        return []
+    
     def getPrint(self) -> str:
         return f"()"
     
@@ -11,33 +18,72 @@ class Grammar:
         return
 
 class Expr(Grammar):
-    ...
+    __slots__ = ()
 
 class Assign(Expr):
+    __slots__ = ("name", "value", "depth", "slot")
+
     def __init__(self, name: Token, value: Expr) -> None:
         self.name: Token = name
         self.value: Expr = value
+        # Filled in by the resolver
+        self.depth: int = 0
+        self.slot: int = 0
         
     def eval(self, environment: Environment):
-        environment.setValue(self.name.lexeme, self.value.eval(environment))
+        environment.setAt(self.depth, self.slot, self.name.lexeme, self.value.eval(environment))
+    
+    def children(self) -> list:
+        return [self.value]
     
     def getPrint(self) -> str:
         return f"{self.name.lexeme} = {self.value.getPrint()}"
 
+class ConcatAssign(Assign):
+    """
+    An s = s + x the resolver found, with no call or assignment in x
+    Once s holds a string, its slot keeps a Rope that each run appends x to,
+    so building a long string takes linear time instead of copying it every time
+    """
+    __slots__ = ()
+
+    def eval(self, environment: Environment):
+        frame = environment.ancestor(self.depth).values
+        current = frame[self.slot]
+        if current.__class__ is Rope:
+            right = self.value.right.eval(environment)
+            if right.__class__ is str:
+                current.append(right)
+            else:
+                frame[self.slot] = self.value.operate(current.build(), right)
+            return
+
+        value = self.value.eval(environment)
+        if value.__class__ is str and not current is UNDEFINED:
+            frame[self.slot] = Rope([value])
+        else:
+            environment.setAt(self.depth, self.slot, self.name.lexeme, value)
+
 class Binary(Expr):
+    __slots__ = ("left", "operator", "right", "site")
+
     def __init__(self, left: Expr, operator: Token, right: Expr):
         self.left: Expr = left
         self.operator: Token = operator
         self.right: Expr = right
+        # Operand types seen here, filled in by the specializer
+        self.site = None
         
     def eval(self, environment: Environment):
-        left = self.left.eval(environment)
-        right = self.right.eval(environment)
-        if left == None or right == None:
+        return self.operate(self.left.eval(environment), self.right.eval(environment))
+
+    def operate(self, left, right):
+        if left is None or right is None:
             return None
+        # numpy applies these elementwise when either operand is an array
         match self.operator.type:
             case TokenType.EQUAL_EQUAL: return left == right
-            case TokenType.BANG_EQUAL: return not left == right
+            case TokenType.BANG_EQUAL: return left != right
             case TokenType.GREATER: return left > right
             case TokenType.GREATER_EQUAL: return left >= right
             case TokenType.LESS: return left < right
@@ -48,31 +94,44 @@ class Binary(Expr):
             case TokenType.STAR: return left * right
             case TokenType.SLASH: return left / right
             
-            case TokenType.AND: return left and right
-            case TokenType.OR: return left or right
+            case TokenType.AND: return logicalAnd(left, right)
+            case TokenType.OR: return logicalOr(left, right)
             
             case _: return None
         
+    def children(self) -> list:
+        return [self.left, self.right]
+    
     def getPrint(self) -> str:
         return f"{self.operator} ({self.left.getPrint()}) ({self.right.getPrint()})"
         
 class Grouping(Expr):
+    __slots__ = ("expression",)
+
     def __init__(self, expression: Expr):
         self.expression: Expr = expression
         
     def eval(self, environment: Environment):
         return self.expression.eval(environment)
     
+    def children(self) -> list:
+        return [self.expression]
+    
     def getPrint(self) -> str:
         return f"group {self.expression.getPrint()}"
         
 class Literal(Expr):
+    __slots__ = ("value",)
+
     def __init__(self, value):
         self.value = value
         
     def eval(self, environment: Environment):
         return self.value
         
+    def children(self) -> list:
+        return []
+    
     def getPrint(self) -> str:
         match self.value:
             case str():
@@ -81,30 +140,42 @@ class Literal(Expr):
                 return f"{self.value}"
         
 class Unary(Expr):
+    __slots__ = ("operator", "right", "site")
+
     def __init__(self, operator: Token, right: Expr):
         self.operator: Token = operator
         self.right: Expr = right
+        # Operand types seen here, filled in by the specializer
+        self.site = None
         
-    def eval(self, environment: Environment): # type: ignore
-        value = self.right.eval(environment)
+    def eval(self, environment: Environment):
+        return self.operate(self.right.eval(environment))
+
+    def operate(self, value): # type: ignore
         match self.operator.type:
-            case TokenType.BANG: return not value
-            case TokenType.MINUS: 
-                try:
-                    return -float(value) # type: ignore
-                except ValueError:
-                    return None
+            case TokenType.BANG: return logicalNot(value)
+            case TokenType.MINUS: return negate(value)
             
             case _: return None
     
+    def children(self) -> list:
+        return [self.right]
+    
     def getPrint(self) -> str:
         return f"{self.operator} ({self.right.getPrint()})"
     
 class Call(Expr):
+    __slots__ = ("callee", "paren", "arguments", "cache")
+
     def __init__(self, callee: Expr, paren: Token, arguments: list[Expr]) -> None:
         self.callee: Expr = callee
         self.paren: Token = paren
         self.arguments: list[Expr] = arguments
+        # Inline cache of the function called here, filled in by the resolver
+        self.cache = None
+    
+    def children(self) -> list:
+        return [self.callee, *self.arguments]
     
     def getPrint(self):
         listPrintArgs = [arg.getPrint() for arg in self.arguments]
@@ -113,25 +184,167 @@ class Call(Expr):
     
     def eval(self, environment: Environment):
         arguments = [arg.eval(environment) for arg in self.arguments]
+        func = self.function(environment, arguments)
+        if self.cache.factory:
+            return func.constructCallable().call(arguments)
+        return func.call(arguments)
+
+    def function(self, environment: Environment, arguments: list):
+        # The callee's value, checked only when it is not the function this site called last
+        func = self.callee.eval(environment)
+        cache = self.cache
+        if func is cache.target():
+            cache.hits += 1
+            return func
+        cache.misses += 1
+        cache.remember(environment.checkFunc(self.callee, func, arguments))
+        cache.factory = isinstance(func, CallableFactory)
+        return func
 
-        return environment.callFunc(self.callee, arguments)
+class MapLiteral(Expr):
+    __slots__ = ("entries",)
+
+    def __init__(self, entries: list[tuple[Expr, Expr]]) -> None:
+        self.entries: list[tuple[Expr, Expr]] = entries
+
+    def children(self) -> list:
+        return [node for entry in self.entries for node in entry]
+
+    def getPrint(self) -> str:
+        entries = ", ".join(f"{key.getPrint()}: {value.getPrint()}" for key, value in self.entries)
+        return f"{{{entries}}}"
+
+    def eval(self, environment: Environment):
+        mapping = {}
+        for key, value in self.entries:
+            mapping[checkKey(key.eval(environment))] = value.eval(environment)
+        return mapping
+
+class Index(Expr):
+    __slots__ = ("object", "bracket", "index")
+
+    def __init__(self, object: Expr, bracket: Token, index: Expr) -> None:
+        self.object: Expr = object
+        self.bracket: Token = bracket
+        self.index: Expr = index
+
+    def children(self) -> list:
+        return [self.object, self.index]
+
+    def getPrint(self) -> str:
+        return f"{self.object.getPrint()} [{self.index.getPrint()}]"
+
+    def eval(self, environment: Environment):
+        return getIndex(self.object.eval(environment), self.index.eval(environment))
+
+class SetIndex(Expr):
+    """
+    a[i] = value, changes the element in place so every name for the array sees it
+    """
+    __slots__ = ("object", "bracket", "index", "value")
+
+    def __init__(self, object: Expr, bracket: Token, index: Expr, value: Expr) -> None:
+        self.object: Expr = object
+        self.bracket: Token = bracket
+        self.index: Expr = index
+        self.value: Expr = value
+
+    def children(self) -> list:
+        return [self.object, self.index, self.value]
+
+    def getPrint(self) -> str:
+        return f"{self.object.getPrint()} [{self.index.getPrint()}] = {self.value.getPrint()}"
+
+    def eval(self, environment: Environment):
+        setIndex(self.object.eval(environment), self.index.eval(environment), self.value.eval(environment))
 
 class Variable(Expr):
+    __slots__ = ("name", "depth", "slot", "cache")
+
     def __init__(self, name: Token) -> None:
         self.name = name
+        # Filled in by the resolver
+        self.depth: int = 0
+        self.slot: int = 0
+        self.cache = None
         
+    def children(self) -> list:
+        return []
+    
     def getPrint(self):
         return f"{self.name}"
     
     def eval(self, environment: Environment):
+        return environment.getAt(self.depth, self.slot, self.name.lexeme)
+
+class GlobalVariable(Variable):
+    """
+    A Variable the resolver found to read a global
+    The global frame is the same on every visit, so it is looked up once and kept in cache
+    """
+    __slots__ = ()
+
+    def eval(self, environment: Environment):
+        cache = self.cache
+        frame = cache.frame
+        if not frame is None:
+            value = frame[self.slot]
+            if not value is UNDEFINED:
+                cache.hits += 1
+                return value
+            outer = cache.outer
+            if not outer is None and not outer[0][outer[1]] is UNDEFINED:
+                cache.hits += 1
+                return outer[0][outer[1]]
+
+        cache.misses += 1
+        frame = environment.ancestor(self.depth).values
+        cache.frame = frame
+        if not frame[self.slot] is UNDEFINED:
+            return frame[self.slot]
+        # Not declared yet or a standard function, which lives in the frame behind the globals
+        env, slot = environment.checkParentNamespace(self.name.lexeme)
+        cache.outer = None if env is None else (env.values, slot)
         return environment.get(self.name.lexeme)
 
+class RopeVariable(Variable):
+    """
+    A read of a variable some ConcatAssign grows, the Rope in its slot is built into a string
+    """
+    __slots__ = ()
+
+    def eval(self, environment: Environment):
+        value = environment.getAt(self.depth, self.slot, self.name.lexeme)
+        if value.__class__ is Rope:
+            return value.build()
+        return value
+
+class GlobalRopeVariable(GlobalVariable):
+    __slots__ = ()
+
+    def eval(self, environment: Environment):
+        value = GlobalVariable.eval(self, environment)
+        if value.__class__ is Rope:
+            return value.build()
+        return value
+
 class Stmt(Grammar):
-    ...
+    # Source line of the statement, filled in by the parser
+    __slots__ = ("line",)
 
 class Block(Stmt):
+    __slots__ = ("statements", "scope", "frame")
+
     def __init__(self, statements: list[Stmt]) -> None:
         self.statements: list[Stmt] = statements
+        # Slot layout of the block's frame, filled in by the resolver, None when it needs no frame
+        self.scope: dict | None = {}
+        # Frame kept between runs by ReusedFrameBlock
+        self.frame: Environment | None = None
+        self.line: int = 0
+    
+    def children(self) -> list:
+        return list(self.statements)
     
     def getPrint(self) -> str:
         output = []
@@ -140,17 +353,63 @@ class Block(Stmt):
         return f"{'\n'.join(output)}"
     
     def eval(self, environment: Environment):
-        subEnv: Environment = Environment(environment)
+        subEnv: Environment = Environment(environment, self.scope)
         for statement in self.statements:
-            try:
-                statement.eval(subEnv)
-            except ReturnValue as value:
-                raise value
+            completion = statement.eval(subEnv)
+            if not completion is None:
+                return completion
+
+class ScopelessBlock(Block):
+    """
+    A Block that declares nothing, the resolver gives it no scope so it runs in the enclosing frame
+    """
+    __slots__ = ()
+
+    def eval(self, environment: Environment):
+        for statement in self.statements:
+            completion = statement.eval(environment)
+            if not completion is None:
+                return completion
+
+class ReusedFrameBlock(Block):
+    """
+    A Block that declares no functions, so no closure can hold on to its frame after it ends
+    The frame is cleared and kept for the next run, a run nested inside another one, by recursion, makes its own
+    """
+    __slots__ = ()
+
+    def eval(self, environment: Environment):
+        frame = self.frame
+        if frame is None:
+            frame = Environment(environment, self.scope)
+        else:
+            self.frame = None
+            frame.parentEnv = environment
+
+        completion = None
+        for statement in self.statements:
+            completion = statement.eval(frame)
+            if not completion is None:
+                break
+
+        # Let go of what this run held before keeping the frame
+        frame.parentEnv = None
+        values = frame.values
+        for slot in range(len(values)):
+            values[slot] = UNDEFINED
+        self.frame = frame
+        return completion
     
 class Expression(Stmt):
+    __slots__ = ("expression",)
+
     def __init__(self, expression: Expr):
         self.expression: Expr = expression
+        self.line: int = 0
         
+    def children(self) -> list:
+        return [self.expression]
+    
     def getPrint(self) -> str:
         return f"{self.expression.getPrint()}"
     
@@ -158,19 +417,35 @@ class Expression(Stmt):
         self.expression.eval(environment)
         
 class Print(Stmt):
+    __slots__ = ("expression", "output")
+
     def __init__(self, expression: Expr):
         self.expression: Expr = expression
+        self.line: int = 0
+        # The interpreter's Output, filled in by the resolver
+        self.output = None
 
+    def children(self) -> list:
+        return [self.expression]
+    
     def getPrint(self) -> str:
         return f"print ({self.expression.getPrint()})"
     
     def eval(self, environment: Environment):
-        print(self.expression.eval(environment))
+        self.output.write(self.expression.eval(environment))
 
 class Return(Stmt):
+    __slots__ = ("keyword", "value", "tailCall")
+
     def __init__(self, keyword: Token, value: Expr | None):
         self.keyword: Token = keyword
         self.value: Expr | None = value
+        # Set by the resolver when this returns a call from inside a function
+        self.tailCall: bool = False
+        self.line: int = 0
+    
+    def children(self) -> list:
+        return [] if self.value is None else [self.value]
     
     def getPrint(self) -> str:
         value = ""
@@ -179,17 +454,30 @@ class Return(Stmt):
         return f"{self.keyword.lexeme} {value}"
     
     def eval(self, environment: Environment):
+        if self.tailCall:
+            call: Call = self.value # type: ignore
+            arguments = [arg.eval(environment) for arg in call.arguments]
+            return TailCall(call.function(environment, arguments), arguments)
+
         value = None
         if not self.value is None:
             value = self.value.eval(environment)
         
-        raise ReturnValue(value)
+        return ReturnValue(value)
     
 class Var(Stmt):
+    __slots__ = ("name", "initializer", "slot")
+
     def __init__(self, name: Token, initializer: Expr | None) -> None:
         self.name: Token = name
         self.initializer: Expr | None = initializer
+        # Filled in by the resolver
+        self.slot: int = 0
+        self.line: int = 0
         
+    def children(self) -> list:
+        return [] if self.initializer is None else [self.initializer]
+    
     def getPrint(self) -> str:
         if self.initializer == None:
             value = None
@@ -202,49 +490,107 @@ class Var(Stmt):
             value = None
         else:
             value = self.initializer.eval(environment)
-        environment.define(self.name.lexeme, value)
+        environment.defineAt(self.slot, value)
 
 class Function(Stmt):
+    __slots__ = ("name", "params", "body", "memoized", "slot", "scope", "memo")
+
     def __init__(self, name: Token, params: list[Token], body: Stmt) -> None:
         self.name: Token = name
         self.params: list[Token] = params
         self.body: Stmt = body
+        # Declared with the memo modifier
+        self.memoized: bool = False
+        # Filled in by the resolver
+        self.slot: int = 0
+        self.scope: dict = {}
+        # Filled in by the memoizer for pure functions
+        self.memo = None
+        self.line: int = 0
+    
+    def children(self) -> list:
+        return [self.body]
     
     def getPrint(self) -> str:
         params = ", ".join([str(param) for param in self.params])
-        return f"func {self.name} ({params}) {{{self.body}}}"
+        modifier = "memo " if self.memoized else ""
+        return f"{modifier}func {self.name} ({params}) {{{self.body}}}"
     
     def eval(self, environment: Environment):
-        funcFactory = CallableFactory(environment, self.params, self.body)
+        funcFactory = CallableFactory(environment, self.params, self.body, self.scope, self.memo)
 
-        environment.define(self.name.lexeme, funcFactory)
+        environment.defineAt(self.slot, funcFactory)
 
 class IfStmt(Stmt):
+    __slots__ = ("condition", "thenBranch", "elseBranch")
+
     def __init__(self, condition: Expr, thenBranch: Stmt, elseBranch: Stmt | None) -> None:
         self.condition: Expr = condition
         self.thenBranch: Stmt = thenBranch
         self.elseBranch: Stmt | None = elseBranch
+        self.line: int = 0
 
+    def children(self) -> list:
+        return [self.condition, self.thenBranch] + ([] if self.elseBranch is None else [self.elseBranch])
+    
     def getPrint(self) -> str:
         return f"if ({self.condition.getPrint()}) {{{self.thenBranch.getPrint()}}}"
     
     def eval(self, environment: Environment):
         if self.condition.eval(environment) == True:
-            self.thenBranch.eval(environment)
+            return self.thenBranch.eval(environment)
         elif not self.elseBranch is None:
-            self.elseBranch.eval(environment)
+            return self.elseBranch.eval(environment)
 
 class WhileStmt(Stmt):
+    __slots__ = ("expression", "statement")
+
     def __init__(self, expression: Expr, statement: Stmt) -> None:
         self.expression = expression
         self.statement = statement
+        self.line: int = 0
 
+    def children(self) -> list:
+        return [self.expression, self.statement]
+    
     def getPrint(self) -> str:
         return f"while ({self.expression.getPrint()}) {{{self.statement.getPrint()}}}"
     
     def eval(self, environment: Environment):
         while self.expression.eval(environment):
-            self.statement.eval(environment)
+            completion = self.statement.eval(environment)
+            if not completion is None:
+                return completion
+
+class ForIn(Stmt):
+    """
+    for (var name in iterable) statement, the parser wraps it in a block declaring name
+    Each key, element or character is assigned to name like an Assign
+    """
+    __slots__ = ("name", "iterable", "statement", "depth", "slot", "iteratorSlot")
+
+    def __init__(self, name: Token, iterable: Expr, statement: Stmt) -> None:
+        self.name: Token = name
+        self.iterable: Expr = iterable
+        self.statement: Stmt = statement
+        # Filled in by the resolver, iteratorSlot is a hidden slot where the vm keeps the loop's iterator
+        self.depth: int = 0
+        self.slot: int = 0
+        self.iteratorSlot: int = 0
+        self.line: int = 0
+
+    def children(self) -> list:
+        return [self.iterable, self.statement]
+
+    def getPrint(self) -> str:
+        return f"for ({self.name.lexeme} in {self.iterable.getPrint()}) {{{self.statement.getPrint()}}}"
+
+    def eval(self, environment: Environment):
+        for value in iterate(self.iterable.eval(environment)):
+            environment.setAt(self.depth, self.slot, self.name.lexeme, value)
+            completion = self.statement.eval(environment)
+            if not completion is None:
+                return completion
         
 def printAST(grammar: Grammar):
     print(f"{grammar.getPrint()}")
\ No newline at end of file
@@ -1,17 +1,58 @@
+from typing import Iterator
+
 from langGrammar import *
 import logging
 logger = logging.getLogger(__name__)
 
 class Parser:
-    def __init__(self, tokens: list[Token]):
+    """
+    tokens is either the full token list or an iterator of tokens
+    An iterator is pulled from only as far as the parser looks ahead
+    With compact set, nodes hold one shared token per operator, keyword and name
+    instead of the scanned ones, and equal literals share one value
+    Statements keep their line either way
+    """
+    def __init__(self, tokens: list[Token] | Iterator[Token], compact: bool = False):
         self.current: int = 0
-        self.tokens: list[Token] = tokens
+        self.stream: Iterator[Token] | None = None
+        self.compact: bool = compact
+        self.flyweights: dict = {}
+        self.hadError: bool = False
+        if isinstance(tokens, list):
+            self.tokens: list[Token] = tokens
+        else:
+            self.tokens = []
+            self.stream = tokens
         
     def getToken(self, offset=0) -> Token:
-        return self.tokens[self.current + offset]
+        index = self.current + offset
+        if index >= len(self.tokens) and not self.stream is None:
+            self.pull(index)
+        return self.tokens[index]
         
     def getNextToken(self, offset = 0) -> Token:
-        return self.tokens[self.current + 1 + offset]
+        return self.getToken(1 + offset)
+
+    def pull(self, index: int):
+        for token in self.stream: # type: ignore
+            self.tokens.append(token)
+            if index < len(self.tokens):
+                return
+    
+    def keep(self, token: Token) -> Token:
+        # The token a node holds on to, its line is only needed while parsing
+        if not self.compact:
+            return token
+        key = (token.type, token.lexeme)
+        flyweight = self.flyweights.get(key)
+        if flyweight is None:
+            flyweight = self.flyweights[key] = Token(token.type, token.lexeme, None, 0)
+        return flyweight
+
+    def constant(self, value):
+        if not self.compact:
+            return value
+        return self.flyweights.setdefault((type(value), value), value)
     
     def isAtEnd(self, offset=0) -> bool:
         return self.getToken(offset).type == TokenType.EOF
@@ -37,6 +78,7 @@ class Parser:
         else:
             lexeme = f"at '{token.lexeme}'"
         logger.error(f"{token.line} {lexeme} {message}")
+        self.hadError = True
     
     def consume(self, type: TokenType, message, offset=0, advance=True):
         if self.match([type], advance, offset):
@@ -59,6 +101,8 @@ class Parser:
             if isinstance(expr, Variable):
                 name = expr.name
                 return Assign(name, value)
+            if isinstance(expr, Index):
+                return SetIndex(expr.object, expr.bracket, expr.index, value)
             
             self.error(equals, "Invalid assignment target.")
             
@@ -68,7 +112,7 @@ class Parser:
         expr: Expr = self.logical_and()
         
         if self.match([TokenType.OR]):
-            operator: Token = self.getToken()
+            operator: Token = self.keep(self.getToken())
             self.advance()
             right: Expr = self.logical_and()
             expr = Binary(expr, operator, right)
@@ -79,7 +123,7 @@ class Parser:
         expr: Expr = self.equality()
         
         if self.match([TokenType.AND]):
-            operator: Token = self.getToken()
+            operator: Token = self.keep(self.getToken())
             self.advance()
             right: Expr = self.equality()
             expr = Binary(expr, operator, right)
@@ -90,7 +134,7 @@ class Parser:
         expr: Expr = self.comparison()
         
         while self.match([TokenType.BANG_EQUAL, TokenType.EQUAL_EQUAL]):
-            operator: Token = self.getToken()
+            operator: Token = self.keep(self.getToken())
             self.advance()
             right: Expr = self.comparison()
             expr = Binary(expr, operator, right)
@@ -101,7 +145,7 @@ class Parser:
         expr: Expr = self.term()
         
         while self.match([TokenType.GREATER, TokenType.GREATER_EQUAL, TokenType.LESS, TokenType.LESS_EQUAL]):
-            operator: Token = self.getToken()
+            operator: Token = self.keep(self.getToken())
             self.advance()
             right: Expr = self.term()
             expr = Binary(expr, operator, right)
@@ -112,7 +156,7 @@ class Parser:
         expr: Expr = self.factor()
         
         while self.match([TokenType.MINUS, TokenType.PLUS]):
-            operator: Token = self.getToken()
+            operator: Token = self.keep(self.getToken())
             self.advance()
             right: Expr = self.factor()
             expr = Binary(expr, operator, right)
@@ -123,7 +167,7 @@ class Parser:
         expr: Expr = self.unary()
         
         while self.match([TokenType.SLASH, TokenType.STAR]):
-            operator: Token = self.getToken()
+            operator: Token = self.keep(self.getToken())
             self.advance()
             right: Expr = self.unary()
             expr = Binary(expr, operator, right)
@@ -132,7 +176,7 @@ class Parser:
     
     def unary(self) -> Expr:
         if self.getToken().type in [TokenType.BANG, TokenType.MINUS]:
-            operator: Token = self.getToken()
+            operator: Token = self.keep(self.getToken())
             self.advance()
             right: Expr = self.unary()
             return Unary(operator, right)
@@ -145,6 +189,11 @@ class Parser:
         while True:
             if self.match([TokenType.LEFT_PAREN]):
                 expr = self.finishCall(expr)
+            elif self.match([TokenType.LEFT_BRACKET]):
+                self.advance()
+                index: Expr = self.expression()
+                bracket = self.consume(TokenType.RIGHT_BRACKET, "Expect ']' after index.")
+                expr = Index(expr, self.keep(bracket), index)
             else:
                 break
         
@@ -160,26 +209,46 @@ class Parser:
                 arguments.append(self.expression())
         
         paren = self.consume(TokenType.RIGHT_PAREN, "Expect ')' after arguments")
-        return Call(callee, paren, arguments)
+        return Call(callee, self.keep(paren), arguments)
 
     def primary(self) -> Expr:
         match self.getToken().type:
             case TokenType.FALSE: return Literal(False)
             case TokenType.TRUE: return Literal(True)
             case TokenType.NULL: return Literal(None)
-            case TokenType.NUMBER | TokenType.STRING: return Literal(self.getToken().literal)
+            case TokenType.NUMBER | TokenType.STRING: return Literal(self.constant(self.getToken().literal))
             case TokenType.LEFT_PAREN: 
                 self.advance()
                 expr: Expr = self.expression()
                 self.consume(TokenType.RIGHT_PAREN, "Expect ')' after expression.")
                 return Grouping(expr)
             
-            case TokenType.IDENTIFIER: return Variable(self.getToken())
+            case TokenType.IDENTIFIER: return Variable(self.keep(self.getToken()))
+
+            case TokenType.LEFT_BRACE: return self.mapLiteral()
             
             case _: 
                 self.error(self.getToken(), "Expect expression")
                 return Expr()
     
+    def mapLiteral(self) -> Expr:
+        entries: list[tuple[Expr, Expr]] = []
+        if not self.getNextToken().type == TokenType.RIGHT_BRACE:
+            self.advance()
+            entries.append(self.mapEntry())
+            while self.match([TokenType.COMMA]):
+                self.advance()
+                entries.append(self.mapEntry())
+
+        self.consume(TokenType.RIGHT_BRACE, "Expect '}' after map entries.")
+        return MapLiteral(entries)
+
+    def mapEntry(self) -> tuple[Expr, Expr]:
+        key: Expr = self.expression()
+        self.consume(TokenType.COLON, "Expect ':' after map key.")
+        self.advance()
+        return key, self.expression()
+
     def printStatement(self):
         value: Expr = self.expression()
         self.consume(TokenType.SEMICOLON, "Expect ';' after value.")
@@ -222,7 +291,10 @@ class Parser:
         return WhileStmt(condition, body)
     
     def forStatement(self):
+        line = self.getToken().line
         self.consume(TokenType.LEFT_PAREN, "Expect '(' after 'for'.")
+        if self.getNextToken().type == TokenType.VAR and self.getNextToken(2).type == TokenType.IN:
+            return self.forInStatement(line)
         
         initializer: Stmt | None = None
         condition: Expr | None = None
@@ -255,13 +327,16 @@ class Parser:
                 body,
                 Expression(increment)
             ])
+            body.line = body.statements[1].line = line
         
         if condition is None: 
             condition = Literal(True)
         
         body = WhileStmt(condition, body)
+        body.line = line
 
         if not initializer is None:
+            initializer.line = line
             body = Block([
                 initializer, 
                 body
@@ -269,6 +344,24 @@ class Parser:
         
         return body
     
+    def forInStatement(self, line: int):
+        self.advance()
+        name: Token = self.keep(self.consume(TokenType.IDENTIFIER, "Expect variable name."))
+        self.consume(TokenType.IN, "Expect 'in' after loop variable.")
+        self.advance()
+        iterable: Expr = self.expression()
+        self.consume(TokenType.RIGHT_PAREN, "Expect ')' after loop value.")
+
+        self.advance()
+
+        body: Stmt = self.statement()
+
+        # The loop variable lives in a block around the loop, as a for initializer does
+        declaration = Var(name, None)
+        loop = ForIn(name, iterable, body)
+        declaration.line = loop.line = line
+        return Block([declaration, loop])
+    
     def returnStatement(self):
         keyword: Token = self.getToken()
         value: Expr | None = None
@@ -277,26 +370,29 @@ class Parser:
             value = self.expression()
         
         self.consume(TokenType.SEMICOLON, "Expect ';' after return value.")
-        return Return(keyword, value)
+        return Return(self.keep(keyword), value)
 
     def statement(self):
+        line = self.getToken().line
         match self.getToken().type:
             case TokenType.PRINT:
                 self.advance()
-                return self.printStatement()
+                statement = self.printStatement()
             case TokenType.RETURN:
-                return self.returnStatement()
+                statement = self.returnStatement()
             case TokenType.IF:
-                return self.ifStatement()
+                statement = self.ifStatement()
             case TokenType.LEFT_BRACE:
                 self.advance()
-                return self.block()
+                statement = self.block()
             case TokenType.WHILE:
-                return self.whileStatement()
+                statement = self.whileStatement()
             case TokenType.FOR:
-                return self.forStatement()
+                statement = self.forStatement()
             case _:
-                return self.expressionStatement()
+                statement = self.expressionStatement()
+        statement.line = line
+        return statement
     
     def varDeclaration(self):
         name: Token = self.consume(TokenType.IDENTIFIER, "Expect variable name.")
@@ -307,7 +403,7 @@ class Parser:
             initializer = self.expression()
         
         self.consume(TokenType.SEMICOLON, "Expect ';' after variable declaration.")
-        return Var(name, initializer)
+        return Var(self.keep(name), initializer)
     
     def funcDeclaration(self, kind: str):
         name: Token = self.consume(TokenType.IDENTIFIER, f"Expect {kind} name.")
@@ -327,22 +423,37 @@ class Parser:
         self.advance()
 
         body: Stmt = self.block()
-        return Function(name, parameters, body)
+        body.line = name.line
+        return Function(self.keep(name), [self.keep(param) for param in parameters], body)
     
     def declaration(self):
+        line = self.getToken().line
         match self.getToken().type:
             case TokenType.FUNC:
-                return self.funcDeclaration("function")
+                declaration = self.funcDeclaration("function")
+            case TokenType.MEMO:
+                self.consume(TokenType.FUNC, "Expect 'func' after 'memo'.")
+                declaration = self.funcDeclaration("function")
+                declaration.memoized = True
             case TokenType.VAR:
-                return self.varDeclaration()
+                declaration = self.varDeclaration()
             case _:
                 return self.statement()
+        declaration.line = line
+        return declaration
     
     def parse(self):
-        tokenList = []
+        return list(self.statements())
+
+    def statements(self) -> Iterator[Stmt]:
+        # Yields each top-level statement as soon as it is parsed
         while not self.isAtEnd():
-            tokenList.append(self.declaration())
+            statement = self.declaration()
             self.advance()
-        return tokenList
+            if not self.stream is None and self.current > 1:
+                # Drop the tokens of finished statements, keeping one for look-behind
+                del self.tokens[:self.current - 1]
+                self.current = 1
+            yield statement
 
         
\ No newline at end of file
@@ -0,0 +1,84 @@
+import os
+import sys
+import pickle
+import hashlib
+import tempfile
+import logging
+logger = logging.getLogger(__name__)
+
+from pathlib import Path
+
+from langGrammar import *
+
+# Bump when the meaning of a cached tree changes without its classes changing
+LANGUAGE_VERSION = 1
+MAGIC = b"ILC\0"
+
+def compilerVersion() -> bytes:
+    # A change to the scanner, parser, grammar or optimizer makes every cached tree stale
+    root = Path(__file__).resolve().parent.parent
+    digest = hashlib.sha256(f"{LANGUAGE_VERSION} {sys.version_info[:2]}".encode())
+    for path in ("parser/scanner.py", "parser/parser.py", "parser/langGrammar.py", "interpreter/optimizer.py"):
+        digest.update((root / path).read_bytes())
+    return digest.digest()
+
+class ProgramCache:
+    """
+    Keeps parsed and optimized programs in .ilc files, like __pycache__ does for Python
+    A file is named after its script and settings and starts with a header holding
+    the hash of the source and of the compiler, so an edit to either is a miss
+    The tree itself is pickled, before the resolver fills in slots
+    directory defaults to __ilcache__ next to each script
+    """
+    def __init__(self, directory: str | None = None) -> None:
+        self.directory: Path | None = None if directory is None else Path(directory)
+        self.version: bytes = compilerVersion()
+
+    def path(self, filePath: Path, variant: str) -> Path:
+        directory = filePath.parent / "__ilcache__" if self.directory is None else self.directory
+        # Scripts from different folders can share a cache directory
+        folder = hashlib.sha256(str(filePath.resolve().parent).encode()).hexdigest()[:8]
+        return directory / f"{filePath.stem}.{folder}.{variant}.ilc"
+
+    def header(self, source: bytes) -> bytes:
+        return MAGIC + self.version + hashlib.sha256(source).digest()
+
+    def load(self, filePath: Path, variant: str, source: bytes) -> list[Stmt] | None:
+        header = self.header(source)
+        try:
+            with open(self.path(filePath, variant), "rb") as file:
+                if not file.read(len(header)) == header:
+                    return None
+                return pickle.load(file)
+        except FileNotFoundError:
+            return None
+        except Exception as error:
+            logger.warning(f"Ignoring unreadable cache for {filePath.name}: {error}")
+            return None
+
+    def store(self, filePath: Path, variant: str, source: bytes, statements: list[Stmt]):
+        cachePath = self.path(filePath, variant)
+        try:
+            cachePath.parent.mkdir(parents=True, exist_ok=True)
+            # Written next to its final place then renamed, so readers never see half a file
+            handle, tempPath = tempfile.mkstemp(dir=cachePath.parent, suffix=".tmp")
+            try:
+                os.chmod(tempPath, 0o644)
+                with os.fdopen(handle, "wb") as file:
+                    file.write(self.header(source))
+                    pickle.dump(statements, file, pickle.HIGHEST_PROTOCOL)
+                os.replace(tempPath, cachePath)
+            except BaseException:
+                os.unlink(tempPath)
+                raise
+        except (OSError, pickle.PicklingError, RecursionError) as error:
+            logger.warning(f"Could not write cache for {filePath.name}: {error}")
+
+    def clear(self, filePath: Path) -> int:
+        # Removes every cached variant of a script
+        pattern = self.path(filePath, "*")
+        removed = 0
+        for cachePath in pattern.parent.glob(pattern.name):
+            cachePath.unlink()
+            removed += 1
+        return removed
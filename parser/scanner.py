@@ -1,4 +1,7 @@
 from enum import Enum, auto
+from typing import Generator, Iterable, Iterator
+import re
+import sys
 import logging
 logger = logging.getLogger(__name__)
 
@@ -7,7 +10,10 @@ class TokenType(Enum):
     RIGHT_PAREN = auto()
     LEFT_BRACE = auto()
     RIGHT_BRACE = auto()
+    LEFT_BRACKET = auto()
+    RIGHT_BRACKET = auto()
     COMMA = auto()
+    COLON = auto()
     DOT = auto()
     MINUS = auto()
     PLUS = auto()
@@ -35,6 +41,8 @@ class TokenType(Enum):
     FUNC = auto()
     FOR = auto()
     IF = auto()
+    IN = auto()
+    MEMO = auto()
     NULL = auto()
     OR = auto()
     PRINT = auto()
@@ -55,6 +63,8 @@ keywords = {
     "for": TokenType.FOR,
     "func": TokenType.FUNC,
     "if": TokenType.IF,
+    "in": TokenType.IN,
+    "memo": TokenType.MEMO,
     "null": TokenType.NULL,
     "or": TokenType.OR,
     "print": TokenType.PRINT,
@@ -67,6 +77,8 @@ keywords = {
 }
 
 class Token:
+    __slots__ = ("type", "lexeme", "literal", "line")
+
     def __init__(self, type: TokenType, lexeme: str, literal, line: int) -> None:
         self.type: TokenType = type
         self.lexeme: str = lexeme
@@ -143,7 +155,10 @@ class Scanner:
             case ')': self.addToken(TokenType.RIGHT_PAREN)
             case '{': self.addToken(TokenType.LEFT_BRACE)
             case '}': self.addToken(TokenType.RIGHT_BRACE)
+            case '[': self.addToken(TokenType.LEFT_BRACKET)
+            case ']': self.addToken(TokenType.RIGHT_BRACKET)
             case ',': self.addToken(TokenType.COMMA)
+            case ':': self.addToken(TokenType.COLON)
             case '.': self.addToken(TokenType.DOT)
             case '-': self.addToken(TokenType.MINUS)
             case '+': self.addToken(TokenType.PLUS)
@@ -205,4 +220,118 @@ class Scanner:
             self.scanToken()
         
         self.tokens.append(Token(TokenType.EOF, "", None, self.line))
-        return self.tokens
\ No newline at end of file
+        return self.tokens
+
+operators = {
+    "(": TokenType.LEFT_PAREN,
+    ")": TokenType.RIGHT_PAREN,
+    "{": TokenType.LEFT_BRACE,
+    "}": TokenType.RIGHT_BRACE,
+    "[": TokenType.LEFT_BRACKET,
+    "]": TokenType.RIGHT_BRACKET,
+    ",": TokenType.COMMA,
+    ":": TokenType.COLON,
+    ".": TokenType.DOT,
+    "-": TokenType.MINUS,
+    "+": TokenType.PLUS,
+    ";": TokenType.SEMICOLON,
+    "*": TokenType.STAR,
+    "/": TokenType.SLASH,
+    "!": TokenType.BANG,
+    "!=": TokenType.BANG_EQUAL,
+    "=": TokenType.EQUAL,
+    "==": TokenType.EQUAL_EQUAL,
+    ">": TokenType.GREATER,
+    ">=": TokenType.GREATER_EQUAL,
+    "<": TokenType.LESS,
+    "<=": TokenType.LESS_EQUAL,
+}
+
+# Spaces before a lexeme are skipped by the same match, the group number says which kind follows
+tokenPattern = re.compile(r"""
+    [ \t\r]*
+    (?:
+        (\n+)
+      | (//[^\n\0]*)
+      | (\d+(?:\.\d+)?)
+      | ([^\W\d_][^\W_]*)
+      | "([^"\0]*)"
+      | (!=|==|>=|<=|[(){}\[\],:.\-+;*/!=<>])
+      | (")
+      | (.)
+      | \Z
+    )
+""", re.VERBOSE | re.DOTALL)
+
+NEWLINE, COMMENT, NUMBER, NAME, STRING, OPERATOR, UNTERMINATED, UNEXPECTED = range(1, 9)
+
+class RegexScanner:
+    """
+    Scans the whole source with one compiled regex instead of a Python call per character
+    Gives the same tokens as Scanner, newlines inside strings are not counted there either
+    Keywords and identifiers are interned so equal names share one string
+    """
+    def __init__(self, source: str) -> None:
+        self.source: str = source
+        self.tokens: list[Token] = []
+        self.line: int = 1
+
+    def scanTokens(self) -> list[Token]:
+        self.tokens.extend(self.tokenStream([self.source]))
+        return self.tokens
+
+    def tokenStream(self, chunks: Iterable[str]) -> Iterator[Token]:
+        """
+        Yields tokens as the chunks of source come in, so parsing can start before all of it is read
+        Only the text after the last newline is held back, no token but a string spans lines
+        """
+        pending = ""
+        for chunk in chunks:
+            pending += chunk
+            cut = pending.rfind("\n") + 1
+            if cut:
+                resume = yield from self.scan(pending, cut, False)
+                pending = pending[resume:]
+        yield from self.scan(pending, len(pending), True)
+        yield Token(TokenType.EOF, "", None, self.line)
+
+    def scan(self, source: str, end: int, final: bool) -> Generator[Token, None, int]:
+        # Returns where to resume, which is before a string that may close in a later chunk
+        line = self.line
+        intern = sys.intern
+
+        for match in tokenPattern.finditer(source, 0, end):
+            kind = match.lastindex
+            if kind == NAME:
+                text = intern(match.group(NAME))
+                type = keywords.get(text)
+                if not type is None:
+                    yield Token(type, text, None, line)
+                elif text[0].isalpha():
+                    yield Token(TokenType.IDENTIFIER, text, None, line)
+                else:
+                    # Numeric characters such as ½ are word characters but cannot start a name
+                    logger.error(f"{line} | Error: Unexpected character {text[0]}")
+                    exit()
+            elif kind == OPERATOR:
+                text = match.group(OPERATOR)
+                yield Token(operators[text], text, None, line)
+            elif kind == NEWLINE:
+                line += match.end() - match.start(NEWLINE)
+                self.line = line
+            elif kind == NUMBER:
+                text = match.group(NUMBER)
+                yield Token(TokenType.NUMBER, text, float(text), line)
+            elif kind == STRING:
+                text = match.group(STRING)
+                yield Token(TokenType.STRING, text, text, line)
+            elif kind == UNTERMINATED:
+                if not final:
+                    return match.start()
+                logger.error(f"{line} | Error: Unterminated String.")
+                exit()
+            elif kind == UNEXPECTED:
+                logger.error(f"{line} | Error: Unexpected character {match.group(UNEXPECTED)}")
+                exit()
+
+        return end
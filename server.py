@@ -0,0 +1,119 @@
+import io
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import traceback
+import logging
+logger = logging.getLogger(__name__)
+
+from client import OUT, ERR, EXIT, sendFrame, readFrame
+
+class FrameWriter(io.RawIOBase):
+    # Sends every write to the client as a frame on one channel
+    def __init__(self, conn: socket.socket, channel: bytes) -> None:
+        self.conn: socket.socket = conn
+        self.channel: bytes = channel
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        sendFrame(self.conn, self.channel, bytes(data))
+        return len(data)
+
+class Server:
+    """
+    Keeps the interpreter's modules loaded and forks a worker for each request on socketPath
+    A request is main.py's arguments plus the client's directory, and optionally the source itself
+    run(argv, source, timings) runs it in the worker, which starts from a fresh Interpreter
+    and shares nothing with other requests but the .ilc cache
+    At most workers requests run at once, later ones wait in the socket's backlog
+    """
+    def __init__(self, socketPath: str, workers: int, run) -> None:
+        self.socketPath: str = socketPath
+        self.workers: int = max(1, workers)
+        self.run = run
+        self.children: set[int] = set()
+
+    def serve(self):
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if os.path.exists(self.socketPath):
+            # Left behind by a server that did not shut down cleanly
+            os.unlink(self.socketPath)
+        listener.bind(self.socketPath)
+        os.chmod(self.socketPath, 0o600)
+        listener.listen(128)
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        logger.info(f"Serving on {self.socketPath} with {self.workers} workers")
+
+        try:
+            while True:
+                while len(self.children) >= self.workers:
+                    self.reap(True)
+                conn, _ = listener.accept()
+                accepted = time.perf_counter()
+                self.reap(False)
+
+                pid = os.fork()
+                if pid == 0:
+                    try:
+                        listener.close()
+                        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                        self.handle(conn, accepted)
+                    finally:
+                        os._exit(0)
+                conn.close()
+                self.children.add(pid)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            listener.close()
+            os.unlink(self.socketPath)
+            logger.info("Stopped")
+
+    def reap(self, block: bool):
+        while self.children:
+            pid, _ = os.waitpid(-1, 0 if block else os.WNOHANG)
+            if pid == 0:
+                return
+            self.children.discard(pid)
+            if block:
+                return
+
+    def handle(self, conn: socket.socket, accepted: float):
+        started = time.perf_counter()
+        frame = readFrame(conn)
+        if frame is None:
+            return
+        request = json.loads(frame[1])
+
+        # Output goes back over the socket, line by line when the client prints to a terminal
+        out = io.TextIOWrapper(io.BufferedWriter(FrameWriter(conn, OUT)), "utf-8", line_buffering=request.get("tty", False))
+        err = io.TextIOWrapper(io.BufferedWriter(FrameWriter(conn, ERR)), "utf-8", line_buffering=True)
+        sys.stdout, sys.stderr, sys.stdin = out, err, open(os.devnull)
+        logging.basicConfig(level=logging.WARNING, force=True)
+
+        timings = {"fork": started - accepted}
+        code = 0
+        try:
+            os.chdir(request["cwd"])
+            self.run(request["argv"], request.get("source"), timings)
+        except SystemExit as exit:
+            if isinstance(exit.code, int):
+                code = exit.code
+            elif not exit.code is None:
+                print(exit.code, file=sys.stderr)
+                code = 1
+        except BaseException:
+            traceback.print_exc()
+            code = 1
+        finally:
+            out.flush()
+            err.flush()
+
+        timings["server"] = time.perf_counter() - accepted
+        sendFrame(conn, EXIT, json.dumps({"code": code, "timing": timings}).encode())
+        conn.close()
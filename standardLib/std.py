@@ -1,15 +1,421 @@
+import os
+import sys
+import math
+import pickle
+import multiprocessing
 from time import ctime
+from concurrent.futures import ProcessPoolExecutor
+import logging
+logger = logging.getLogger(__name__)
 
+from langGrammar import Stmt
 from interpreter.envData import *
+from interpreter.environment import CallableFactory
+from interpreter.arrays import numpy, ndarray, requireNumpy
+from interpreter.containers import checkKey, KeysView
 
 class clock(Callable):
     def __init__(self) -> None:
         super().__init__(0, None)
-    
+
     def call(self, arguments):
         return ctime()
 
+class flush(Callable):
+    """
+    flush() writes out what print has buffered so far
+    """
+    def __init__(self) -> None:
+        super().__init__(0, None)
+        # The interpreter's Output, bound with the std functions
+        self.output = None
+
+    def call(self, arguments):
+        self.output.flush()
+
+def invoke(name: str, func, arguments: list):
+    # Calls a .il function handed to a builtin, whichever engine made it
+    arity = getattr(func, "arity", None)
+    if arity is None and callable(func):
+        # The python engine's functions are plain defs
+        return func(*arguments)
+    if arity is None:
+        logger.error(f"{name} expected a function but got {func}.")
+        exit()
+    if not arity == len(arguments):
+        logger.error(f"{name} calls its function with {len(arguments)} arguments but it takes {arity}.")
+        exit()
+    if isinstance(func, CallableFactory):
+        return func.constructCallable().call(arguments)
+    return func.call(arguments)
+
+def isBuiltin(func) -> bool:
+    # A std function, or one the python engine wrapped to call it
+    return isinstance(getattr(func, "builtin", func), Callable)
+
+def expectArray(name: str, value) -> ndarray:
+    if not value.__class__ is ndarray:
+        logger.error(f"{name} expected an array but got {value}.")
+        exit()
+    return value
+
+def expectMap(name: str, value) -> dict:
+    if not value.__class__ is dict:
+        logger.error(f"{name} expected a map but got {value}.")
+        exit()
+    return value
+
+def expectNumber(name: str, value) -> float:
+    if not value.__class__ in (float, bool):
+        logger.error(f"{name} expected a number but got {value}.")
+        exit()
+    return float(value)
+
+def expectWhole(name: str, value) -> int:
+    if not value.__class__ is float or not value.is_integer():
+        logger.error(f"{name} expected a whole number but got {value}.")
+        exit()
+    return int(value)
+
+def expectCount(name: str, value) -> int:
+    count = expectWhole(name, value)
+    if count < 0:
+        logger.error(f"{name} expected a number of elements but got {value}.")
+        exit()
+    return count
+
+class array(Callable):
+    """
+    array(size), size zeros
+    """
+    def __init__(self) -> None:
+        super().__init__(1, None)
+
+    def call(self, arguments):
+        requireNumpy("array")
+        return numpy.zeros(expectCount("array", arguments[0]))
+
+class fill(Callable):
+    """
+    fill(size, value), size copies of value
+    """
+    def __init__(self) -> None:
+        super().__init__(2, None)
+
+    def call(self, arguments):
+        requireNumpy("fill")
+        return numpy.full(expectCount("fill", arguments[0]), expectNumber("fill", arguments[1]))
+
+class arange(Callable):
+    """
+    range(start, stop), the numbers from start up to but not including stop
+    """
+    def __init__(self) -> None:
+        super().__init__(2, None)
+
+    def call(self, arguments):
+        requireNumpy("range")
+        return numpy.arange(expectNumber("range", arguments[0]), expectNumber("range", arguments[1]))
+
+class length(Callable):
+    def __init__(self) -> None:
+        super().__init__(1, None)
+
+    def call(self, arguments):
+        value = arguments[0]
+        if not value.__class__ in (ndarray, str, dict, KeysView):
+            logger.error(f"len expected an array, map or string but got {value}.")
+            exit()
+        return float(len(value))
+
+class total(Callable):
+    def __init__(self) -> None:
+        super().__init__(1, None)
+
+    def call(self, arguments):
+        return expectArray("sum", arguments[0]).sum().item()
+
+class dot(Callable):
+    def __init__(self) -> None:
+        super().__init__(2, None)
+
+    def call(self, arguments):
+        left = expectArray("dot", arguments[0])
+        right = expectArray("dot", arguments[1])
+        if not len(left) == len(right):
+            logger.error(f"dot expected arrays of the same length but got {len(left)} and {len(right)}.")
+            exit()
+        return numpy.dot(left, right).item()
+
+class elementwise(Callable):
+    """
+    map(func, a) calls func once with the whole array
+    The operators in func then run elementwise at numpy speed, so it has to be arithmetic,
+    a branch would need one truth value for every element
+    """
+    def __init__(self) -> None:
+        super().__init__(2, None)
+
+    def call(self, arguments):
+        values = expectArray("map", arguments[1])
+        result = invoke("map", arguments[0], [values])
+        if result.__class__ is ndarray:
+            return result
+        # func ignored its argument, every element maps to the same value
+        return numpy.full(values.shape, result)
+
+class view(Callable):
+    """
+    slice(a, start, stop), the elements from start up to stop, bounds past either end are clamped
+    The slice shares its elements with a, setting one sets it in both
+    """
+    def __init__(self) -> None:
+        super().__init__(3, None)
+
+    def call(self, arguments):
+        values = expectArray("slice", arguments[0])
+        return values[expectWhole("slice", arguments[1]):expectWhole("slice", arguments[2])]
+
+class sort(Callable):
+    """
+    sort(a), a sorted copy, a itself keeps its order
+    """
+    def __init__(self) -> None:
+        super().__init__(1, None)
+
+    def call(self, arguments):
+        return numpy.sort(expectArray("sort", arguments[0]))
+
+class has(Callable):
+    """
+    has(m, key), whether the map holds key
+    """
+    def __init__(self) -> None:
+        super().__init__(2, None)
+
+    def call(self, arguments):
+        return checkKey(arguments[1]) in expectMap("has", arguments[0])
+
+class keys(Callable):
+    """
+    keys(m), a live view of the map's keys in insertion order, nothing is copied
+    """
+    def __init__(self) -> None:
+        super().__init__(1, None)
+
+    def call(self, arguments):
+        return expectMap("keys", arguments[0]).keys()
+
+class delete(Callable):
+    """
+    delete(m, key) removes key and says whether the map held it
+    """
+    def __init__(self) -> None:
+        super().__init__(2, None)
+
+    def call(self, arguments):
+        mapping = expectMap("delete", arguments[0])
+        key = checkKey(arguments[1])
+        if not key in mapping:
+            return False
+        del mapping[key]
+        return True
+
+class builder(Callable):
+    """
+    builder(), an empty string builder for append and build
+    """
+    def __init__(self) -> None:
+        super().__init__(0, None)
+
+    def call(self, arguments):
+        return StringBuilder()
+
+def expectBuilder(name: str, value) -> StringBuilder:
+    if not value.__class__ is StringBuilder:
+        logger.error(f"{name} expected a builder but got {value}.")
+        exit()
+    return value
+
+class append(Callable):
+    """
+    append(b, value) adds value to the end of b, written the way print writes it
+    """
+    def __init__(self) -> None:
+        super().__init__(2, None)
+
+    def call(self, arguments):
+        value = arguments[1]
+        expectBuilder("append", arguments[0]).append(value if value.__class__ is str else str(value))
+        return arguments[0]
+
+class build(Callable):
+    """
+    build(b), everything appended to b as one string, joined once however many parts it has
+    """
+    def __init__(self) -> None:
+        super().__init__(1, None)
+
+    def call(self, arguments):
+        return expectBuilder("build", arguments[0]).build()
+
+# Workers are forked like the server's, a spawned one would find parser/parser.py when it imports the parser package
+poolContext = multiprocessing.get_context("fork" if "fork" in multiprocessing.get_all_start_methods() else None)
+# Chunks handed out per worker, more than one so a worker that finishes early takes another
+CHUNKS_PER_WORKER = 4
+# (func, output, capture) in a parallelMap worker process, set by startWorker
+workerState = None
+
+class WorkerError(Exception):
+    """
+    An error a parallelMap worker met while calling the function, with the .il line it happened on
+    lines holds what the chunk printed before it
+    """
+    def __init__(self, message: str, line: int, argument, lines: list[str]) -> None:
+        super().__init__(message, line, argument, lines)
+        self.message: str = message
+        self.line: int = line
+        self.argument = argument
+        self.lines: list[str] = lines
+
+class LogCapture(logging.Handler):
+    # Keeps a worker's error messages, the script's process reports them
+    def __init__(self) -> None:
+        super().__init__()
+        self.messages: list[str] = []
+
+    def emit(self, record: logging.LogRecord):
+        self.messages.append(record.getMessage())
+
+def startWorker(payload: bytes):
+    global workerState
+    capture = LogCapture()
+    logging.getLogger().handlers = [capture]
+    func, output = pickle.loads(payload)
+    # Printed lines are sent back with each chunk's results, never written here
+    output.bufferSize = sys.maxsize
+    workerState = (func, output, capture)
+
+def errorLine(error: BaseException) -> int:
+    # The innermost statement that was running when error was raised
+    line = 0
+    trace = error.__traceback__
+    while not trace is None:
+        node = trace.tb_frame.f_locals.get("self")
+        if isinstance(node, Stmt) and getattr(node, "line", 0):
+            line = node.line
+        trace = trace.tb_next
+    return line
+
+def runChunk(arguments: list) -> tuple[list, list[str]]:
+    func, output, capture = workerState # type: ignore
+    capture.messages.clear()
+    results = []
+    for argument in arguments:
+        try:
+            results.append(invoke("parallelMap", func, [argument]))
+        except (Exception, SystemExit) as error:
+            # exit() follows a logged error, anything else is a Python exception
+            message = capture.messages[-1] if capture.messages else f"{type(error).__name__}: {error}"
+            raise WorkerError(message, errorLine(error), argument, output.take()) from None
+    return results, output.take()
+
+def collect(results: list):
+    # An array when every result is a number, a map from index to result otherwise
+    if not numpy is None and all(result.__class__ in (float, bool) for result in results):
+        return numpy.array(results, dtype=float)
+    return {float(index): result for index, result in enumerate(results)}
+
+class parallelMap(Callable):
+    """
+    parallelMap(func, count) calls func with each number from 0 up to count, parallelMap(func, a) with each element of a
+    The calls are split into chunks run by worker processes, func and everything it can reach are pickled and
+    sent to each worker once, so func should be pure, an assignment to an outer variable stays in its worker
+    Results come back in order, and so do the lines func prints
+    Functions of the tree engine are the ones with an AST to send, the other engines call func in this process
+    """
+    def __init__(self) -> None:
+        super().__init__(2, None)
+        # The interpreter's Output, bound with the std functions
+        self.output = None
+        # Worker processes, main sets it on its interpreter's parallelMap with --parallel-workers
+        self.workers: int = os.cpu_count() or 1
+        self.warned: bool = False
+
+    def call(self, arguments):
+        func, source = arguments
+        if source.__class__ is ndarray:
+            values = source.tolist()
+        else:
+            values = [float(index) for index in range(expectCount("parallelMap", source))]
+        return collect(self.run(func, values))
+
+    def run(self, func, values: list) -> list:
+        # Builtins are quick enough to call here, only .il functions of the other engines are worth a warning
+        if not isinstance(func, CallableFactory) and not isBuiltin(func) and not self.warned and self.workers > 1:
+            logger.warning("parallelMap runs in one process on this engine, only the tree engine sends functions to workers.")
+            self.warned = True
+        if not isinstance(func, CallableFactory) or not workerState is None or self.workers < 2 or len(values) < 2:
+            # Not worth a pool, or already inside a worker
+            return [invoke("parallelMap", func, [value]) for value in values]
+        if not func.arity == 1:
+            logger.error(f"parallelMap calls its function with 1 argument but it takes {func.arity}.")
+            exit()
+
+        try:
+            payload = pickle.dumps((func, self.output))
+        except Exception as error:
+            # Like --mem-report, whose tracker holds weak references
+            logger.warning(f"parallelMap runs in one process, its function cannot be sent to the workers: {error}")
+            return [invoke("parallelMap", func, [value]) for value in values]
+
+        workers = min(self.workers, len(values))
+        size = math.ceil(len(values) / (workers * CHUNKS_PER_WORKER))
+        chunks = [values[start:start + size] for start in range(0, len(values), size)]
+        # A forked worker would write out whatever is still buffered a second time
+        self.output.flush()
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+        results = []
+        with ProcessPoolExecutor(workers, poolContext, startWorker, (payload,)) as pool:
+            try:
+                for chunkResults, lines in pool.map(runChunk, chunks):
+                    self.emit(lines)
+                    results.extend(chunkResults)
+            except WorkerError as error:
+                pool.shutdown(wait=False, cancel_futures=True)
+                self.emit(error.lines)
+                logger.error(f"parallelMap: {error.message} (line {error.line}, called with {error.argument})")
+                exit()
+            except Exception as error:
+                pool.shutdown(wait=False, cancel_futures=True)
+                logger.error(f"parallelMap failed: {error}")
+                exit()
+        return results
+
+    def emit(self, lines: list[str]):
+        for line in lines:
+            self.output.write(line)
+
+# The builtins by name, each interpreter makes its own of each so their settings stay apart
 standardFunctions = {
-    "clock" : clock()
+    "clock" : clock,
+    "flush" : flush,
+    "array" : array,
+    "fill" : fill,
+    "range" : arange,
+    "len" : length,
+    "sum" : total,
+    "dot" : dot,
+    "map" : elementwise,
+    "slice" : view,
+    "sort" : sort,
+    "has" : has,
+    "keys" : keys,
+    "delete" : delete,
+    "builder" : builder,
+    "append" : append,
+    "build" : build,
+    "parallelMap" : parallelMap,
 }
-
@@ -0,0 +1,59 @@
+"""
+Checks that every interpreter has builtins of its own
+Usage: python -m unittest discover tests
+"""
+import io
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(root))
+
+from parser.scanner import RegexScanner
+# The grammar module is imported by its bare name
+sys.path.append(str(root / "parser"))
+from parser.parser import Parser
+from interpreter.interpreter import Interpreter
+from main import engines, parse_file
+
+def interpreterFor(source: str) -> Interpreter:
+    interpreter = Interpreter(Parser(RegexScanner(source).scanTokens()).parse())
+    interpreter.output.sink = io.StringIO()
+    return interpreter
+
+class BuiltinsTest(unittest.TestCase):
+    def test_settings_stay_with_their_interpreter(self):
+        first = interpreterFor("print 1;\nflush();\n")
+        second = interpreterFor("print 2;\nflush();\n")
+        first.builtins["parallelMap"].workers = 3
+        second.builtins["parallelMap"].workers = 1
+        self.assertIsNot(first.builtins["flush"], second.builtins["flush"])
+        self.assertEqual(first.builtins["parallelMap"].workers, 3)
+
+        first.run()
+        second.run()
+        self.assertEqual(first.output.sink.getvalue(), "1.0\n")
+        self.assertEqual(second.output.sink.getvalue(), "2.0\n")
+
+    def run_script(self, engine: str, source: str) -> str:
+        with tempfile.TemporaryDirectory() as directory:
+            script = Path(directory) / "script.il"
+            output = Path(directory) / "out.txt"
+            script.write_text(source)
+            parse_file(script, engine, outputFile=output, parallelWorkers=2)
+            return output.read_text()
+
+    def test_parallel_map_of_a_builtin_does_not_warn(self):
+        for engine in engines:
+            with self.subTest(engine=engine), self.assertNoLogs("standardLib.std", "WARNING"):
+                self.assertEqual(self.run_script(engine, "print len(parallelMap(array, 3));\n"), "3.0\n")
+
+    def test_parallel_map_warns_for_functions_left_in_process(self):
+        for engine in ["vm", "closure", "python"]:
+            with self.subTest(engine=engine), self.assertLogs("standardLib.std", "WARNING"):
+                self.assertEqual(self.run_script(engine, "func sq(n) { return n * n; }\nprint parallelMap(sq, 3);\n"), "[0. 1. 4.]\n")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,38 @@
+"""
+Checks how maps and their keys print
+Usage: python -m unittest discover tests
+"""
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(root))
+
+from parser.scanner import RegexScanner
+# The grammar module is imported by its bare name
+sys.path.append(str(root / "parser"))
+from main import engines, parse_file
+
+SOURCE = """var m = {"a": 1, 2: "b"};
+print keys(m);
+m["c"] = 3;
+var k = keys(m);
+delete(m, "a");
+print k;
+print keys({});
+"""
+
+class MapTest(unittest.TestCase):
+    def test_keys_print_as_a_list(self):
+        for engine in engines:
+            with self.subTest(engine=engine), tempfile.TemporaryDirectory() as directory:
+                script = Path(directory) / "script.il"
+                output = Path(directory) / "out.txt"
+                script.write_text(SOURCE)
+                parse_file(script, engine, outputFile=output)
+                self.assertEqual(output.read_text(), "['a', 2.0]\n[2.0, 'c']\n[]\n")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+"""
+Checks that main.py caches parsed programs only when they parsed cleanly
+Usage: python -m unittest discover tests
+"""
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(root))
+
+from parser.scanner import RegexScanner
+# The grammar module is imported by its bare name
+sys.path.append(str(root / "parser"))
+from parser.programCache import ProgramCache
+from main import parse_file
+
+class ProgramCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.folder = Path(self.directory.name)
+        self.cache = ProgramCache(str(self.folder / "__ilcache__"))
+        self.output = self.folder / "out.txt"
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def run_script(self, source: str):
+        script = self.folder / "script.il"
+        script.write_text(source)
+        parse_file(script, cache=self.cache, outputFile=self.output)
+        return self.output.read_text()
+
+    def test_clean_program_is_cached(self):
+        self.assertEqual(self.run_script("print 1 + 2;\n"), "3.0\n")
+        self.assertEqual(len(list((self.folder / "__ilcache__").glob("*.ilc"))), 1)
+        self.assertEqual(self.run_script("print 1 + 2;\n"), "3.0\n")
+
+    def test_parse_errors_are_reported_on_every_run(self):
+        for run in range(2):
+            with self.assertLogs("parser.parser", "ERROR") as logs:
+                self.run_script("var = 1;\nprint 2;\n")
+            self.assertIn("Expect variable name.", logs.output[0])
+        self.assertFalse((self.folder / "__ilcache__").exists())
+
+if __name__ == "__main__":
+    unittest.main()
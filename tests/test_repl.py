@@ -0,0 +1,45 @@
+"""
+Checks that the prompt keeps its session when an entry fails
+Usage: python -m unittest discover tests
+"""
+import io
+import sys
+import unittest
+from unittest import mock
+from pathlib import Path
+
+root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(root))
+
+from parser.scanner import RegexScanner
+# The grammar module is imported by its bare name
+sys.path.append(str(root / "parser"))
+from interpreter.repl import Repl
+from main import engines
+
+ENTRIES = [
+    "var x = 5;",
+    "func f(n) { return \"a\" - n; }",
+    "print f(1);",
+    "print x;",
+    "print f(2) + x;",
+    "func g(n) { return n + x; }",
+    "print g(2);",
+]
+
+class ReplTest(unittest.TestCase):
+    def test_error_keeps_definitions(self):
+        for engine in ["tree", "adaptive", "vm", "closure"]:
+            with self.subTest(engine=engine):
+                interpreter = engines[engine]([], redefinable=True)
+                interpreter.output.sink = io.StringIO()
+                with mock.patch("builtins.input", side_effect=ENTRIES + [EOFError()]), \
+                        mock.patch("builtins.print"), \
+                        self.assertLogs("interpreter.repl", "ERROR") as logs:
+                    Repl(interpreter).run()
+                self.assertEqual(interpreter.output.sink.getvalue(), "5.0\n7.0\n")
+                self.assertEqual(len(logs.output), 2)
+                self.assertIn("TypeError", logs.output[0])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+"""
+Checks that a string grown by s = s + x reads as a string on every engine,
+also when it is resolved a statement or an entry at a time
+Usage: python -m unittest discover tests
+"""
+import io
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(root))
+
+from parser.scanner import RegexScanner
+# The grammar module is imported by its bare name
+sys.path.append(str(root / "parser"))
+from interpreter.repl import Repl
+from main import engines, parse_file
+
+# getS is compiled before s becomes a string that is grown in place
+READ_BEFORE_GROWN = """var s = "";
+func getS() { return s; }
+s = s + "ab";
+s = s + "cd";
+print getS();
+"""
+# getS is declared once s is grown, and s grows again inside a function
+READ_AFTER_GROWN = """var s = "";
+s = s + "ab";
+func getS() { return s; }
+func grow() { var i = 0; while (i < 3) { s = s + "x"; i = i + 1; } }
+grow();
+print getS();
+print s;
+"""
+
+class RopeTest(unittest.TestCase):
+    def stream(self, engine: str, source: str) -> str:
+        with tempfile.TemporaryDirectory() as directory:
+            script = Path(directory) / "script.il"
+            output = Path(directory) / "out.txt"
+            script.write_text(source)
+            parse_file(script, engine, stream=True, outputFile=output)
+            return output.read_text()
+
+    def prompt(self, engine: str, source: str) -> str:
+        interpreter = engines[engine]([], redefinable=True)
+        interpreter.output.sink = io.StringIO()
+        repl = Repl(interpreter)
+        for entry in source.splitlines():
+            repl.execute(entry)
+        return interpreter.output.sink.getvalue()
+
+    def test_stream(self):
+        for engine in engines:
+            with self.subTest(engine=engine):
+                self.assertEqual(self.stream(engine, READ_BEFORE_GROWN), "abcd\n")
+                self.assertEqual(self.stream(engine, READ_AFTER_GROWN), "abxxx\nabxxx\n")
+
+    def test_prompt(self):
+        for engine in ["tree", "adaptive", "vm", "closure"]:
+            with self.subTest(engine=engine):
+                self.assertEqual(self.prompt(engine, READ_BEFORE_GROWN), "abcd\n")
+                self.assertEqual(self.prompt(engine, READ_AFTER_GROWN), "abxxx\nabxxx\n")
+
+if __name__ == "__main__":
+    unittest.main()